@@ -30,13 +30,20 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
 
     db.init_app(app)
-    migrate.init_app(app, db)
+    # compare_type lets `flask db migrate` pick up column type changes
+    migrate.init_app(app, db, compare_type=True)
     login.init_app(app)
     mail.init_app(app)
     bootstrap.init_app(app)
     moment.init_app(app)
     babel.init_app(app)
 
+    from app import events, identity, jobs, scheduler
+    events.init_app(app)
+    identity.init_app(app)
+    jobs.init_app(app)
+    scheduler.init_app(app)
+
     # if not app.debug:
     #     if not os.path.exists('logs'):
     #         os.mkdir('logs')
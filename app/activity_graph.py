@@ -0,0 +1,64 @@
+"""
+The Activity/ActivityRequirement DAG compiled into bitmasks.
+
+Every activity gets a bit, so a set of activities is a plain int and
+"are all requirements finished" is a single AND. The graph is compiled once
+per process as part of the activity catalog, see app.catalog, which takes
+the bits from Activity.bit_index: masks are stored on Input, so the bit of
+an activity must not move when others are added or deleted.
+"""
+
+
+class ActivityGraph:
+    """
+    Compiled activity dependencies.
+    `activities` is an iterable of ActivitySpec, `bit_indexes` maps their
+    ids to bit positions, by default the positions in id order.
+    """
+
+    def __init__(self, activities, bit_indexes=None):
+        self.activities = {a.id: a for a in activities}
+        self.ids = sorted(self.activities)
+        if bit_indexes is None:
+            bit_indexes = {id_: i for i, id_ in enumerate(self.ids)}
+        self.bits = {id_: 1 << bit_indexes[id_] for id_ in self.ids}
+        self.all_mask = 0
+        for bit in self.bits.values():
+            self.all_mask |= bit
+        # direct requirements, unknown ids are ignored like a missing row would be
+        self.requires = {id_: self.mask(a.requirements) for id_, a in self.activities.items()}
+        self.order = self._topological_order()
+        # every activity that has to be finished, directly or not, before this one
+        self.closure = {}
+        for id_ in self.order:
+            mask = self.requires[id_]
+            for req in self.ids_of(mask):
+                mask |= self.closure[req]
+            self.closure[id_] = mask
+
+    def _topological_order(self):
+        order = []
+        done = 0
+        pending = list(self.ids)
+        while pending:
+            ready = [id_ for id_ in pending if self.requires[id_] & ~done == 0]
+            if not ready:
+                raise ValueError(f'Activity requirements contain a cycle: {pending}')
+            for id_ in ready:
+                done |= self.bits[id_]
+                order.append(id_)
+            pending = [id_ for id_ in pending if id_ not in ready]
+        return order
+
+    def mask(self, ids):
+        result = 0
+        for id_ in ids:
+            result |= self.bits.get(id_, 0)
+        return result
+
+    def ids_of(self, mask):
+        return [id_ for id_ in self.ids if mask & self.bits[id_]]
+
+    def is_eligible(self, activity_id, finished_mask):
+        requires = self.requires[activity_id]
+        return finished_mask & requires == requires
@@ -1,9 +1,12 @@
 from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth
+from flask_login import current_user
 from app.models import User
 from app.api.errors import error_response
 
 basic_auth = HTTPBasicAuth()
 token_auth = HTTPTokenAuth()
+# read only endpoints the game pages poll, with a token or the login session
+token_or_session_auth = HTTPTokenAuth()
 
 
 @basic_auth.verify_password
@@ -26,3 +29,16 @@ def verify_token(token):
 @token_auth.error_handler
 def token_auth_error(status):
     return error_response(status)
+
+
+@token_or_session_auth.verify_token
+def verify_token_or_session(token):
+    if token:
+        return User.check_token(token)
+    if current_user.is_authenticated:
+        return current_user._get_current_object()
+
+
+@token_or_session_auth.error_handler
+def token_or_session_auth_error(status):
+    return error_response(status)
@@ -0,0 +1,108 @@
+from hashlib import sha1
+
+from flask import jsonify, make_response, request
+from sqlalchemy import and_
+
+from app import db
+from app.api import bp
+from app.api.auth import token_or_session_auth
+from app.api.errors import error_response
+from app.main.routes import team_state
+from app.models import Game, Input, Penalty, Team
+
+
+def state_etag(game_, inputs):
+    """
+    ETag of the current period state of the teams with `inputs`. It changes
+    with the day and whenever a team changes its choices (Input.version).
+    """
+    key = ','.join(f'{i.team_id}:{i.id}:{i.version}' for i in sorted(inputs, key=lambda i: i.team_id))
+    return sha1(f'{game_.id}|{game_.current_day}|{key}'.encode()).hexdigest()
+
+
+def _not_modified(etag):
+    return _revalidate(make_response('', 304), etag)
+
+
+def _revalidate(response, etag):
+    response.set_etag(etag)
+    # clients keep the body but have to ask whether it is still current
+    response.headers.set('Cache-Control', 'private, no-cache')
+    return response
+
+
+def _team_activity_dict(ta):
+    return {'id': ta.id, 'activity_id': ta.activity_id, 'cost': ta.cost,
+            'initiated_on_day': ta.initiated_on_day, 'started_on_day': ta.started_on_day,
+            'finished_on_day': ta.finished_on_day}
+
+
+def _state_dict(state):
+    return {
+        'game': {'id': state['game'].id, 'current_day': state['game'].current_day},
+        'team': {'id': state['team'].id, 'display_name': state['team'].display_name},
+        'money_at_start_of_period': state['money_at_start_of_period'],
+        'rent_cost': state['rent_cost'],
+        'credit_taken': state['credit_taken'],
+        'credit_to_take': state['credit_to_take'],
+        'interest_cost': state['interest_cost'],
+        'finished': [_team_activity_dict(ta) for ta in state['finished']],
+        'in_progress': [_team_activity_dict(ta) for ta in state['in_progress']],
+        'started': [_team_activity_dict(ta) for ta in state['started']],
+        'penalties': [{'activity_id': p.activity_id, 'fine': p.fine} for p in state['penalties']],
+        'total_penalties_cost': state['total_penalties_cost'],
+    }
+
+
+def _current_inputs(game_id, team_id=None):
+    """ (game, team, current period input) of the teams in the game, with one query. """
+    query = db.session.query(Game, Team, Input) \
+        .join(Team, Team.game_id == Game.id) \
+        .outerjoin(Input, and_(Input.team_id == Team.id, Input.game_id == Game.id,
+                               Input.active_at_day == Game.current_day)) \
+        .filter(Game.id == game_id)
+    if team_id is not None:
+        query = query.filter(Team.id == team_id)
+    return query.order_by(Team.id).all()
+
+
+@bp.route('/games/<int:game_id>/teams/<int:team_id>/state', methods=['GET'])
+@token_or_session_auth.login_required
+def get_team_state(game_id, team_id):
+    user = token_or_session_auth.current_user()
+    if not user.is_admin and user.team_id != team_id:
+        return error_response(403)
+    rows = _current_inputs(game_id, team_id)
+    if not rows:
+        return error_response(404)
+    game_, team_, input_ = rows[0]
+    if input_ is None:
+        # the play page or the next advance creates it, a GET does not write
+        return error_response(409, 'The team has no input for the current day yet.')
+
+    etag = state_etag(game_, [input_])
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+    return _revalidate(jsonify(_state_dict(team_state(game_, team_, input_))), etag)
+
+
+@bp.route('/games/<int:game_id>/state', methods=['GET'])
+@token_or_session_auth.login_required
+def get_game_state(game_id):
+    if not token_or_session_auth.current_user().is_admin:
+        return error_response(403)
+    game_ = Game.query.get_or_404(game_id)
+    # teams without an input for the day have nothing to show yet
+    rows = [(team_, input_) for _, team_, input_ in _current_inputs(game_id) if input_ is not None]
+
+    etag = state_etag(game_, [input_ for _, input_ in rows])
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    penalties = {input_.id: [] for _, input_ in rows}
+    for penalty in Penalty.query.filter(Penalty.input_id.in_(penalties)):
+        penalties[penalty.input_id].append(penalty)
+    teams = [_state_dict(team_state(game_, team_, input_, penalties[input_.id]))
+             for team_, input_ in rows]
+    return _revalidate(jsonify({'game': {'id': game_.id, 'current_day': game_.current_day},
+                                'teams': teams}), etag)
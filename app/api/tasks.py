@@ -0,0 +1,18 @@
+from flask import jsonify
+
+from app.api import bp
+from app.api.auth import token_or_session_auth
+from app.api.errors import error_response
+from app.models import Task
+
+
+@bp.route('/tasks/<task_id>', methods=['GET'])
+@token_or_session_auth.login_required
+def get_task(task_id):
+    user = token_or_session_auth.current_user()
+    task = Task.query.get(task_id)
+    if task is None:
+        return error_response(404)
+    if not user.is_admin and task.user_id != user.id:
+        return error_response(403)
+    return jsonify(task.to_dict())
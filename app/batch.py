@@ -0,0 +1,140 @@
+"""
+Advancing every active game at once, for sections that play side by side.
+
+`advance_all_games` hands each game to a pool of ADVANCE_ALL_WORKERS
+processes. A worker builds its own app on start and keeps a single database
+connection; every game is advanced in its own transaction with
+advance_game_period, so a game that fails is rolled back and reported while
+the others go on. With one worker, or one game, everything runs in the
+calling process instead.
+
+The workers are spawned rather than forked: the caller can be a gevent web
+worker or a job thread, neither of which forks cleanly. A spawned worker
+starts from a fresh interpreter, so it gets the settings of the calling app
+passed in, the database above all.
+"""
+import multiprocessing
+import os
+import pickle
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+from flask import current_app
+
+from app import db
+from app.engine import MAX_DAY
+
+GameAdvance = namedtuple('GameAdvance', 'game_id from_day to_day seconds error')
+
+_worker_app = None
+
+
+def _worker_settings(config):
+    """ The settings of `config` that can be handed to a spawned worker. """
+    settings = {}
+    for key, value in config.items():
+        if not key.isupper():
+            continue
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        settings[key] = value
+    return settings
+
+
+def _init_worker(settings):
+    global _worker_app
+    from app import create_app
+    from app.config import Config
+
+    if not settings['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # one game at a time, one connection is all a worker needs
+        settings['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+            settings.get('SQLALCHEMY_ENGINE_OPTIONS') or {}, pool_size=1, max_overflow=0)
+    _worker_app = create_app(type('WorkerConfig', (Config,), settings))
+
+
+def _advance_game(game_id, from_day):
+    """ Advance one game from `from_day`, a GameAdvance whatever happens. """
+    from app.main.routes import advance_game_period
+    from app.models import Game
+
+    started = perf_counter()
+    try:
+        game_ = Game.query.filter_by(id=game_id).first()
+        if game_ is None:
+            raise ValueError(f'Game {game_id} does not exist')
+        if not advance_game_period(game_, from_day):
+            raise ValueError(f'Day {from_day} was already advanced')
+        return GameAdvance(game_id, from_day, game_.current_day, perf_counter() - started, None)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Advancing game %s failed', game_id)
+        return GameAdvance(game_id, from_day, None, perf_counter() - started,
+                           str(e) or e.__class__.__name__)
+
+
+def _advance_game_in_worker(game_id, from_day):
+    with _worker_app.app_context():
+        try:
+            return _advance_game(game_id, from_day)
+        finally:
+            db.session.remove()
+
+
+def games_to_advance():
+    """ (game id, current day) of the active games short of MAX_DAY. """
+    from app.models import Game
+
+    return db.session.query(Game.id, Game.current_day) \
+        .filter(Game.is_active.is_(True), Game.current_day < MAX_DAY).order_by(Game.id).all()
+
+
+def advance_all_games(workers=None, progress=None):
+    """
+    Advance every active game by one period, in parallel. Returns a
+    GameAdvance per game, in game id order.
+    """
+    progress = progress or (lambda percent: None)
+    games_ = games_to_advance()
+    workers = min(workers or current_app.config.get('ADVANCE_ALL_WORKERS') or os.cpu_count() or 1,
+                  len(games_))
+    results = []
+    if workers <= 1:
+        for game_id, from_day in games_:
+            results.append(_advance_game(game_id, from_day))
+            progress(100 * len(results) // len(games_))
+        return results
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(_worker_settings(current_app.config),)) as pool:
+        futures = {pool.submit(_advance_game_in_worker, game_id, from_day): (game_id, from_day)
+                   for game_id, from_day in games_}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # the worker itself died, the game may or may not be advanced
+                game_id, from_day = futures[future]
+                current_app.logger.exception('The worker advancing game %s failed', game_id)
+                results.append(GameAdvance(game_id, from_day, None, None, str(e) or e.__class__.__name__))
+            progress(100 * len(results) // len(games_))
+    return sorted(results, key=lambda r: r.game_id)
+
+
+def summary(results):
+    """ One line per game and a total, for the CLI and the task message. """
+    lines = []
+    for r in results:
+        timing = f'{r.seconds:.2f}s' if r.seconds is not None else 'no timing'
+        if r.error is None:
+            lines.append(f'Game {r.game_id}: day {r.from_day} -> {r.to_day} in {timing}')
+        else:
+            lines.append(f'Game {r.game_id}: failed at day {r.from_day} after {timing}: {r.error}')
+    failed = sum(r.error is not None for r in results)
+    lines.append(f'Advanced {len(results) - failed} of {len(results)} games'
+                 + (f', {failed} failed.' if failed else '.'))
+    return '\n'.join(lines)
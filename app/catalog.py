@@ -0,0 +1,157 @@
+"""
+Process-wide, read-only copy of the activity catalog.
+
+Activities practically never change during a game, yet the player pages
+need all of them on every request. `get_catalog` loads them once per worker
+as frozen records, together with the compiled ActivityGraph.
+
+Writes to Activity or ActivityRequirement drop the local copy straight away
+and bump CatalogVersion in the same transaction. Other workers compare the
+stored version at most every VERSION_CHECK_SECONDS and reload when it moved.
+
+Every activity gets its bit in the Input masks once, on insert, from
+CatalogVersion.next_bit_index. A bit is never handed out again, not even
+after its activity is deleted, so the masks already stored keep their
+meaning. The masks are signed 64 bit integers, which leaves MAX_BIT_INDEXES
+bits.
+"""
+from collections import namedtuple
+from time import monotonic
+
+from sqlalchemy import event, func, select
+
+from app.activity_graph import ActivityGraph
+from app.engine import ActivitySpec
+
+VERSION_CHECK_SECONDS = 30
+MAX_BIT_INDEXES = 63
+
+ActivityRecord = namedtuple('ActivityRecord', ['id', 'title', 'description', 'days_needed',
+                                               'cost', 'label', 'bit_index'])
+
+
+class CatalogFull(ValueError):
+    pass
+
+
+class ActivityCatalog:
+    __slots__ = ('version', 'activities', 'by_id', 'labels', 'graph')
+
+    def __init__(self, version, activities, requirements):
+        self.version = version
+        self.activities = tuple(sorted(activities, key=lambda a: a.id))
+        self.by_id = {a.id: a for a in self.activities}
+        self.labels = {a.id: a.label for a in self.activities}
+        self.graph = ActivityGraph(
+            (ActivitySpec(a.id, a.cost, a.days_needed, frozenset(requirements.get(a.id, ())))
+             for a in self.activities),
+            {a.id: a.bit_index for a in self.activities})
+
+    def choices(self, exclude=()):
+        return [(a.id, a.label) for a in self.activities if a.id not in exclude]
+
+
+def activity_label(title, cost):
+    return f'{title} Ценa:{cost}'
+
+
+_catalog = None
+_checked_at = 0
+
+
+def _stored_version():
+    from app import db
+    from app.models import CatalogVersion
+    return db.session.query(CatalogVersion.version).filter_by(id=1).scalar() or 0
+
+
+def _load_catalog():
+    from app.models import Activity, ActivityRequirement
+    version = _stored_version()
+    requirements = {}
+    for req in ActivityRequirement.query.all():
+        requirements.setdefault(req.activity_id, set()).add(req.requirement_id)
+    activities = [ActivityRecord(a.id, a.title, a.description, a.days_needed, a.cost,
+                                 activity_label(a.title, a.cost), a.bit_index)
+                  for a in Activity.query.all()]
+    return ActivityCatalog(version, activities, requirements)
+
+
+def get_catalog():
+    """
+    The catalog of this worker, loaded on first use and reloaded when
+    another worker bumped the stored version.
+    """
+    global _catalog, _checked_at
+    now = monotonic()
+    if _catalog is not None and now - _checked_at > VERSION_CHECK_SECONDS:
+        _checked_at = now
+        if _stored_version() != _catalog.version:
+            _catalog = None
+    if _catalog is None:
+        _catalog = _load_catalog()
+        _checked_at = now
+    return _catalog
+
+
+def get_activity_graph():
+    return get_catalog().graph
+
+
+def invalidate_catalog(*args, **kwargs):
+    global _catalog
+    _catalog = None
+
+
+def bump_catalog_version(connection):
+    """
+    Move the stored version on, for writes that bypass the mapper events
+    (bulk inserts, raw SQL).
+    """
+    from app.models import CatalogVersion
+    table = CatalogVersion.__table__
+    updated = connection.execute(table.update().where(table.c.id == 1)
+                                 .values(version=table.c.version + 1))
+    if not updated.rowcount:
+        connection.execute(table.insert().values(id=1, version=1))
+    invalidate_catalog()
+
+
+def allocate_bit_indexes(connection, count):
+    """
+    `count` bit indexes for new activities, none of them ever handed out
+    before. Raises CatalogFull when the masks have no bits left.
+    """
+    from app.models import Activity, CatalogVersion
+    table = CatalogVersion.__table__
+    next_bit_index = connection.execute(select(table.c.next_bit_index).where(table.c.id == 1)
+                                        .with_for_update()).scalar()
+    # activities inserted with their bit index given count as well
+    highest = connection.execute(select(func.max(Activity.__table__.c.bit_index))).scalar()
+    start = max(next_bit_index or 0, 0 if highest is None else highest + 1)
+    if start + count > MAX_BIT_INDEXES:
+        raise CatalogFull(f'The activity catalog is full, {MAX_BIT_INDEXES} activities '
+                          f'were created already.')
+    updated = connection.execute(table.update().where(table.c.id == 1)
+                                 .values(next_bit_index=start + count))
+    if not updated.rowcount:
+        connection.execute(table.insert().values(id=1, version=0, next_bit_index=start + count))
+    return list(range(start, start + count))
+
+
+def _assign_bit_index(mapper, connection, target):
+    if target.bit_index is None:
+        target.bit_index, = allocate_bit_indexes(connection, 1)
+
+
+def _on_catalog_write(mapper, connection, target):
+    bump_catalog_version(connection)
+
+
+def listen_for_changes(activity_model, *models):
+    event.listen(activity_model, 'before_insert', _assign_bit_index)
+    for model in (activity_model,) + models:
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, _on_catalog_write)
+        # tables (re)created by db.create_all start out empty
+        event.listen(model.__table__, 'after_create', invalidate_catalog)
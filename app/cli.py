@@ -1,4 +1,6 @@
 import os
+import time
+
 import click
 
 
@@ -33,3 +35,64 @@ def register(app):
         """Compile all languages."""
         if os.system('pybabel compile -d app/translations'):
             raise RuntimeError('compile command failed')
+
+    @app.cli.group()
+    def games():
+        """Game maintenance commands."""
+        pass
+
+    @games.command('check-totals')
+    @click.argument('game_ids', nargs=-1, type=int)
+    @click.option('--fix', is_flag=True, help='Write the rebuilt totals back.')
+    def check_totals(game_ids, fix):
+        """Rebuild the running totals on Input and report differences."""
+        from app.models import Game
+        from app.totals import check_running_totals
+        game_ids = game_ids or [g.id for g in Game.query.order_by(Game.id)]
+        differences = 0
+        for game_id in game_ids:
+            mismatches = check_running_totals(game_id, fix=fix)
+            for m in mismatches:
+                click.echo(f'Game {game_id} team {m.team_id} day {m.day}: '
+                           f'{m.column} is {m.stored}, expected {m.expected}')
+            click.echo(f'Game {game_id}: {len(mismatches)} differences'
+                       + (', fixed' if fix and mismatches else ''))
+            differences += len(mismatches)
+        if differences and not fix:
+            raise SystemExit(1)
+
+    @games.command('run-schedules')
+    @click.option('--loop', is_flag=True, help='Keep checking, like the scheduler thread.')
+    def run_schedules(loop):
+        """Submit the advances of the due game schedules."""
+        from app import db
+        from app.scheduler import TICK_SECONDS, run_due_schedules
+        while True:
+            for task in run_due_schedules():
+                click.echo(f'Game {task.game_id}: {task.description}, task {task.id}')
+            if not loop:
+                break
+            db.session.remove()
+            time.sleep(TICK_SECONDS)
+
+    @games.command('fast-forward')
+    @click.argument('game_id', type=int)
+    @click.argument('periods', type=click.IntRange(min=1))
+    def fast_forward(game_id, periods):
+        """Advance a game by PERIODS periods in one transaction."""
+        from app.tasks import fast_forward as fast_forward_task
+        try:
+            click.echo(fast_forward_task(game_id, periods))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    @games.command('advance-all')
+    @click.option('--workers', type=click.IntRange(min=1),
+                  help='Processes to use, ADVANCE_ALL_WORKERS by default.')
+    def advance_all(workers):
+        """Advance every active game by one period, in parallel."""
+        from app.batch import advance_all_games, summary
+        results = advance_all_games(workers)
+        click.echo(summary(results))
+        if any(r.error is not None for r in results):
+            raise SystemExit(1)
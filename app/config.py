@@ -23,6 +23,16 @@ class Config:
     SECRET_KEY = os.environ.get('FLASK_APP_SECRET_KEY') or 'super-secret-key-that-you-will-never-guess'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://'
+    # 'local' or 'redis', see app/events.py
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND') or 'local'
+    # 'thread', 'rq' or 'inline', see app/jobs.py
+    JOBS_BACKEND = os.environ.get('JOBS_BACKEND') or 'thread'
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS') or 2)
+    # processes of `flask games advance-all`, the number of CPUs when unset
+    ADVANCE_ALL_WORKERS = int(os.environ.get('ADVANCE_ALL_WORKERS') or 0)
+    # 'thread' runs the game schedules in every web process, 'off' leaves
+    # them to `flask games run-schedules`
+    SCHEDULER = os.environ.get('SCHEDULER') or 'thread'
     POSTGRES = {
         'user': os.environ.get('FLASK_APP_DATABASE_USER') or 'game',
         'pw': os.environ.get('FLASK_APP_DATABASE_PASSWORD') or '123',
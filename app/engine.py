@@ -0,0 +1,141 @@
+"""
+Game rules for advancing a game by one period.
+
+Nothing in here touches the database: the caller loads the state of every
+team in a game, hands it to `advance_game` together with the compiled
+`ActivityGraph` and writes the returned results back. That keeps the rules
+usable (and testable) without a session.
+"""
+from collections import namedtuple
+
+INTEREST_RATE_PER_MONTH = 0.042
+RENT_PER_MONTH = 900
+MAX_DAY = 999999999
+PERIOD_INCREMENT_IN_DAYS = 10
+DAYS_IN_GAME_MONTH = 30
+NOT_ENOUGH_FUNDS_PENALTY = 60
+STARTING_FUNDS = 2100
+PROFIT_PER_DAY = 75
+
+# requirements is a frozenset of activity ids that have to be finished first
+ActivitySpec = namedtuple('ActivitySpec', ['id', 'cost', 'days_needed', 'requirements'])
+
+# a TeamActivity initiated in the current period, waiting to be started
+QueuedActivity = namedtuple('QueuedActivity', ['id', 'activity_id'])
+
+# a queued TeamActivity that got started this period
+StartedActivity = namedtuple('StartedActivity', ['id', 'activity_id', 'started_on_day',
+                                                 'finished_on_day'])
+
+
+class TeamState:
+    """
+    Everything the rules need to know about a team at the current day.
+    """
+    __slots__ = ('team_id', 'money_at_start_of_period', 'credit_taken', 'credit_to_take',
+                 'queued', 'finished', 'penalty_cost')
+
+    def __init__(self, team_id, money_at_start_of_period=0, credit_taken=0, credit_to_take=0,
+                 queued=(), finished=0, penalty_cost=0):
+        self.team_id = team_id
+        self.money_at_start_of_period = money_at_start_of_period or 0
+        self.credit_taken = credit_taken or 0
+        self.credit_to_take = credit_to_take or 0
+        # QueuedActivity tuples, in the order the team initiated them
+        self.queued = list(queued)
+        # ActivityGraph mask of the activities finished by the current day
+        self.finished = finished
+        # fines already booked against the next period
+        self.penalty_cost = penalty_cost or 0
+
+
+class PeriodResult:
+    """
+    Outcome of one period for one team: the activities that got started,
+    the penalties for the ones that did not and the next period finances.
+    """
+    __slots__ = ('team_id', 'active_at_day', 'started', 'penalties', 'credit_taken',
+                 'interest_cost', 'rent_cost', 'total_penalty_cost', 'profit',
+                 'money_at_start_of_period', 'money_at_end_of_period')
+
+    def __init__(self, team_id, active_at_day):
+        self.team_id = team_id
+        self.active_at_day = active_at_day
+        self.started = []
+        # (activity_id, fine) for every queued activity that could not start
+        self.penalties = []
+        self.credit_taken = 0
+        self.interest_cost = 0
+        self.rent_cost = 0
+        self.total_penalty_cost = 0
+        self.profit = 0
+        self.money_at_start_of_period = 0
+        # money at the end of the current period, same as the next period start
+        self.money_at_end_of_period = 0
+
+
+def is_activity_eligible(graph, activity, finished, available_money):
+    if not graph.is_eligible(activity.id, finished):
+        return False
+    return activity.cost <= available_money
+
+
+def rent_for_day(day):
+    return RENT_PER_MONTH if (day - 1) % DAYS_IN_GAME_MONTH == 0 else 0
+
+
+def interest_for_credit(credit_taken):
+    return credit_taken * (INTEREST_RATE_PER_MONTH * (PERIOD_INCREMENT_IN_DAYS / DAYS_IN_GAME_MONTH))
+
+
+def advance_team(state, graph, current_day):
+    """
+    Start what the team can afford, fine the rest and work out the
+    finances of the next period.
+    """
+    result = PeriodResult(state.team_id, current_day + PERIOD_INCREMENT_IN_DAYS)
+    finished = state.finished
+    completed_all = finished == graph.all_mask
+
+    available_money = state.money_at_start_of_period
+    for queued in state.queued:
+        act = graph.activities[queued.activity_id]
+        if is_activity_eligible(graph, act, finished, available_money):
+            available_money -= act.cost
+            finished_on_day = current_day + act.days_needed
+            result.started.append(StartedActivity(queued.id, act.id, current_day, finished_on_day))
+            if finished_on_day <= current_day:
+                finished |= graph.bits[act.id]
+        else:
+            result.penalties.append((act.id, NOT_ENOUGH_FUNDS_PENALTY))
+
+    profit = result.profit = PROFIT_PER_DAY * PERIOD_INCREMENT_IN_DAYS if completed_all else 0
+    result.total_penalty_cost = state.penalty_cost + sum(fine for _, fine in result.penalties)
+    result.credit_taken = state.credit_taken + state.credit_to_take
+    result.interest_cost = interest_for_credit(state.credit_taken)
+    result.rent_cost = rent_for_day(result.active_at_day)
+    result.money_at_start_of_period = (available_money + state.credit_to_take
+                                       + profit
+                                       - result.total_penalty_cost
+                                       - result.interest_cost
+                                       - result.rent_cost)
+    # start to return the credit after on profit
+    if profit > 0:
+        if result.credit_taken > 0 and result.money_at_start_of_period > 0:
+            if result.credit_taken <= result.money_at_start_of_period:
+                result.money_at_start_of_period -= result.credit_taken
+                result.credit_taken = 0
+            else:
+                result.credit_taken -= result.money_at_start_of_period
+                result.money_at_start_of_period = 0
+
+    result.money_at_end_of_period = result.money_at_start_of_period
+    return result
+
+
+def advance_game(teams, graph, current_day):
+    """
+    Advance every team of a game by one period.
+    Returns a PeriodResult per TeamState, in the same order.
+    """
+    return [advance_team(state, graph, current_day) for state in teams]
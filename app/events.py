@@ -0,0 +1,263 @@
+"""
+Per game notifications for the player and admin pages, sent as server-sent
+events.
+
+Two events exist: `day` when the game moved to another day and `team` when a
+team changed its choices for the period (its Input.version moved). Pages
+only reload on them, instead of being refreshed by hand.
+
+The routes publish to the broker of the app right after committing. The
+default, in-process broker only reaches the streams of the same worker, so
+it also runs a DatabaseWatcher: one thread per worker that compares the days
+and input versions of the watched games every EVENTS_POLL_SECONDS and
+publishes what another process changed. With EVENTS_BACKEND = 'redis' the
+events go through Redis pub/sub instead and nothing is polled.
+
+A stream holds no database connection while it waits, so with the gevent
+workers gunicorn.conf.py sets up an idle page costs a greenlet and a socket.
+"""
+import json
+import queue
+import threading
+from time import monotonic, sleep
+
+from flask import current_app
+
+EVENTS_POLL_SECONDS = 2
+HEARTBEAT_SECONDS = 20
+# how long EventSource waits before reconnecting, in milliseconds
+RETRY_MS = 3000
+# the pages reload on any event, a slow reader can miss some of them
+SUBSCRIPTION_QUEUE_SIZE = 64
+
+DAY = 'day'
+TEAM = 'team'
+
+
+class Subscription:
+    """ The events of one game for one stream, without repeats. """
+
+    def __init__(self, broker, game_id, current_day, versions):
+        self.broker = broker
+        self.game_id = game_id
+        self.queue = queue.Queue(SUBSCRIPTION_QUEUE_SIZE)
+        # what the page was rendered with, a change is published by the
+        # route and the watcher both
+        self._seen = {DAY: current_day}
+        self._seen.update(((TEAM, team_id), version) for team_id, version in versions.items())
+
+    def put(self, event, data):
+        key = DAY if event == DAY else (TEAM, data['team_id'])
+        value = data['current_day'] if event == DAY else data['version']
+        if self._seen.get(key) == value:
+            return
+        if event == DAY:
+            # the inputs of another day start their versions over
+            self._seen = {}
+        self._seen[key] = value
+        try:
+            self.queue.put_nowait((event, data))
+        except queue.Full:
+            pass
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """ Fans events out to the subscriptions of this process. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, game_id, current_day, versions):
+        subscription = Subscription(self, game_id, current_day, versions)
+        with self._lock:
+            self._subscriptions.setdefault(game_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.game_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.game_id, None)
+
+    def watched_games(self):
+        with self._lock:
+            return list(self._subscriptions)
+
+    def publish(self, game_id, event, data):
+        self.deliver(game_id, event, data)
+
+    def deliver(self, game_id, event, data):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(game_id, ()))
+        for subscription in subscriptions:
+            subscription.put(event, data)
+
+
+class WatchedLocalBroker(LocalBroker):
+    """ LocalBroker that also picks up the changes of other processes. """
+
+    def __init__(self, app):
+        super().__init__()
+        self.watcher = DatabaseWatcher(app, self)
+
+    def subscribe(self, game_id, current_day, versions):
+        subscription = super().subscribe(game_id, current_day, versions)
+        self.watcher.start()
+        return subscription
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes through Redis, one listener thread per process delivers the
+    events of every game to the local subscriptions.
+    """
+    CHANNEL_PREFIX = 'warehouse-game:events:'
+
+    def __init__(self, url):
+        super().__init__()
+        # optional dependency, only needed with EVENTS_BACKEND = 'redis'
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def publish(self, game_id, event, data):
+        self._redis.publish(f'{self.CHANNEL_PREFIX}{game_id}', json.dumps({'event': event, 'data': data}))
+
+    def subscribe(self, game_id, current_day, versions):
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='events-redis', daemon=True)
+                self._listener.start()
+        return super().subscribe(game_id, current_day, versions)
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f'{self.CHANNEL_PREFIX}*')
+        for message in pubsub.listen():
+            game_id = int(message['channel'].decode()[len(self.CHANNEL_PREFIX):])
+            payload = json.loads(message['data'])
+            self.deliver(game_id, payload['event'], payload['data'])
+
+
+class DatabaseWatcher:
+    """
+    Polls the day and the current input versions of the games that have
+    streams in this process, two queries per poll however many streams
+    there are.
+    """
+
+    def __init__(self, app, broker):
+        self.app = app
+        self.broker = broker
+        self._state = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='events-watcher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        next_poll = monotonic()
+        while True:
+            next_poll += EVENTS_POLL_SECONDS
+            try:
+                with self.app.app_context():
+                    self.poll()
+            except Exception:
+                self.app.logger.exception('Polling the game events failed')
+            sleep(max(0, next_poll - monotonic()))
+
+    def poll(self):
+        from app import db
+        from app.models import Game, Input
+
+        game_ids = self.broker.watched_games()
+        # games nobody watches any more start afresh when they are watched again
+        for game_id in set(self._state) - set(game_ids):
+            del self._state[game_id]
+        if not game_ids:
+            return
+        try:
+            days = dict(db.session.query(Game.id, Game.current_day).filter(Game.id.in_(game_ids)))
+            versions = {}
+            for game_id, team_id, version in db.session.query(Input.game_id, Input.team_id, Input.version) \
+                    .join(Game, (Game.id == Input.game_id) & (Game.current_day == Input.active_at_day)) \
+                    .filter(Input.game_id.in_(game_ids)):
+                versions.setdefault(game_id, {})[team_id] = version
+        finally:
+            db.session.remove()
+
+        for game_id, current_day in days.items():
+            # a game seen for the first time is delivered as it is, the
+            # subscriptions drop what their page already shows
+            day_before, versions_before = self._state.get(game_id, (None, {}))
+            team_versions = versions.get(game_id, {})
+            self._state[game_id] = (current_day, team_versions)
+            if current_day != day_before:
+                self.broker.deliver(game_id, DAY, {'game_id': game_id, 'current_day': current_day})
+                if day_before is not None:
+                    continue
+            for team_id, version in team_versions.items():
+                if versions_before.get(team_id) != version:
+                    self.broker.deliver(game_id, TEAM, {'game_id': game_id, 'team_id': team_id,
+                                                        'version': version})
+
+
+def init_app(app):
+    backend = app.config.get('EVENTS_BACKEND', 'local')
+    if backend == 'redis':
+        broker = RedisBroker(app.config['REDIS_URL'])
+    elif backend == 'local':
+        broker = WatchedLocalBroker(app)
+    else:
+        raise ValueError(f'Unknown EVENTS_BACKEND {backend!r}')
+    app.extensions['events'] = broker
+
+
+def get_broker():
+    return current_app.extensions['events']
+
+
+def _publish(game_id, event, data):
+    # the change is committed, a lost notification must not fail the request
+    try:
+        get_broker().publish(game_id, event, data)
+    except Exception:
+        current_app.logger.exception('Publishing the %s event of game %s failed', event, game_id)
+
+
+def publish_day(game_):
+    _publish(game_.id, DAY, {'game_id': game_.id, 'current_day': game_.current_day})
+
+
+def publish_team(input_):
+    _publish(input_.game_id, TEAM, {'game_id': input_.game_id, 'team_id': input_.team_id,
+                                    'version': input_.version})
+
+
+def event_stream(subscription):
+    """ The subscription as text/event-stream, with a comment as heartbeat. """
+    yield f'retry: {RETRY_MS}\n\n'
+    while True:
+        message = subscription.get(timeout=HEARTBEAT_SECONDS)
+        if message is None:
+            # also how a dropped connection is noticed
+            yield ': keep-alive\n\n'
+            continue
+        event, data = message
+        yield f'event: {event}\ndata: {json.dumps(data)}\n\n'
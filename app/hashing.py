@@ -0,0 +1,31 @@
+"""
+Password hashing for creating users in bulk.
+
+PBKDF2 is deliberately slow and CPU bound, so a cohort of hashes is spread
+over a process pool instead of being computed one after the other. The pool
+is spawned rather than forked, like the one of app/batch.py: the roster
+import runs it from a job thread.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+# below this many passwords starting the pool costs more than it saves
+POOL_THRESHOLD = 16
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    generate_password_hash for every password, in the same order.
+    `workers` defaults to the number of CPUs.
+    """
+    passwords = list(passwords)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < POOL_THRESHOLD:
+        return [generate_password_hash(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
@@ -0,0 +1,153 @@
+"""
+Who is asking: the logged in user, their team and the game it plays.
+
+Flask-Login loads the user on every request. `load_user` keeps the column
+values of recently seen users per worker for IDENTITY_TTL_SECONDS and
+rebuilds the user from them without a query; on a miss the user, team and
+game come back from one joined query.
+
+`current_membership` resolves the team and game once per request, again with
+one joined query, and remembers them on `g`. Teams and games are never kept
+across requests, the current day moves with every period advance.
+
+`check_token` looks the token up on every call, with one query for the user
+id and expiration on the unique token index, so a token revoked by any
+worker is refused on the next call. The user itself comes from the cache of
+`load_user`, and no token is ever hashed.
+
+Changes to a user through the ORM drop the cached copy once the transaction
+commits; dropping it at flush would let a request in between cache the
+values being replaced. Bulk updates call `forget_users`. Other workers pick
+the change up once their copy expires.
+"""
+from datetime import datetime
+from time import monotonic
+
+from flask import g
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from sqlalchemy.orm.util import identity_key
+
+from app import db
+
+IDENTITY_TTL_SECONDS = 15
+MAX_CACHED_USERS = 4096
+# Session.info key of the users written in the current transaction
+WRITTEN_USERS = 'identity_written_users'
+
+# user id -> (cached at, column values)
+_users = {}
+
+
+def _remember(user):
+    if len(_users) >= MAX_CACHED_USERS:
+        # dicts keep insertion order, the first entries are the oldest
+        for id_ in list(_users)[:MAX_CACHED_USERS // 4]:
+            _users.pop(id_, None)
+    _users[user.id] = (monotonic(), {attr.key: getattr(user, attr.key)
+                                     for attr in user.__mapper__.column_attrs})
+
+
+def _from_cache(model, values):
+    """ The cached user as a clean, persistent instance of this session. """
+    existing = db.session.identity_map.get(identity_key(model, values['id']))
+    if existing is not None:
+        return existing
+    user = model(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def load_user(id):
+    from app.models import Game, Team, User
+
+    id = int(id)
+    cached = _users.get(id)
+    if cached is not None and monotonic() - cached[0] < IDENTITY_TTL_SECONDS:
+        return _from_cache(User, cached[1])
+
+    row = db.session.query(User, Team, Game) \
+        .outerjoin(Team, User.team_id == Team.id) \
+        .outerjoin(Game, Team.game_id == Game.id) \
+        .filter(User.id == id).first()
+    if row is None:
+        _users.pop(id, None)
+        return None
+    user, team_, game_ = row
+    _remember(user)
+    g.membership = (user.id, user.team_id, team_, game_)
+    return user
+
+
+def current_membership():
+    """ (team, game) of the current user, either can be None. """
+    from app.models import Game, Team
+
+    user_id, team_id = current_user.id, current_user.team_id
+    membership = g.get('membership')
+    if membership is None or membership[:2] != (user_id, team_id):
+        row = None
+        if team_id is not None:
+            row = db.session.query(Team, Game) \
+                .outerjoin(Game, Team.game_id == Game.id) \
+                .filter(Team.id == team_id).first()
+        team_, game_ = row or (None, None)
+        membership = g.membership = (user_id, team_id, team_, game_)
+    return membership[2], membership[3]
+
+
+def check_token(token):
+    """ The user of an API token that has not expired, or None. """
+    from app.models import User
+
+    row = db.session.query(User.id, User.token_expiration).filter(User.token == token).first()
+    if row is None or row.token_expiration is None or row.token_expiration <= datetime.utcnow():
+        return None
+    return load_user(row.id)
+
+
+def forget_users(user_ids=None):
+    """ Drop the cached users, all of them when `user_ids` is None. """
+    if user_ids is None:
+        _users.clear()
+        return
+    for id_ in user_ids:
+        _users.pop(int(id_), None)
+
+
+def _on_user_write(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        forget_users([target.id])
+    else:
+        session.info.setdefault(WRITTEN_USERS, set()).add(target.id)
+
+
+def _on_commit(session):
+    user_ids = session.info.pop(WRITTEN_USERS, None)
+    if user_ids:
+        forget_users(user_ids)
+
+
+def _on_rollback(session):
+    # nothing was written, the cached copies are still current
+    session.info.pop(WRITTEN_USERS, None)
+
+
+def _reset_membership():
+    g.pop('membership', None)
+
+
+def listen_for_changes(model):
+    for name in ('after_update', 'after_delete'):
+        event.listen(model, name, _on_user_write)
+    event.listen(Session, 'after_commit', _on_commit)
+    event.listen(Session, 'after_rollback', _on_rollback)
+    # tables (re)created by db.create_all start out empty
+    event.listen(model.__table__, 'after_create', lambda *args, **kwargs: forget_users())
+
+
+def init_app(app):
+    # g outlives a request when the app context was pushed by someone else
+    app.before_request(_reset_membership)
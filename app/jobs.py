@@ -0,0 +1,184 @@
+"""
+Background jobs for the long admin operations, the period advance first.
+
+`submit` stores a Task row and hands the job to the backend of the app,
+JOBS_BACKEND:
+
+- 'thread': a pool of JOBS_WORKERS threads in the web process, for a single
+  node. Jobs of a process that dies stay unfinished.
+- 'rq': an RQ queue in Redis at REDIS_URL, worked off by
+  `rq worker warehouse-game --url $REDIS_URL` next to the web app. Needs the
+  rq package.
+- 'inline': runs the job before `submit` returns, for tests and scripts.
+
+Every backend ends up in `run_task`, which runs the function of app/tasks.py
+and keeps the status, progress and message of the Task up to date. Those
+are written on their own connection, the task itself can be in the middle
+of a transaction when it reports progress.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from flask import current_app
+
+from app import db
+
+QUEUE_NAME = 'warehouse-game'
+JOB_TIMEOUT_SECONDS = 30 * 60
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+_current_task_id = contextvars.ContextVar('current_task_id', default=None)
+
+
+def _update_task(task_id, **values):
+    from app.models import Task
+    table = Task.__table__
+    with db.engine.begin() as connection:
+        connection.execute(table.update().where(table.c.id == task_id).values(**values))
+
+
+def set_progress(progress):
+    """ Progress of the running task in percent; outside of a task a no-op. """
+    task_id = _current_task_id.get()
+    if task_id is None:
+        return
+    try:
+        _update_task(task_id, progress=progress)
+    except Exception:
+        # a progress bar that lags behind is no reason to fail the task
+        current_app.logger.warning('Could not report the progress of task %s', task_id, exc_info=True)
+
+
+def run_task(task_id, name, args):
+    """ Run app.tasks.<name>(*args) as the task, within an app context. """
+    from app import tasks
+
+    _update_task(task_id, status=RUNNING)
+    token = _current_task_id.set(task_id)
+    try:
+        message = getattr(tasks, name)(*args)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Task %s (%s) failed', task_id, name)
+        _update_task(task_id, status=FAILED, message=str(e) or e.__class__.__name__, complete=True,
+                     date_finished=datetime.utcnow())
+    else:
+        _update_task(task_id, status=FINISHED, progress=100, message=message, complete=True,
+                     date_finished=datetime.utcnow())
+    finally:
+        _current_task_id.reset(token)
+
+
+class InlineBackend:
+
+    def enqueue(self, task_id, name, args):
+        run_task(task_id, name, args)
+
+
+class ThreadBackend:
+
+    def __init__(self, app, workers):
+        self.app = app
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs')
+
+    def enqueue(self, task_id, name, args):
+        self._pool.submit(self._run, task_id, name, args)
+
+    def _run(self, task_id, name, args):
+        with self.app.app_context():
+            try:
+                run_task(task_id, name, args)
+            finally:
+                db.session.remove()
+
+
+class RQBackend:
+
+    def __init__(self, url):
+        # optional dependencies, only needed with JOBS_BACKEND = 'rq'
+        import redis
+        import rq
+        self._queue = rq.Queue(QUEUE_NAME, connection=redis.Redis.from_url(url),
+                               default_timeout=JOB_TIMEOUT_SECONDS)
+
+    def enqueue(self, task_id, name, args):
+        self._queue.enqueue('app.jobs.run_rq_task', task_id, name, args, job_id=task_id)
+
+
+_worker_app = None
+
+
+def run_rq_task(task_id, name, args):
+    """ run_task for the RQ worker, which has no app of its own. """
+    global _worker_app
+    if _worker_app is None:
+        from app import create_app
+        _worker_app = create_app()
+    with _worker_app.app_context():
+        try:
+            run_task(task_id, name, args)
+        finally:
+            db.session.remove()
+
+
+def init_app(app):
+    backend = app.config.get('JOBS_BACKEND', 'thread')
+    if backend == 'thread':
+        jobs_backend = ThreadBackend(app, app.config.get('JOBS_WORKERS', 2))
+    elif backend == 'rq':
+        jobs_backend = RQBackend(app.config['REDIS_URL'])
+    elif backend == 'inline':
+        jobs_backend = InlineBackend()
+    else:
+        raise ValueError(f'Unknown JOBS_BACKEND {backend!r}')
+    app.extensions['jobs'] = jobs_backend
+
+
+def submit(name, *args, description, user_id=None, game_id=None):
+    """
+    Store a Task for app.tasks.<name>(*args) and queue it. The returned
+    task is expired, reading it shows how far the job got.
+    """
+    from app.models import Task
+
+    task = Task(id=str(uuid4()), name=name, description=description, user_id=user_id,
+                game_id=game_id, status=QUEUED, progress=0, complete=False)
+    db.session.add(task)
+    db.session.commit()
+    current_app.extensions['jobs'].enqueue(task.id, name, args)
+    db.session.expire(task)
+    return task
+
+
+def _tasks(game_id, name):
+    from app.models import Task
+
+    query = Task.query.filter(Task.game_id == game_id)
+    if name is not None:
+        query = query.filter(Task.name == name)
+    return query
+
+
+def running_tasks(game_id, name=None):
+    """
+    The unfinished tasks of the game that can still be running, oldest
+    first. Tasks of no game are told apart by their `name`.
+    """
+    from app.models import Task
+
+    since = datetime.utcnow() - timedelta(seconds=JOB_TIMEOUT_SECONDS)
+    return _tasks(game_id, name).filter(Task.complete.is_(False), Task.date_created > since) \
+        .order_by(Task.date_created).all()
+
+
+def last_finished_task(game_id, name=None):
+    from app.models import Task
+
+    return _tasks(game_id, name).filter(Task.complete.is_(True)) \
+        .order_by(Task.date_finished.desc()).first()
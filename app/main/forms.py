@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import StringField, IntegerField, PasswordField, BooleanField, SubmitField, FloatField, SelectField, \
-    RadioField
+    RadioField, HiddenField, SelectMultipleField
 from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, NumberRange, Optional
 
 from app.models import User
@@ -34,12 +35,45 @@ class GameAssignForm(FlaskForm):
     submit = SubmitField('Save')
 
 
+class GameBulkAssignForm(FlaskForm):
+    add_teams = SelectMultipleField('Add Teams', coerce=int, validators=[Optional()])
+    remove_teams = SelectMultipleField('Remove Teams', coerce=int, validators=[Optional()])
+    submit = SubmitField('Save')
+
+
+class UserBulkMoveForm(FlaskForm):
+    users = SelectMultipleField('Players', coerce=int, validators=[DataRequired()])
+    team_id = SelectField('Move to team', validators=[DataRequired()])
+    submit = SubmitField('Move')
+
+
 class GameCreateForm(FlaskForm):
     submit = SubmitField('New Game')
 
 
+class GamesAdvanceAllForm(FlaskForm):
+    submit = SubmitField('Advance all games')
+
+
 class GamePlayForm(FlaskForm):
     increase_period = RadioField('Label', choices=[('increase', 'Increase period'), ('decrease', 'Decrease period')])
+    # the day the admin was looking at, a resubmitted form for an old day is ignored
+    current_day = HiddenField()
+    submit = SubmitField('Save')
+
+
+class GameFastForwardForm(FlaskForm):
+    periods = IntegerField('Periods', default=5, validators=[DataRequired(), NumberRange(min=1, max=100)])
+    # like GamePlayForm, a form sent for an old day is ignored
+    current_day = HiddenField()
+    submit = SubmitField('Fast forward')
+
+
+class GameScheduleForm(FlaskForm):
+    is_active = BooleanField('Advance automatically')
+    interval_minutes = IntegerField('Minutes per period', validators=[DataRequired(), NumberRange(min=1)])
+    stop_at_day = IntegerField('Stop at day', validators=[Optional(), NumberRange(min=1)])
+    stop_activity_id = SelectField('Stop when every team finished', validators=[Optional()])
     submit = SubmitField('Save')
 
 
@@ -49,3 +83,8 @@ class GameUserForm(FlaskForm):
     apply_for_credit = IntegerField('Apply for credit', validators=[Optional()])
 
     submit = SubmitField('Save')
+
+
+class RosterImportForm(FlaskForm):
+    roster = FileField('Roster (CSV or JSON)', validators=[FileRequired(), FileAllowed(['csv', 'json'])])
+    submit = SubmitField('Import')
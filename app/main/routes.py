@@ -1,28 +1,36 @@
 import io
 import csv
 from functools import wraps
+from itertools import groupby
+from types import SimpleNamespace
 
-from flask import flash, redirect, render_template, url_for, make_response
+from flask import flash, redirect, render_template, request, url_for, make_response, Response, \
+    stream_with_context
 from flask_babel import _
 from flask_login import current_user, login_required
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 
 from app import db
 from app.auth.routes import admin_required
-from app.models import Activity, ActivityRequirement, Game, Team, TeamActivity, \
-    User, Input, InputHistory, Penalty
+from app.models import Game, GameSchedule, Team, TeamActivity, \
+    User, Input, InputHistory, Penalty, PeriodAdvance
 from app.main import bp
 from app.main.forms import TeamAssign, UserForm, GameAssignForm, GameCreateForm, \
-    GamePlayForm, GameUserForm, TeamForm
+    GamePlayForm, GameUserForm, TeamForm, RosterImportForm, GameBulkAssignForm, UserBulkMoveForm, \
+    GameScheduleForm, GameFastForwardForm, GamesAdvanceAllForm
+from app.engine import INTEREST_RATE_PER_MONTH, RENT_PER_MONTH, MAX_DAY, \
+    PERIOD_INCREMENT_IN_DAYS, DAYS_IN_GAME_MONTH, NOT_ENOUGH_FUNDS_PENALTY, STARTING_FUNDS, \
+    PROFIT_PER_DAY, QueuedActivity, TeamState, advance_game
+from app.catalog import get_activity_graph, get_catalog
+from app.events import DAY, event_stream, get_broker, publish_day, publish_team
+from app.identity import current_membership, forget_users
+from app.jobs import last_finished_task, running_tasks, submit as submit_job
+from app.scheduler import first_run_at
+from app.roster import ROSTER_FIELDS, RosterError, parse_roster
 
-INTEREST_RATE_PER_MONTH = 0.042
-RENT_PER_MONTH = 900
-MAX_DAY = 999999999
 NONE_OPTION = [('none_of_the_above', '-')]
-PERIOD_INCREMENT_IN_DAYS = 10
-DAYS_IN_GAME_MONTH = 30
-NOT_ENOUGH_FUNDS_PENALTY = 60
-STARTING_FUNDS = 2100
-PROFIT_PER_DAY = 75
+CSV_BATCH_SIZE = 1000
 
 
 def no_http_cache(view):
@@ -68,13 +76,14 @@ def _delete_object_from_db(model, **kwargs):
 
 
 def current_team():
-    current_team_ = Team.query.filter_by(id=current_user.team_id).first()
-    return current_team_
+    return current_membership()[0]
 
 
 def current_game():
-    current_team_ = current_team()
-    return Game.query.filter_by(id=current_team_.game_id).first()
+    current_team_, game_ = current_membership()
+    if current_team_ is None:
+        raise AttributeError('The current user has no team')
+    return game_
 
 
 @bp.route('/')
@@ -116,31 +125,44 @@ def team(team_id):
         # currently ised for is_active checkbox
 
         if form.add_user.data not in [None, NONE_OPTION[0][0]]:
-            change_object_reference_id(User, form.add_user.data, 'team_id', current_team_.id)
+            move_users_to_team([form.add_user.data], current_team_.id)
 
         if form.remove_user.data not in [None, NONE_OPTION[0][0]]:
-            change_object_reference_id(User, form.remove_user.data, 'team_id', None)
+            move_users_to_team([form.remove_user.data], None)
 
         flash(f'Successfully updated team.')
         return redirect(url_for('main.team', team_id=current_team_.id))
     return render_template('team.html', form=form, team=current_team_)
 
 
-def change_user_teamid(user_id, team_id):
-    # depends on value dipslayed on form
-    user_ = User.query.filter_by(id=user_id).first()
-    user_.team_id = team_id
-    db.session.add(user_)
+def move_users_to_team(user_ids, team_id):
+    """
+    Move the users to the team, or out of any team when `team_id` is None,
+    with one UPDATE.
+    """
+    user_ids = [int(id_) for id_ in user_ids]
+    if user_ids:
+        User.query.filter(User.id.in_(user_ids)).update({User.team_id: team_id},
+                                                        synchronize_session=False)
     db.session.commit()
+    forget_users(user_ids)
 
 
-def change_object_reference_id(object_model, object_id,
-                               object_reference_id, object_reference_id_value):
-    # generalize the above function
-    obj = object_model.query.filter_by(id=object_id).first()
-    setattr(obj, object_reference_id, object_reference_id_value)
-    db.session.add(obj)
-    db.session.commit()
+@bp.route('/users/move', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def users_move():
+    users_ = User.query.filter_by(is_active=True, is_admin=False).order_by(User.username).all()
+    teams_ = Team.query.filter_by(is_active=True).all()
+    form = UserBulkMoveForm()
+    form.users.choices = [(u.id, f'{u.username} (Team: {u.team_id})') for u in users_]
+    form.team_id.choices = NONE_OPTION + [(str(t.id), f'Team {t.id}, {t.display_name}') for t in teams_]
+    if form.validate_on_submit():
+        team_id = None if form.team_id.data == NONE_OPTION[0][0] else int(form.team_id.data)
+        move_users_to_team(form.users.data, team_id)
+        flash(f'Moved {len(form.users.data)} users.')
+        return redirect(url_for('main.users'))
+    return render_template('users_move.html', form=form)
 
 
 @bp.route('/users/<user_id>', methods=['GET', 'POST'])
@@ -168,6 +190,27 @@ def users():
     return render_template('users.html', users=users_)
 
 
+@bp.route('/users/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def users_import():
+    form = RosterImportForm()
+    if form.validate_on_submit():
+        try:
+            records = parse_roster(form.roster.data.filename, form.roster.data.read())
+        except RosterError as e:
+            flash(str(e))
+        else:
+            # hashing a class worth of passwords takes a while, it is a job
+            task = submit_job('import_roster', records, user_id=current_user.id,
+                              description=f'Import {len(records)} users from {form.roster.data.filename}')
+            if not task.complete:
+                flash(f'{task.description} started.')
+    return render_template('users_import.html', form=form, fields=ROSTER_FIELDS,
+                           tasks=running_tasks(None, 'import_roster'),
+                           last_task=last_finished_task(None, 'import_roster'))
+
+
 @bp.route('/games', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -182,7 +225,22 @@ def games():
             db.session.commit()
             flash(_('New game created.'))
             return redirect(url_for('main.games'))
-    return render_template('games.html', form=form, games=games_)
+    return render_template('games.html', form=form, games=games_,
+                           advance_all_form=GamesAdvanceAllForm(),
+                           tasks=running_tasks(None, 'advance_all_games'),
+                           last_task=last_finished_task(None, 'advance_all_games'))
+
+
+@bp.route('/games/advance_all', methods=['POST'])
+@login_required
+@admin_required
+def games_advance_all():
+    form = GamesAdvanceAllForm()
+    if form.validate_on_submit():
+        task = submit_job('advance_all_games', description='Advance all games', user_id=current_user.id)
+        # the summary has a line per game
+        flash(task.message.splitlines()[-1] if task.complete else f'{task.description} started.')
+    return redirect(url_for('main.games'))
 
 
 @bp.route('/reports', methods=['GET'])
@@ -198,32 +256,75 @@ def reports():
 @admin_required
 def report(game_id):
     game_ = Game.query.filter_by(id=game_id).first()
-    activities = Activity.query.all()
-    return render_template('report.html',  game=game_, activities=activities)
+    activities = get_catalog().activities
+    teams_ = Team.query.filter_by(game_id=game_.id).order_by(Team.id).all()
+    rows = _build_report_rows(teams_, activities)
+    return render_template('report.html',  game=game_, activities=activities, rows=rows)
+
+
+def _build_report_rows(teams_, activities):
+    """
+    One row per team input, ordered by team and day, with the status of
+    every activity on that day already worked out. Loads the inputs and the
+    team activities of all teams with one query each.
+    """
+    team_ids = [t.id for t in teams_]
+    statuses = {}
+    for ta in TeamActivity.query.filter(TeamActivity.team_id.in_(team_ids)).all():
+        if ta.started_on_day is not None:
+            statuses.setdefault((ta.team_id, ta.started_on_day), {}) \
+                .setdefault(ta.activity_id, []).append('started')
+        if ta.initiated_on_day is not None and ta.initiated_on_day != ta.started_on_day:
+            statuses.setdefault((ta.team_id, ta.initiated_on_day), {}) \
+                .setdefault(ta.activity_id, []).append('initiated')
+        if ta.finished_on_day is not None:
+            statuses.setdefault((ta.team_id, ta.finished_on_day), {}) \
+                .setdefault(ta.activity_id, []).append('finished')
+
+    names = {t.id: t.display_name for t in teams_}
+    order = {team_id: i for i, team_id in enumerate(team_ids)}
+    inputs = Input.query.filter(Input.team_id.in_(team_ids)).all()
+    inputs.sort(key=lambda i: (order[i.team_id], i.active_at_day))
+    rows = []
+    for input_ in inputs:
+        day_statuses = statuses.get((input_.team_id, input_.active_at_day), {})
+        rows.append({'team': names[input_.team_id],
+                     'day': input_.active_at_day,
+                     'money_at_start_of_period': input_.money_at_start_of_period,
+                     'money_at_end_of_period': input_.money_at_end_of_period,
+                     'credit_taken': input_.credit_taken,
+                     'credit_to_take': input_.credit_to_take,
+                     'interest_cost': input_.interest_cost,
+                     'total_penalty_cost': input_.total_penalty_cost,
+                     'rent_cost': input_.rent_cost,
+                     'activities': [' '.join(day_statuses.get(a.id, ())) for a in activities]})
+    return rows
 
 @bp.route('/game_status/<game_id>', methods=['GET'])
 @login_required
 @admin_required
 def game_status(game_id):
     game_ = Game.query.filter_by(id=game_id).first()
-    teams_stub = []
+    rows = db.session.query(Team.id, Input.money_at_start_of_period, Input.credit_taken,
+                            Input.cumulative_interest_cost, Input.cumulative_penalty_cost,
+                            Input.cumulative_rent_cost, Input.finished_mask) \
+        .join(Input, and_(Input.team_id == Team.id, Input.game_id == game_.id,
+                          Input.active_at_day == game_.current_day)) \
+        .filter(Team.game_id == game_.id) \
+        .order_by(Team.id).all()
+    graph = get_activity_graph()
+    finished = _current_finished_masks(game_, {row[0]: row[-1] for row in rows}, graph)
 
-    for team_ in game_.teams.all():
-        current_input = Input.query.filter_by(team_id=team_.id, active_at_day=game_.current_day).first()
-        if current_input:
-            t = {}
-            t.update({'id': team_.id})
-            t.update({'day': game_.current_day})
-            t.update({'current_money': current_input.money_at_start_of_period})
-            t.update({'credit_taken': current_input.credit_taken})
-            t.update({'finished': sorted([ta.activity_id for ta in _get_finished_activities(team_, game_)])})
-            t.update({'total_interest_cost': sum([i.interest_cost
-                                                  for i in Input.query.filter_by(team_id=team_.id).all()])})
-            t.update({'total_penalty_cost': sum([i.total_penalty_cost
-                                                 for i in Input.query.filter_by(team_id=team_.id).all()])})
-            t.update({'total_rent_cost': sum([i.rent_cost
-                                              for i in Input.query.filter_by(team_id=team_.id).all()])})
-            teams_stub.append(t)
+    teams_stub = []
+    for team_id, current_money, credit_taken, interest, penalty, rent, _mask in rows:
+        teams_stub.append({'id': team_id,
+                           'day': game_.current_day,
+                           'current_money': current_money,
+                           'credit_taken': credit_taken,
+                           'finished': graph.ids_of(finished.get(team_id, 0)),
+                           'total_interest_cost': interest or 0,
+                           'total_penalty_cost': penalty or 0,
+                           'total_rent_cost': rent or 0})
 
     return render_template('main_report.html',  teams=teams_stub)
 
@@ -241,73 +342,193 @@ def game_edit(game_id):
     form.remove_team.choices = NONE_OPTION + [
         (t.id, f'Team {t.id}, {t.display_name}') for t in assigned_teams]
     if form.validate_on_submit():
+        add_teams, remove_teams = [], []
         if form.add_team.data not in [None, NONE_OPTION[0][0]]:
-            change_object_reference_id(Team, form.add_team.data, 'game_id', game_.id)
-            initial_team_input = get_or_create(Input,
-                                               id=f'{game_.id}_{form.add_team.data}_{game_.current_day}')
-            db.session.add(game_)
-            db.session.add(initial_team_input)
-            db.session.commit()
-
+            add_teams.append(form.add_team.data)
         if form.remove_team.data not in [None, NONE_OPTION[0][0]]:
-            change_object_reference_id(Team, form.remove_team.data, 'game_id', None)
+            remove_teams.append(form.remove_team.data)
+        update_game_teams(game_, add_teams, remove_teams)
 
         flash(f'Successfully added team.')
         return redirect(url_for('main.game', game_id=game_.id))
     return render_template('game_edit.html', form=form, game=game_)
 
 
+@bp.route('/games/<game_id>/teams', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def game_teams(game_id):
+    game_ = Game.query.filter_by(id=game_id).first()
+    form = GameBulkAssignForm()
+    unassigned_teams = Team.query.filter_by(game_id=None, is_active=True).all()
+    assigned_teams = Team.query.filter_by(game_id=game_id, is_active=True).all()
+    form.add_teams.choices = [(t.id, f'Team {t.id}, {t.display_name}') for t in unassigned_teams]
+    form.remove_teams.choices = [(t.id, f'Team {t.id}, {t.display_name}') for t in assigned_teams]
+    if form.validate_on_submit():
+        update_game_teams(game_, form.add_teams.data, form.remove_teams.data)
+        flash(f'Added {len(form.add_teams.data)} and removed {len(form.remove_teams.data)} teams.')
+        return redirect(url_for('main.game', game_id=game_.id))
+    return render_template('game_teams.html', form=form, game=game_)
+
+
+@bp.route('/games/<game_id>/schedule', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def game_schedule(game_id):
+    game_ = Game.query.filter_by(id=game_id).first()
+    schedule = (GameSchedule.query.filter_by(game_id=game_.id).first()
+                or GameSchedule(game_id=game_.id, is_active=False, interval_minutes=10))
+    was_running = (schedule.is_active, schedule.interval_minutes)
+    form = GameScheduleForm(obj=schedule)
+    form.stop_activity_id.choices = NONE_OPTION + get_catalog().choices()
+    if not form.is_submitted():
+        form.stop_activity_id.data = schedule.stop_activity_id or NONE_OPTION[0][0]
+    if form.validate_on_submit():
+        form.populate_obj(schedule)
+        if schedule.stop_activity_id == NONE_OPTION[0][0]:
+            schedule.stop_activity_id = None
+        # a started or retimed schedule runs one interval from now
+        if schedule.is_active and (schedule.is_active, schedule.interval_minutes) != was_running:
+            schedule.next_run_at = first_run_at(game_.id, schedule.interval_minutes)
+        commit_to_db(schedule)
+        flash('Schedule saved.')
+        return redirect(url_for('main.game', game_id=game_.id))
+    return render_template('game_schedule.html', form=form, game=game_, schedule=schedule)
+
+
+def update_game_teams(game_, add_team_ids, remove_team_ids=()):
+    """
+    Put teams into the game, with their current period inputs, and take
+    others out of it in a single transaction.
+    """
+    add_team_ids = [int(id_) for id_ in add_team_ids]
+    remove_team_ids = [int(id_) for id_ in remove_team_ids]
+    try:
+        if add_team_ids:
+            Team.query.filter(Team.id.in_(add_team_ids)) \
+                .update({Team.game_id: game_.id}, synchronize_session=False)
+            create_period_inputs(game_, add_team_ids)
+        if remove_team_ids:
+            Team.query.filter(Team.id.in_(remove_team_ids), Team.game_id == game_.id) \
+                .update({Team.game_id: None}, synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
 @bp.route('/games/<game_id>', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def game(game_id):
     game_ = Game.query.filter_by(id=game_id).first()
     form = GamePlayForm(obj=game_)
+    task = None
     if form.validate_on_submit():
         if form.increase_period.data == 'increase':
             if game_.current_day < MAX_DAY:
-                _calculate_next_period(game_)
-                game_.increase_current_day(PERIOD_INCREMENT_IN_DAYS)
-                commit_to_db(game_)
+                from_day = int(form.current_day.data) if form.current_day.data else None
+                task = submit_job('advance_period', game_.id, from_day,
+                                  description=f'Advance day {from_day or game_.current_day}',
+                                  user_id=current_user.id, game_id=game_.id)
             else:
                 flash('Max day reached.')
         elif form.increase_period.data == 'decrease':
-            game_.decrease_current_day(PERIOD_INCREMENT_IN_DAYS)
-            commit_to_db(game_)
-            _update_team_inputs(game_)
-            _reset_current_input(game_)
-    return render_template('game.html', form=form, game=game_)
+            from_day = int(form.current_day.data) if form.current_day.data else None
+            task = submit_job('rollback_period', game_.id, from_day,
+                              description=f'Roll back day {from_day or game_.current_day}',
+                              user_id=current_user.id, game_id=game_.id)
+        if task is not None:
+            # the inline backend, or a quick worker, is done already
+            flash(task.message if task.complete else f'{task.description} started.')
+        # a fresh page carries the new current day, and reloading it does not post again
+        return redirect(url_for('main.game', game_id=game_.id))
+    return render_template('game.html', form=form, game=game_, tasks=running_tasks(game_.id),
+                           fast_forward_form=GameFastForwardForm(current_day=game_.current_day),
+                           last_task=last_finished_task(game_.id),
+                           schedule=GameSchedule.query.filter_by(game_id=game_.id, is_active=True).first())
+
+
+@bp.route('/games/<game_id>/fast_forward', methods=['POST'])
+@login_required
+@admin_required
+def game_fast_forward(game_id):
+    game_ = Game.query.filter_by(id=game_id).first_or_404()
+    form = GameFastForwardForm()
+    if not form.validate_on_submit():
+        flash('Fast forward between 1 and 100 periods.')
+    elif game_.current_day >= MAX_DAY:
+        flash('Max day reached.')
+    else:
+        from_day = int(form.current_day.data) if form.current_day.data else None
+        task = submit_job('fast_forward', game_.id, form.periods.data, from_day,
+                          description=f'Fast forward {form.periods.data} periods from day '
+                                      f'{from_day or game_.current_day}',
+                          user_id=current_user.id, game_id=game_.id)
+        flash(task.message if task.complete else f'{task.description} started.')
+    return redirect(url_for('main.game', game_id=game_.id))
+
+
+def rollback_game_period(game_, from_day=None):
+    """
+    Move the game one period back with a handful of set based statements in
+    a single transaction: the inputs after the new current day go, together
+    with their penalties and team activities, and the current inputs lose
+    what was queued for them.
+    Like advance_game_period the game row is locked, and when the game is no
+    longer at `from_day` nothing is done and False is returned, so a
+    resubmitted form or a concurrent advance cannot be rolled back over.
+    """
+    game_ = Game.query.filter_by(id=game_.id).with_for_update().first()
+    if from_day is not None and game_.current_day != from_day:
+        db.session.rollback()
+        return False
+    try:
+        game_.decrease_current_day(PERIOD_INCREMENT_IN_DAYS)
+        _update_team_inputs(game_)
+        _reset_current_input(game_)
+        PeriodAdvance.query.filter(PeriodAdvance.game_id == game_.id,
+                                   PeriodAdvance.from_day >= game_.current_day) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    publish_day(game_)
+    return True
 
 
 def _reset_current_input(game_):
-    for team_ in game_.teams:
-        current_input = Input.query.filter_by(team_id=team_.id, active_at_day=game_.current_day).first()
-        current_input.credit_to_take = 0
-        for ta in current_input.activities.all():
-            if ta.initiated_on_day == game_.current_day:
-                db.session.delete(ta)
-                db.session.commit()
-        commit_to_db(current_input)
+    current_inputs = db.session.query(Input.id).filter(Input.game_id == game_.id,
+                                                       Input.active_at_day == game_.current_day)
+    TeamActivity.query.filter(TeamActivity.input_id.in_(current_inputs),
+                              TeamActivity.initiated_on_day == game_.current_day) \
+        .delete(synchronize_session=False)
+    Input.query.filter(Input.game_id == game_.id, Input.active_at_day == game_.current_day) \
+        .update({Input.credit_to_take: 0, Input.version: Input.version + 1},
+                synchronize_session=False)
 
 
 def _update_team_inputs(game_):
-    for team_ in game_.teams:
-        for input_ in team_.inputs:
-            if game_.current_day < input_.active_at_day:
-                for team_act in input_.activities:
-                    db.session.delete(team_act)
-                    db.session.commit()
-                db.session.delete(input_)
-                db.session.commit()
+    later_inputs = db.session.query(Input.id).filter(Input.game_id == game_.id,
+                                                     Input.active_at_day > game_.current_day)
+    TeamActivity.query.filter(TeamActivity.input_id.in_(later_inputs)) \
+        .delete(synchronize_session=False)
+    Penalty.query.filter(Penalty.input_id.in_(later_inputs)) \
+        .delete(synchronize_session=False)
+    Input.query.filter(Input.game_id == game_.id, Input.active_at_day > game_.current_day) \
+        .delete(synchronize_session=False)
 
 
 def get_current_period_input(team_, game_):
-    current_period_input = get_or_create(Input,
-                                         id=f'{game_.id}_{team_.id}_{game_.current_day}')
-    current_period_input.team_id = team_.id
-    current_period_input.game_id = game_.id
-    current_period_input.active_at_day = game_.current_day
-    commit_to_db(current_period_input)
+    """
+    Current period Input of the team, created when missing. Commits, so it
+    belongs on write paths; teams joining a game go through
+    create_period_inputs instead.
+    """
+    current_period_input = (_find_period_input(team_.id, game_.id, game_.current_day)
+                            or Input(team_id=team_.id, game_id=game_.id,
+                                     active_at_day=game_.current_day))
 
     if game_.current_day == 1:
         current_period_input.credit_taken = STARTING_FUNDS
@@ -317,103 +538,354 @@ def get_current_period_input(team_, game_):
     return current_period_input
 
 
-def _calculate_next_period(game_):
-    all_activities = Activity.query.all()
-    for team_ in game_.teams:
+def create_period_inputs(game_, team_ids):
+    """
+    Set based get_current_period_input for teams joining a game: the
+    missing current period inputs are added with one bulk insert.
+    Committing is left to the caller.
+    """
+    team_ids = set(team_ids)
+    if not team_ids:
+        return
+    existing = {team_id for team_id, in db.session.query(Input.team_id).filter(
+        Input.game_id == game_.id, Input.active_at_day == game_.current_day,
+        Input.team_id.in_(team_ids))}
+    funds = STARTING_FUNDS if game_.current_day == 1 else 0
+    db.session.bulk_insert_mappings(Input, [
+        dict(team_id=team_id, game_id=game_.id, active_at_day=game_.current_day,
+             credit_taken=funds, money_at_start_of_period=funds)
+        for team_id in sorted(team_ids - existing)])
+
+
+def load_current_period_input(team_, game_):
+    """
+    Read-only lookup of the current period Input for the player pages.
+    Only a team put into a game by hand, without going through game_edit,
+    has no Input yet; it gets one created on the first visit.
+    """
+    current_period_input = _find_period_input(team_.id, game_.id, game_.current_day)
+    if current_period_input is None:
         current_period_input = get_current_period_input(team_, game_)
-        next_period_day = game_.current_day + PERIOD_INCREMENT_IN_DAYS
-        next_period_input = get_or_create(Input,
-                                          id=f'{game_.id}_{team_.id}_{next_period_day}')
-        # todo: patched on 16.12.21
-        next_period_input.team_id = team_.id
-        next_period_input.game_id = game_.id
-        next_period_input.active_at_day = next_period_day
-
-        _, _, finished = get_team_activities(game_, team_)
-        completed_all = set([i.activity_id for i in finished]) == set([i.id for i in all_activities])
-
-        available_money = current_period_input.money_at_start_of_period
-        for team_act in current_period_input.activities:
-            act = Activity.query.filter_by(id=team_act.activity_id).first()
-            if start_if_is_activity_eligible(act, team_act, available_money, team_, game_):
-                available_money -= act.cost
-            else:
-                # if no funds available for current round, move activity for next round
-                # # should we activate team_activity from previous period for next period?
-                # lets try_not_to
-                # team_act.input_id = next_period_input.id
-                # team_act.initiated_on_day = next_period_input.active_at_day
-                # commit_to_db(team_act)
-                penalty = Penalty(input_id=next_period_input.id, activity_id=act.id)
-                commit_to_db(penalty)
-
-        _update_funds_for_current_and_next_period(current_period_input, next_period_input,
-                                                  available_money, completed_all)
-
-
-def _update_funds_for_current_and_next_period(current_period_input, next_period_input,
-                                              available_money, completed_all):
-    profit = PROFIT_PER_DAY * PERIOD_INCREMENT_IN_DAYS if completed_all else 0
-    next_period_penalties = Penalty.query.filter_by(input_id=next_period_input.id).all()
-    total_penalty = sum([i.fine for i in next_period_penalties])
-    next_period_input.total_penalty_cost = total_penalty
-    next_period_input.credit_taken = (current_period_input.credit_taken
-                                      + current_period_input.credit_to_take)
-    next_period_input.interest_cost = current_period_input.credit_taken * (
-            INTEREST_RATE_PER_MONTH * (PERIOD_INCREMENT_IN_DAYS / DAYS_IN_GAME_MONTH))
-    next_period_input.rent_cost = RENT_PER_MONTH if (
-            (next_period_input.active_at_day-1) % DAYS_IN_GAME_MONTH == 0) else 0
-    next_period_input.money_at_start_of_period = (available_money + current_period_input.credit_to_take
-                                                  + profit
-                                                  - next_period_input.total_penalty_cost
-                                                  - next_period_input.interest_cost
-                                                  - next_period_input.rent_cost)
-    # start to return the credit after on profit
-    if profit > 0:
-        if next_period_input.credit_taken > 0 and next_period_input.money_at_start_of_period > 0:
-            if next_period_input.credit_taken <= next_period_input.money_at_start_of_period:
-                next_period_input.money_at_start_of_period -= next_period_input.credit_taken
-                next_period_input.credit_taken = 0
-            else:
-                next_period_input.credit_taken -= next_period_input.money_at_start_of_period
-                next_period_input.money_at_start_of_period = 0
+    return current_period_input
 
-    current_period_input.money_at_end_of_period = next_period_input.money_at_start_of_period
-    commit_to_db(current_period_input)
-    commit_to_db(next_period_input)
 
+def _find_period_input(team_id, game_id, day):
+    return Input.query.filter_by(team_id=team_id, active_at_day=day, game_id=game_id).first()
 
-def start_if_is_activity_eligible(act, team_act, available_money, team_, game_):
-    required_acts = ActivityRequirement.query.filter_by(activity_id=act.id).all()
-    finished_acts = [ta.activity_id for ta in _get_finished_activities(team_, game_)]
-    for a in required_acts:
-        if a.requirement_id not in finished_acts:
-            return False
-    if act.cost > available_money:
+
+def _load_period_inputs(game_, teams_, day, create=True):
+    """
+    Inputs of all teams for the given day, keyed by team id.
+    Missing ones are added to the session when `create` is set.
+    """
+    team_ids = [t.id for t in teams_]
+    inputs = {i.team_id: i for i in Input.query.filter(Input.game_id == game_.id,
+                                                       Input.active_at_day == day,
+                                                       Input.team_id.in_(team_ids)).all()}
+    if create:
+        for team_id in team_ids:
+            if team_id not in inputs:
+                inputs[team_id] = Input(team_id=team_id, game_id=game_.id, active_at_day=day)
+                db.session.add(inputs[team_id])
+    return inputs
+
+
+def advance_game_period(game_, from_day=None, progress=None):
+    """
+    Advance the game by one period as a single transaction.
+    `from_day` is the day the caller wants to advance; when the game is
+    already past it, or the advance is recorded in PeriodAdvance, nothing is
+    done and False is returned, so a retried request cannot charge twice.
+    `progress` is called with the percentage done, for background jobs.
+    """
+    game_ = Game.query.filter_by(id=game_.id).with_for_update().first()
+    if from_day is None:
+        from_day = game_.current_day
+    if (game_.current_day != from_day
+            or PeriodAdvance.query.filter_by(game_id=game_.id, from_day=from_day).first()):
+        db.session.rollback()
         return False
 
-    team_act.started_on_day = game_.current_day
-    team_act.finished_on_day = game_.current_day + act.days_needed
+    try:
+        _calculate_next_period(game_, progress)
+        game_.increase_current_day(PERIOD_INCREMENT_IN_DAYS)
+        db.session.add(PeriodAdvance(game_id=game_.id, from_day=from_day,
+                                     to_day=game_.current_day))
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent request advanced the same day first
+        db.session.rollback()
+        return False
+    except Exception:
+        db.session.rollback()
+        raise
+    publish_day(game_)
     return True
 
 
-def get_team_activities(game_, team_):
-    to_be_started = TeamActivity.query.filter_by(game=game_.id, team_id=team_.id,
-                                                 initiated_on_day=game_.current_day).all()
-    finished = _get_finished_activities(team_, game_)
-    in_progress = []
+def fast_forward_game(game_, periods, from_day=None, progress=None):
+    """
+    Advance the game by up to `periods` periods as a single transaction,
+    with the results of advancing them one by one. Stops at MAX_DAY.
+    Returns the number of periods advanced, 0 when the game is past
+    `from_day` or one of the periods was advanced already.
+    """
+    game_ = Game.query.filter_by(id=game_.id).with_for_update().first()
+    if from_day is None:
+        from_day = game_.current_day
+    from_days = [day for day in range(from_day, from_day + PERIOD_INCREMENT_IN_DAYS * periods,
+                                      PERIOD_INCREMENT_IN_DAYS) if day < MAX_DAY]
+    if (game_.current_day != from_day or not from_days
+            or PeriodAdvance.query.filter(PeriodAdvance.game_id == game_.id,
+                                          PeriodAdvance.from_day.in_(from_days)).first()):
+        db.session.rollback()
+        return 0
+
+    try:
+        _calculate_periods(game_, len(from_days), progress)
+        game_.increase_current_day(PERIOD_INCREMENT_IN_DAYS * len(from_days))
+        db.session.add_all([PeriodAdvance(game_id=game_.id, from_day=day,
+                                          to_day=day + PERIOD_INCREMENT_IN_DAYS)
+                            for day in from_days])
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent request advanced one of the days first
+        db.session.rollback()
+        return 0
+    except Exception:
+        db.session.rollback()
+        raise
+    publish_day(game_)
+    return len(from_days)
+
+
+def _calculate_next_period(game_, progress=None):
+    """
+    Load the state of all teams in bulk, let the engine advance them and
+    write the results back to the session. Committing is left to the caller.
+    """
+    _calculate_periods(game_, 1, progress)
+
+
+def _calculate_periods(game_, periods, progress=None):
+    """
+    _calculate_next_period for `periods` periods in a row: the state is
+    loaded once, carried from period to period in memory and the inputs,
+    penalties and team activities of all periods are written in one batch.
+    Every period goes through the same steps as a single advance, so the
+    results are the ones of advancing period by period.
+    """
+    progress = progress or (lambda percent: None)
+    graph = get_activity_graph()
+    teams_ = game_.teams.all()
+    team_ids = [t.id for t in teams_]
+    days = [game_.current_day + PERIOD_INCREMENT_IN_DAYS * step for step in range(periods + 1)]
+    current_inputs = _load_period_inputs(game_, teams_, game_.current_day)
+    # inputs of the days ahead only exist when something created them by hand
+    later_inputs = {(i.team_id, i.active_at_day): i for i in Input.query.filter(
+        Input.game_id == game_.id, Input.active_at_day.in_(days[1:]), Input.team_id.in_(team_ids))}
+    if game_.current_day == 1:
+        for input_ in current_inputs.values():
+            input_.credit_taken = STARTING_FUNDS
+            input_.money_at_start_of_period = STARTING_FUNDS
+
+    # only the activities queued for the current inputs and the running ones
+    # matter, the finished ones are in the masks of the current inputs
+    input_ids = [i.id for i in current_inputs.values() if i.id is not None]
+    input_ids += [i.id for i in later_inputs.values()]
+    team_activities = {}
+    queued = {}
+    for ta in TeamActivity.query.filter(
+            TeamActivity.game == game_.id,
+            or_(TeamActivity.input_id.in_(input_ids),
+                and_(TeamActivity.finished_on_day > game_.current_day,
+                     TeamActivity.finished_on_day < MAX_DAY))) \
+            .order_by(TeamActivity.date_created, TeamActivity.id).all():
+        team_activities[ta.id] = ta
+        if ta.input_id in input_ids:
+            queued.setdefault(ta.input_id, []).append(QueuedActivity(ta.id, ta.activity_id))
+    finished = _current_finished_masks(
+        game_, {team_id: i.finished_mask for team_id, i in current_inputs.items()}, graph)
+
+    penalty_cost = {}
+    later_input_ids = {i.id: key for key, i in later_inputs.items()}
+    queued_on_day = {id_: day for id_, (_, day) in later_input_ids.items()}
+    for penalty in Penalty.query.filter(Penalty.input_id.in_(list(later_input_ids))).all():
+        key = later_input_ids[penalty.input_id]
+        penalty_cost[key] = penalty_cost.get(key, 0) + penalty.fine
+
+    current = dict(current_inputs)
+    new_inputs = []
+    penalties = []
+    for step in range(periods):
+        day, next_period_day = days[step], days[step + 1]
+        states = [TeamState(team_.id,
+                            money_at_start_of_period=current[team_.id].money_at_start_of_period,
+                            credit_taken=current[team_.id].credit_taken,
+                            credit_to_take=current[team_.id].credit_to_take,
+                            queued=queued.get(current[team_.id].id, ()),
+                            finished=finished.get(team_.id, 0),
+                            penalty_cost=penalty_cost.get((team_.id, next_period_day), 0))
+                  for team_ in teams_]
+
+        progress(10 + 30 * (2 * step + 1) // periods)
+        results = advance_game(states, graph, day)
+        progress(10 + 60 * (step + 1) // periods)
+        for result in results:
+            for started in result.started:
+                team_act = team_activities[started.id]
+                team_act.started_on_day = started.started_on_day
+                team_act.finished_on_day = started.finished_on_day
+        finished_next_period = dict(finished)
+        in_progress_next_period = {}
+        for ta in team_activities.values():
+            if queued_on_day.get(ta.input_id, day) > day:
+                # queued for a period still ahead
+                continue
+            if ta.finished_on_day <= next_period_day:
+                finished_next_period[ta.team_id] = (finished_next_period.get(ta.team_id, 0)
+                                                    | graph.bits.get(ta.activity_id, 0))
+            elif ta.finished_on_day < MAX_DAY:
+                in_progress_next_period[ta.team_id] = (in_progress_next_period.get(ta.team_id, 0)
+                                                       | graph.bits.get(ta.activity_id, 0))
+
+        for result in results:
+            penalties.extend((result.team_id, next_period_day, activity_id, fine)
+                             for activity_id, fine in result.penalties)
+            input_ = current[result.team_id]
+            values = dict(credit_taken=result.credit_taken,
+                          interest_cost=result.interest_cost,
+                          rent_cost=result.rent_cost,
+                          total_penalty_cost=result.total_penalty_cost,
+                          money_at_start_of_period=result.money_at_start_of_period,
+                          cumulative_interest_cost=(input_.cumulative_interest_cost or 0)
+                          + result.interest_cost,
+                          cumulative_penalty_cost=(input_.cumulative_penalty_cost or 0)
+                          + result.total_penalty_cost,
+                          cumulative_rent_cost=(input_.cumulative_rent_cost or 0) + result.rent_cost,
+                          cumulative_profit=(input_.cumulative_profit or 0) + result.profit,
+                          finished_mask=finished_next_period.get(result.team_id, 0),
+                          in_progress_mask=in_progress_next_period.get(result.team_id, 0),
+                          finished_activity_count=bin(finished_next_period.get(result.team_id, 0))
+                          .count('1'))
+            next_period_input = later_inputs.get((result.team_id, next_period_day))
+            if next_period_input is None:
+                # what the bulk insert below writes, and the next period reads
+                next_period_input = SimpleNamespace(**values, id=None, team_id=result.team_id,
+                                                    game_id=game_.id, active_at_day=next_period_day,
+                                                    credit_to_take=0)
+                new_inputs.append(next_period_input)
+            else:
+                for key, value in values.items():
+                    setattr(next_period_input, key, value)
+            input_.money_at_end_of_period = result.money_at_end_of_period
+            current[result.team_id] = next_period_input
+        finished = finished_next_period
+
+    db.session.bulk_insert_mappings(Input, [{key: value for key, value in vars(i).items() if key != 'id'}
+                                            for i in new_inputs])
+    if penalties:
+        input_ids = {key: i.id for key, i in later_inputs.items()}
+        if new_inputs:
+            # bulk inserts do not hand the new ids back, read them in one go
+            input_ids.update({(team_id, day): id_ for team_id, day, id_ in db.session.query(
+                Input.team_id, Input.active_at_day, Input.id).filter(
+                Input.game_id == game_.id, Input.active_at_day.in_(days[1:]))})
+        db.session.bulk_insert_mappings(Penalty, [
+            dict(input_id=input_ids[(team_id, day)], activity_id=activity_id, fine=fine)
+            for team_id, day, activity_id, fine in penalties])
+
+
+def _current_finished_masks(game_, stored_masks, graph):
+    """
+    Finished masks of the teams at the current day from their stored ones,
+    both keyed by team id. Inputs from before the masks were kept (None)
+    fall back to the team activity rows.
+    """
+    masks = {team_id: mask for team_id, mask in stored_masks.items() if mask is not None}
+    missing = [team_id for team_id in stored_masks if team_id not in masks]
+    if missing:
+        for team_id, activity_id in db.session.query(TeamActivity.team_id, TeamActivity.activity_id) \
+                .filter(TeamActivity.game == game_.id, TeamActivity.team_id.in_(missing),
+                        TeamActivity.finished_on_day <= game_.current_day):
+            masks[team_id] = masks.get(team_id, 0) | graph.bits.get(activity_id, 0)
+    return masks
+
+
+def get_team_activities(game_, team_, input_=None):
+    """
+    The team activities queued, running and finished at the current day.
+    The masks of the current Input say which activity is where, so one query
+    for just those rows does.
+    """
+    if input_ is None:
+        input_ = load_current_period_input(team_, game_)
+    if input_.finished_mask is None or input_.in_progress_mask is None:
+        return _team_activities_from_rows(game_, team_)
+    graph = get_activity_graph()
+    finished_mask = input_.finished_mask
+    in_progress_mask = input_.in_progress_mask
+    started_ids = graph.ids_of(finished_mask | in_progress_mask)
+
+    to_be_started, in_progress, finished = [], [], []
+    for ta in TeamActivity.query.filter(
+            TeamActivity.game == game_.id, TeamActivity.team_id == team_.id,
+            or_(TeamActivity.initiated_on_day == game_.current_day,
+                TeamActivity.activity_id.in_(started_ids))):
+        bit = graph.bits.get(ta.activity_id, 0)
+        if bit & finished_mask:
+            finished.append(ta)
+        elif bit & in_progress_mask:
+            in_progress.append(ta)
+        elif ta.initiated_on_day == game_.current_day:
+            to_be_started.append(ta)
+    return to_be_started, in_progress, finished
+
+
+def _team_activities_from_rows(game_, team_):
+    """ get_team_activities by the days on the rows, for inputs without masks. """
+    to_be_started, in_progress, finished = [], [], []
     for ta in TeamActivity.query.filter_by(game=game_.id, team_id=team_.id).all():
-        if ta.started_on_day < game_.current_day and ta not in finished:
+        if game_.current_day >= ta.finished_on_day:
+            finished.append(ta)
+        elif ta.started_on_day < game_.current_day:
             in_progress.append(ta)
+        elif ta.initiated_on_day == game_.current_day:
+            to_be_started.append(ta)
     return to_be_started, in_progress, finished
 
 
+def team_state(game_, team_, input_, penalties=None):
+    """
+    What a player sees of their team in the current period, for the play
+    page and the state API. `penalties` of the input can be passed in when
+    they were loaded for several teams at once.
+    """
+    to_be_started, in_progress, finished = get_team_activities(game_, team_, input_)
+    if penalties is None:
+        penalties = Penalty.query.filter_by(input_id=input_.id).all()
+    return {
+        'team': team_,
+        'game': game_,
+        'money_at_start_of_period': input_.money_at_start_of_period,
+        'rent_cost': input_.rent_cost,
+        'credit_taken': input_.credit_taken,
+        'credit_to_take': input_.credit_to_take,
+        'interest_cost': input_.interest_cost,
+        'finished': sorted(finished, key=lambda ta: ta.finished_on_day),
+        'in_progress': in_progress,
+        'started': to_be_started,
+        'penalties': penalties,
+        # fines are whole numbers, the column is a float
+        'total_penalties_cost': int(input_.total_penalty_cost or 0),
+    }
+
+
 # player
 @bp.route('/play', methods=['GET'])
 @login_required
 @no_http_cache
 def play_get():
-    state = {}
     try:
         team_ = current_team()
         game_ = current_game()
@@ -423,40 +895,16 @@ def play_get():
 
     form = GameUserForm()
     user_ = current_user
-    input_ = get_current_period_input(team_, game_)
-
-    all_activities = Activity.query.all()
-    state['activities_object_map'] = {k: v for k, v in [(a.id, a) for a in all_activities]}
-
-    to_be_started, in_progress, finished = get_team_activities(game_, team_)
+    input_ = load_current_period_input(team_, game_)
+    catalog = get_catalog()
 
-    state['team'] = team_
-    state['game'] = game_
-    state['money_at_start_of_period'] = input_.money_at_start_of_period
-    state['rent_cost'] = input_.rent_cost
-    state['credit_taken'] = input_.credit_taken
-    state['credit_to_take'] = input_.credit_to_take
-    state['interest_cost'] = input_.interest_cost
-
-    state['finished'] = sorted(finished, key=lambda ta: ta.finished_on_day)
-    state['in_progress'] = in_progress
-    state['started'] = to_be_started
-
-    penalties = Penalty.query.filter_by(input_id=input_.id).all()
-    state['penalties'] = penalties
-    state['total_penalties_cost'] = sum([i.fine for i in penalties])
-
-    all_activities = Activity.query.all()
-
-    activities_to_dict = {k: v for k, v in [(a.id, f'{a.title} Ценa:{a.cost}') for a in all_activities]}
-    state['activities_object_map'] = {k: v for k, v in [(a.id, a) for a in all_activities]}
+    state = team_state(game_, team_, input_)
+    to_be_started, in_progress, finished = state['started'], state['in_progress'], state['finished']
+    state['activities_object_map'] = catalog.by_id
 
     unavailable_activities = [a.activity_id for a in finished + in_progress + to_be_started]
-    available_activities = NONE_OPTION + [(a.id, f'{a.title} Ценa:{a.cost}') for a in Activity.query.all()
-                                          if a.id not in unavailable_activities]
-
-    form.add_activity.choices = available_activities
-    form.remove_activity.choices = NONE_OPTION + [(a.id, activities_to_dict[a.activity_id])
+    form.add_activity.choices = NONE_OPTION + catalog.choices(exclude=unavailable_activities)
+    form.remove_activity.choices = NONE_OPTION + [(a.id, catalog.labels[a.activity_id])
                                                   for a in to_be_started]
 
     if not user_.is_manager:
@@ -481,20 +929,16 @@ def play():
         return redirect('/')
 
     form = GameUserForm()
-    input_ = get_current_period_input(team_, game_)
+    input_ = load_current_period_input(team_, game_)
 
-    to_be_started, in_progress, finished = get_team_activities(game_, team_)
+    to_be_started, in_progress, finished = get_team_activities(game_, team_, input_)
 
-    all_activities = Activity.query.all()
-    activities_to_dict = {k: v for k, v in [(a.id, f'{a.title} Ценa:{a.cost}') for a in all_activities]}
-    state['activities_object_map'] = {k: v for k, v in [(a.id, a) for a in all_activities]}
+    catalog = get_catalog()
+    state['activities_object_map'] = catalog.by_id
 
     unavailable_activities = [a.activity_id for a in finished + in_progress + to_be_started]
-    available_activities = NONE_OPTION + [(a.id, f'{a.title} Ценa:{a.cost}') for a in Activity.query.all()
-                                          if a.id not in unavailable_activities]
-
-    form.add_activity.choices = available_activities
-    form.remove_activity.choices = NONE_OPTION + [(a.id, activities_to_dict[a.activity_id])
+    form.add_activity.choices = NONE_OPTION + catalog.choices(exclude=unavailable_activities)
+    form.remove_activity.choices = NONE_OPTION + [(a.id, catalog.labels[a.activity_id])
                                                   for a in to_be_started]
 
     if form.validate_on_submit():
@@ -508,21 +952,55 @@ def play():
         # add activity
         if (form.add_activity.data != NONE_OPTION[0][0]
                 and form.add_activity.data not in unavailable_activities):
-            to_add = get_or_create(TeamActivity,
-                                   id=f'{game_.id}_{team_.id}_{form.add_activity.data}')
-            set_team_activity(to_add, team_, game_)
+            to_add = get_or_create(TeamActivity, game=game_.id, team_id=team_.id,
+                                   activity_id=form.add_activity.data)
+            set_team_activity(to_add, team_, game_, input_)
             input_history.activity_to_add = form.add_activity.data
-            flash(f'{activities_to_dict[to_add.activity_id]} added')
+            flash(f'{catalog.labels[to_add.activity_id]} added')
 
         # remove activity
         if form.remove_activity.data != 'none_of_the_above':
-            _reset_team_activity(id_=form.remove_activity.data)
-            input_history.activity_to_remove = form.remove_activity.data.split('_')[-1]
+            removed = _reset_team_activity(id_=int(form.remove_activity.data))
+            input_history.activity_to_remove = removed.activity_id
 
+        # the state API hands out ETags with the version
+        input_.version = Input.version + 1
+        db.session.add(input_)
         commit_to_db(input_history)
+        publish_team(input_)
     return redirect(url_for('main.play_get'))
 
 
+@bp.route('/games/<int:game_id>/events', methods=['GET'])
+@login_required
+def game_events(game_id):
+    """
+    Server-sent `day` and `team` events of the game, for its players and
+    the admins. `day` is the day the page shows, a newer one is sent at once.
+    """
+    if current_user.is_admin:
+        game_ = Game.query.filter_by(id=game_id).first_or_404()
+    else:
+        game_ = current_membership()[1]
+        if game_ is None or game_.id != game_id:
+            return make_response('', 403)
+    versions = dict(db.session.query(Input.team_id, Input.version)
+                    .filter(Input.game_id == game_.id, Input.active_at_day == game_.current_day))
+    broker = get_broker()
+    subscription = broker.subscribe(game_.id, request.args.get('day', game_.current_day, type=int),
+                                    versions)
+    subscription.put(DAY, {'game_id': game_.id, 'current_day': game_.current_day})
+
+    # no stream_with_context: the request, and its database session, end
+    # before the first event is sent
+    response = Response(event_stream(subscription), mimetype='text/event-stream')
+    response.headers.set('Cache-Control', 'no-cache')
+    # nginx would otherwise hold the events back in its buffer
+    response.headers.set('X-Accel-Buffering', 'no')
+    response.call_on_close(subscription.close)
+    return response
+
+
 @bp.route('/results', methods=['GET'])
 @login_required
 def team_results():
@@ -530,9 +1008,10 @@ def team_results():
         team_ = current_team()
     except AttributeError:
         flash('Not yet started')
-    game_stub = {'teams': [team_]}
-    activities = Activity.query.all()
-    return render_template('report.html', game=game_stub, activities=activities)
+    game_stub = {'id': team_.game_id if team_ else None}
+    activities = get_catalog().activities
+    rows = _build_report_rows([team_] if team_ else [], activities)
+    return render_template('report.html', game=game_stub, activities=activities, rows=rows)
 
 
 @bp.route('/admin/download_results/<game_id>')
@@ -557,37 +1036,71 @@ def admin_download_results(game_id):
 
     if not game_:
         flash('No games existing')
-        return redirect(url_for('games'))
+        return redirect(url_for('main.games'))
 
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(list(columns.keys()) + activities)
-    for team in game_.teams:
-        for input_ in team.inputs.order_by(Input.active_at_day.asc()).all():
-            cw.writerow([getattr(input_, k) for k in columns] +
-                        ['started' if ta.started_on_day == input_.active_at_day else
-                         'initiated' if ta.initiated_on_day == input_.active_at_day else
-                         'finished' if ta.finished_on_day == input_.active_at_day else
-                         ''
-                         for ta in input_.activities])
-    output = make_response(si.getvalue())
+    output = Response(stream_with_context(_results_csv_rows(game_.id, columns, activities)),
+                      mimetype='text/csv')
     output.headers["Content-Disposition"] = "attachment; filename=results.csv"
-    output.headers["Content-type"] = "text/csv"
     return output
 
 
-def set_team_activity(team_act, team_, game_):
-    id_splited = team_act.id.split('_')
-    activity = Activity.query.filter_by(id=id_splited[-1]).first()
-    team_act.activity_id = activity.id
-    team_act.team_id = id_splited[1]
-    team_act.game = id_splited[0]
+def _results_csv_rows(game_id, columns, activities):
+    """
+    Yield the results csv line by line. Inputs and their team activities come
+    from one outer join read through a server side cursor, so memory stays
+    flat whatever the size of the game.
+    """
+    si = io.StringIO()
+    cw = csv.writer(si)
+
+    def flush():
+        line = si.getvalue()
+        si.seek(0)
+        si.truncate()
+        return line
+
+    cw.writerow(list(columns.keys()) + activities)
+    yield flush()
+
+    input_columns = [getattr(Input, k) for k in columns]
+    day_index = list(columns).index('active_at_day')
+    query = db.session.query(Input.id, TeamActivity.id, TeamActivity.started_on_day,
+                             TeamActivity.initiated_on_day, TeamActivity.finished_on_day,
+                             *input_columns) \
+        .join(Team, Team.id == Input.team_id) \
+        .outerjoin(TeamActivity, TeamActivity.input_id == Input.id) \
+        .filter(Team.game_id == game_id) \
+        .order_by(Team.id, Input.active_at_day, Input.id, TeamActivity.date_created) \
+        .yield_per(CSV_BATCH_SIZE)
+    for _input_id, rows in groupby(query, key=lambda row: row[0]):
+        rows = list(rows)
+        values = rows[0][5:]
+        day = values[day_index]
+        cw.writerow(list(values) +
+                    ['started' if started == day else
+                     'initiated' if initiated == day else
+                     'finished' if finished == day else
+                     ''
+                     for _input_id, ta_id, started, initiated, finished, *_values in rows
+                     if ta_id is not None])
+        yield flush()
+
+
+def set_team_activity(team_act, team_, game_, input_=None):
+    """
+    Queue `team_act`, which has its activity_id set, for the current period.
+    """
+    if input_ is None:
+        input_ = load_current_period_input(team_, game_)
+    activity = get_catalog().by_id[team_act.activity_id]
+    team_act.team_id = team_.id
+    team_act.game = game_.id
     team_act.cost = activity.cost
     team_act.started_on_day = MAX_DAY
     team_act.finished_on_day = MAX_DAY
     team_act.initiated_on_day = game_.current_day
     team_act.first_time_ever_initiated_on_day = game_.current_day
-    team_act.input_id = f'{game_.id}_{team_.id}_{game_.current_day}'
+    team_act.input_id = input_.id
     commit_to_db(team_act)
 
 
@@ -622,10 +1135,3 @@ def validate_and_update_credit(credit, input_):
     db.session.commit()
     return True
 
-
-def _get_finished_activities(team_, game_):
-    result = []
-    for ta in TeamActivity.query.filter_by(team_id=team_.id, game=game_.id).all():
-        if game_.current_day >= ta.finished_on_day:
-            result.append(ta)
-    return result
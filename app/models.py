@@ -1,4 +1,5 @@
-from datetime import datetime
+import secrets
+from datetime import datetime, timedelta
 from hashlib import md5
 from time import time
 
@@ -9,6 +10,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 from app import db
 from app import login
+from app import identity
+from app.catalog import listen_for_changes
 
 INITAL_CREDIT_AMOUNT = 2000
 
@@ -60,9 +63,27 @@ class User(UserMixin, BaseModel):
             return
         return User.query.get(id)
 
+    def get_token(self, expires_in=3600):
+        """ The API token of the user, a new one when it expires within a minute. """
+        now = datetime.utcnow()
+        if self.token and self.token_expiration > now + timedelta(seconds=60):
+            return self.token
+        # 24 random bytes are 32 url safe characters, the size of the column
+        self.token = secrets.token_urlsafe(24)
+        self.token_expiration = now + timedelta(seconds=expires_in)
+        db.session.add(self)
+        return self.token
+
+    def revoke_token(self):
+        self.token_expiration = datetime.utcnow() - timedelta(seconds=1)
+
+    @staticmethod
+    def check_token(token):
+        return identity.check_token(token)
+
     @login.user_loader
     def load_user(id):
-        return User.query.get(int(id))
+        return identity.load_user(id)
 
     def avatar(self, size):
         digest = md5(self.email.lower().encode('utf-8')).hexdigest()
@@ -94,13 +115,57 @@ class Game(BaseModel):
         self.current_day = new_day
 
 
+class PeriodAdvance(BaseModel):
+    # one row per advance, written in the same transaction as the advance itself
+    __table_args__ = (db.UniqueConstraint('game_id', 'from_day'),)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), index=True)
+    from_day = db.Column(db.Integer)
+    to_day = db.Column(db.Integer)
+
+
+class GameSchedule(BaseModel):
+    """ Advance the game every `interval_minutes`, see app/scheduler.py. """
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), unique=True)
+    is_active = db.Column(db.Boolean, default=True)
+    interval_minutes = db.Column(db.Integer, default=10)
+    # stop once the game reaches this day, or every team finished this activity
+    stop_at_day = db.Column(db.Integer)
+    stop_activity_id = db.Column(db.String(64), db.ForeignKey('activity.id', ondelete="set null"))
+    next_run_at = db.Column(db.DateTime, index=True)
+    last_run_at = db.Column(db.DateTime)
+
+
+class Task(db.Model):
+    """ A background job of app/jobs.py, the id is the one of the job. """
+    id = db.Column(db.String(36), primary_key=True)
+    name = db.Column(db.String(128), index=True)
+    description = db.Column(db.String(128))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), index=True)
+    status = db.Column(db.String(16), default='queued')
+    progress = db.Column(db.Integer, default=0)
+    message = db.Column(db.Text)
+    complete = db.Column(db.Boolean, default=False)
+    date_created = db.Column(db.DateTime, default=datetime.utcnow)
+    date_finished = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Task {self.id} {self.name}>'
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'description': self.description,
+                'game_id': self.game_id, 'status': self.status, 'progress': self.progress,
+                'message': self.message, 'complete': self.complete}
+
+
 class Settings(BaseModel):
     game_id = db.Column(db.Integer, db.ForeignKey('game.id'), unique=True)
 
 
 class Input(BaseModel):
-    # id in format: 'team_id'_'current_day'
-    id = db.Column(db.String(64), primary_key=True, index=True)
+    # one input per team and day, the unique index also serves (team_id, active_at_day) lookups
+    __table_args__ = (db.UniqueConstraint('team_id', 'active_at_day', 'game_id'),
+                      db.Index('ix_input_game_id_active_at_day', 'game_id', 'active_at_day'))
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
     game_id = db.Column(db.Integer, db.ForeignKey('game.id'))
 
@@ -119,9 +184,22 @@ class Input(BaseModel):
     money_at_end_of_period = db.Column(db.Float, default=0)
     approved_by_admin = db.Column(db.Boolean, default=False)
 
+    # running totals up to and including this period, carried forward by the
+    # period advance; `flask games check-totals` rebuilds them
+    cumulative_interest_cost = db.Column(db.Float, default=0)
+    cumulative_penalty_cost = db.Column(db.Float, default=0)
+    cumulative_rent_cost = db.Column(db.Integer, default=0)
+    cumulative_profit = db.Column(db.Integer, default=0)
+    finished_activity_count = db.Column(db.Integer, default=0)
+    # ActivityGraph masks of the activities finished and running at this day
+    finished_mask = db.Column(db.BigInteger, default=0)
+    in_progress_mask = db.Column(db.BigInteger, default=0)
+    # bumped whenever the team changes its choices for the period
+    version = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+
 
 class Penalty(BaseModel):
-    input_id = db.Column(db.String, db.ForeignKey('input.id'))
+    input_id = db.Column(db.Integer, db.ForeignKey('input.id'), index=True)
     activity_id = db.Column(db.String(64), db.ForeignKey('activity.id', ondelete="cascade"))
     fine = db.Column(db.Integer, default=60)
 
@@ -141,27 +219,45 @@ class Activity(BaseModel):
     description = db.Column(db.Text())
     days_needed = db.Column(db.Integer, default=1)
     cost = db.Column(db.Integer, default=100)
+    # position of the activity in the Input masks, given once on insert, see app/catalog.py
+    bit_index = db.Column(db.Integer, index=True, unique=True)
 
 
 class TeamActivity(BaseModel):
-    id = db.Column(db.String(64), primary_key=True, index=True)
+    # one row per activity a team ever initiated in a game; both indexes lead with
+    # (game, team_id), which covers the per-team lookups
+    __table_args__ = (db.UniqueConstraint('game', 'team_id', 'activity_id'),
+                      db.Index('ix_team_activity_game_team_id_initiated_on_day',
+                               'game', 'team_id', 'initiated_on_day'))
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'))
     game = db.Column(db.Integer, db.ForeignKey('game.id'))
     activity_id = db.Column(db.String(64), db.ForeignKey('activity.id', ondelete="cascade"))
     cost = db.Column(db.Integer, default=100)  # add penalties here?
-    input_id = db.Column(db.String(64), db.ForeignKey('input.id', ondelete="CASCADE"))
+    input_id = db.Column(db.Integer, db.ForeignKey('input.id', ondelete="CASCADE"), index=True)
     started_on_day = db.Column(db.Integer, default=0)
     finished_on_day = db.Column(db.Integer, default=0)
     initiated_on_day = db.Column(db.Integer, default=0)
     first_time_ever_initiated_on_day = db.Column(db.Integer, default=0)
 
 
+class CatalogVersion(db.Model):
+    # single row, moved on by every write to Activity or ActivityRequirement
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0)
+    # the bit index the next new activity gets
+    next_bit_index = db.Column(db.Integer, default=0)
+
+
 class ActivityRequirement(BaseModel):
     # id = db.Column(db.Integer , primary_key=True , autoincrement=True)
     activity_id = db.Column(db.String(64), db.ForeignKey('activity.id', ondelete="cascade"))
     requirement_id = db.Column(db.String(64), db.ForeignKey('activity.id', ondelete="cascade"))
 
 
+listen_for_changes(Activity, ActivityRequirement)
+identity.listen_for_changes(User)
+
+
 # class Period(BaseModel):
 #     id = db.Column(db.String(64), primary_key=True, index=True)
 #     game_id = db.Column(db.Integer, db.ForeignKey('game.id'))
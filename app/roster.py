@@ -0,0 +1,162 @@
+"""
+Bulk import of a class roster: users, their teams and the games the teams play.
+
+A roster is a CSV file with a header row or a JSON list of objects with the
+keys of ROSTER_FIELDS; only username and password are required. Teams are
+matched by display name and created when missing, `game` is the id of an
+existing game the team joins, with its current period input.
+
+Every row is checked up front and reported on its own, the good ones are
+written with bulk statements in a single transaction. The users import page
+runs it as the import_roster job of app/tasks.py.
+"""
+import csv
+import io
+import json
+from collections import namedtuple
+
+from app import db
+from app.hashing import hash_passwords
+
+ROSTER_FIELDS = ('username', 'password', 'display_name', 'email', 'faculty_number', 'team', 'game',
+                 'is_manager')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'x')
+
+CREATED = 'created'
+SKIPPED = 'skipped'
+FAILED = 'error'
+
+# `row` counts the roster records from 1, the CSV header is not one
+RowResult = namedtuple('RowResult', ['row', 'username', 'status', 'message'])
+
+
+class RosterError(ValueError):
+    pass
+
+
+def parse_roster(filename, data):
+    """ The records of a .json or .csv roster as dicts of stripped strings. """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if filename.lower().endswith('.json'):
+        try:
+            records = json.loads(data)
+        except ValueError as e:
+            raise RosterError(f'Invalid JSON: {e}')
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            raise RosterError('A JSON roster has to be a list of objects.')
+    else:
+        records = list(csv.DictReader(io.StringIO(data)))
+        if records and 'username' not in {(k or '').strip().lower() for k in records[0]}:
+            raise RosterError('The CSV roster needs a header row with a username column.')
+    return [{str(k).strip().lower(): '' if v is None else str(v).strip()
+             for k, v in record.items() if k is not None}
+            for record in records]
+
+
+def import_roster(records, workers=None):
+    """
+    Create the users, teams and game assignments of the roster `records`.
+    Returns a RowResult per record, in order.
+    """
+    from app.models import Game, Team, User
+
+    usernames = [r.get('username', '') for r in records]
+    emails = [r.get('email', '') for r in records if r.get('email')]
+    team_names = {r.get('team') for r in records if r.get('team')}
+    game_ids = {int(r['game']) for r in records if r.get('game', '').isdigit()}
+
+    taken_usernames = {u for u, in db.session.query(User.username).filter(User.username.in_(usernames))}
+    taken_emails = {e for e, in db.session.query(User.email).filter(User.email.in_(emails))}
+    games = {g.id: g for g in Game.query.filter(Game.id.in_(game_ids))}
+    teams = {}
+    for team_ in Team.query.filter(Team.display_name.in_(team_names)).order_by(Team.id):
+        teams.setdefault(team_.display_name, team_)
+    # the game every team ends up in, as far as the roster is concerned
+    team_games = {name: team_.game_id for name, team_ in teams.items()}
+
+    results = []
+    accepted = []
+    for row, record in enumerate(records, start=1):
+        username = record.get('username', '')
+        error = None
+        game_id = int(record['game']) if record.get('game', '').isdigit() else None
+        team_name = record.get('team')
+        if not username or not record.get('password'):
+            error = 'username and password are required'
+        elif username in taken_usernames:
+            results.append(RowResult(row, username, SKIPPED, 'username already exists'))
+            continue
+        elif record.get('email') and record['email'] in taken_emails:
+            error = f'email {record["email"]} is already used'
+        elif record.get('game') and game_id not in games:
+            error = f'game {record["game"]} does not exist'
+        elif game_id and not team_name:
+            error = 'a game needs a team'
+        elif game_id and team_games.get(team_name) not in (None, game_id):
+            error = f'team {team_name} already plays game {team_games[team_name]}'
+        if error:
+            results.append(RowResult(row, username, FAILED, error))
+            continue
+
+        taken_usernames.add(username)
+        if record.get('email'):
+            taken_emails.add(record['email'])
+        if team_name and (game_id or team_name not in team_games):
+            team_games[team_name] = game_id
+        accepted.append(record)
+        results.append(RowResult(row, username, CREATED, ''))
+
+    if not accepted:
+        return results
+
+    password_hashes = hash_passwords([r['password'] for r in accepted], workers)
+    try:
+        _write_roster(accepted, password_hashes, teams, team_games, games)
+    except Exception:
+        db.session.rollback()
+        raise
+    return results
+
+
+def summary(results):
+    """ The count of created users and a line per row that was not, for the task message. """
+    created = sum(1 for r in results if r.status == CREATED)
+    lines = [f'Imported {created} of {len(results)} users.']
+    lines.extend(f'Row {r.row} ({r.username or "no username"}): {r.status}, {r.message}'
+                 for r in results if r.status != CREATED)
+    return '\n'.join(lines)
+
+
+def _write_roster(accepted, password_hashes, teams, team_games, games):
+    from app.main.routes import create_period_inputs
+    from app.models import Team, User
+
+    new_teams = sorted({r['team'] for r in accepted if r.get('team')} - set(teams))
+    db.session.bulk_insert_mappings(Team, [dict(display_name=name) for name in new_teams])
+    for team_ in Team.query.filter(Team.display_name.in_(new_teams)).order_by(Team.id):
+        teams.setdefault(team_.display_name, team_)
+
+    joining = {}
+    for name, game_id in team_games.items():
+        if name in teams and game_id and teams[name].game_id != game_id:
+            joining.setdefault(game_id, []).append(teams[name].id)
+    for game_id, team_ids in joining.items():
+        Team.query.filter(Team.id.in_(team_ids)).update({Team.game_id: game_id},
+                                                        synchronize_session=False)
+    # teams the roster puts into a game they already play still get their input
+    playing = {}
+    for record in accepted:
+        if record.get('game'):
+            playing.setdefault(int(record['game']), set()).add(teams[record['team']].id)
+    for game_id, team_ids in playing.items():
+        create_period_inputs(games[game_id], team_ids)
+
+    db.session.bulk_insert_mappings(User, [
+        dict(username=r['username'], password_hash=password_hash,
+             display_name=r.get('display_name') or r['username'],
+             email=r.get('email') or None, faculty_number=r.get('faculty_number') or None,
+             is_manager=r.get('is_manager', '').lower() in TRUE_VALUES,
+             team_id=teams[r['team']].id if r.get('team') else None)
+        for r, password_hash in zip(accepted, password_hashes)])
+    db.session.commit()
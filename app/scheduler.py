@@ -0,0 +1,154 @@
+"""
+Timed period advances.
+
+A GameSchedule advances its game every interval_minutes until the game
+reaches stop_at_day or every team finished stop_activity_id, then it turns
+itself off. The advance is the advance_period job of app/tasks.py, submitted
+like the one of the game page.
+
+Due schedules are claimed with an UPDATE conditional on next_run_at, so any
+number of processes can call `run_due_schedules` and every period is
+submitted once.
+
+The first run of a schedule comes after a phase of less than one interval
+that follows from the game id, and later runs keep it, so games started
+together with the same interval advance spread over the whole interval
+rather than at the same moment. The first advance therefore comes within
+one interval of the schedule being switched on.
+
+With SCHEDULER = 'thread' every web process looks for due schedules every
+TICK_SECONDS from its first request on. `flask games run-schedules --loop`
+does the same as a process of its own.
+"""
+import threading
+from datetime import datetime, timedelta
+from time import sleep
+
+from flask import current_app
+
+from app import db
+from app.catalog import get_activity_graph
+from app.engine import MAX_DAY
+
+TICK_SECONDS = 5
+# consecutive game ids get phases far apart
+GOLDEN_RATIO_FRACTION = 0.6180339887498949
+
+
+def first_run_at(game_id, interval_minutes, now=None):
+    now = now or datetime.utcnow()
+    interval = interval_minutes * 60
+    phase = (game_id * GOLDEN_RATIO_FRACTION) % 1 * interval
+    return now + timedelta(seconds=phase)
+
+
+def _next_run_at(next_run_at, interval_minutes, now):
+    # keep the cadence, unless the schedule fell a whole interval behind
+    interval = timedelta(minutes=interval_minutes)
+    next_run_at += interval
+    while next_run_at <= now:
+        next_run_at += interval
+    return next_run_at
+
+
+def _all_teams_finished(game_, activity_id):
+    from app.main.routes import _current_finished_masks
+    from app.models import Input, Team
+
+    graph = get_activity_graph()
+    bit = graph.bits.get(activity_id)
+    team_ids = [team_id for team_id, in db.session.query(Team.id).filter(Team.game_id == game_.id)]
+    if not bit or not team_ids:
+        return False
+    stored_masks = dict.fromkeys(team_ids)
+    stored_masks.update(db.session.query(Input.team_id, Input.finished_mask).filter(
+        Input.game_id == game_.id, Input.active_at_day == game_.current_day,
+        Input.team_id.in_(team_ids)))
+    finished = _current_finished_masks(game_, stored_masks, graph)
+    return all(finished.get(team_id, 0) & bit for team_id in team_ids)
+
+
+def stop_reason(schedule, game_):
+    """ Why the schedule is done, or None while it has periods to advance. """
+    if game_ is None or not game_.is_active:
+        return 'the game is not active'
+    if game_.current_day >= MAX_DAY:
+        return 'the last day is reached'
+    if schedule.stop_at_day and game_.current_day >= schedule.stop_at_day:
+        return f'day {schedule.stop_at_day} is reached'
+    if schedule.stop_activity_id and _all_teams_finished(game_, schedule.stop_activity_id):
+        return f'every team finished {schedule.stop_activity_id}'
+    return None
+
+
+def run_due_schedules(now=None):
+    """
+    Submit the advance of every due schedule this process claims and turn
+    off the finished ones. Returns the submitted tasks.
+    """
+    from app import jobs
+    from app.models import Game, GameSchedule
+
+    now = now or datetime.utcnow()
+    tasks = []
+    due = GameSchedule.query.filter(GameSchedule.is_active.is_(True), GameSchedule.next_run_at <= now) \
+        .order_by(GameSchedule.next_run_at).all()
+    for schedule in due:
+        game_ = Game.query.filter_by(id=schedule.game_id).first()
+        reason = stop_reason(schedule, game_)
+        if reason:
+            GameSchedule.query.filter_by(id=schedule.id) \
+                .update({GameSchedule.is_active: False}, synchronize_session=False)
+            db.session.commit()
+            current_app.logger.info('Schedule of game %s stopped, %s', schedule.game_id, reason)
+            continue
+
+        claimed = GameSchedule.query.filter_by(id=schedule.id, next_run_at=schedule.next_run_at) \
+            .update({GameSchedule.next_run_at: _next_run_at(schedule.next_run_at,
+                                                            schedule.interval_minutes, now),
+                     GameSchedule.last_run_at: now}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            # another process got there first
+            continue
+        tasks.append(jobs.submit('advance_period', game_.id, game_.current_day,
+                                 description=f'Scheduled advance of day {game_.current_day}',
+                                 game_id=game_.id))
+    return tasks
+
+
+def run_forever(app):
+    while True:
+        sleep(TICK_SECONDS)
+        with app.app_context():
+            try:
+                run_due_schedules()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Running the game schedules failed')
+            finally:
+                db.session.remove()
+
+
+class SchedulerThread:
+
+    def __init__(self, app):
+        self.app = app
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=run_forever, args=(self.app,),
+                                                name='game-scheduler', daemon=True)
+                self._thread.start()
+
+
+def init_app(app):
+    scheduler = app.config.get('SCHEDULER', 'thread')
+    if scheduler == 'thread':
+        # only processes that serve requests run it, not the CLI or the job worker
+        app.before_first_request(SchedulerThread(app).start)
+    elif scheduler != 'off':
+        raise ValueError(f'Unknown SCHEDULER {scheduler!r}')
@@ -1,51 +1,63 @@
-import json
-import sys
-import time
-from flask import render_template
-from rq import get_current_job
-from app import create_app, db
-from app.models import User, Post, Task
-from app.email_util import send_email
-
-app = create_app()
-app.app_context().push()
+"""
+The functions app/jobs.py runs in the background. They get plain arguments,
+report progress with _set_task_progress and return the message the admin
+sees once they are done.
+"""
+from app.engine import MAX_DAY
+from app.jobs import set_progress
+from app.models import Game
 
 
 def _set_task_progress(progress):
-    job = get_current_job()
-    if job:
-        job.meta['progress'] = progress
-        job.save_meta()
-        task = Task.query.get(job.get_id())
-        task.user.add_notification('task_progress', {'task_id': job.get_id(),
-                                                     'progress': progress})
-        if progress >= 100:
-            task.complete = True
-        db.session.commit()
-
-
-def export_posts(user_id):
-    try:
-        user = User.query.get(user_id)
-        _set_task_progress(0)
-        data = []
-        i = 0
-        total_posts = user.posts.count()
-        for post in user.posts.order_by(Post.timestamp.asc()):
-            data.append({'body': post.body,
-                         'timestamp': post.timestamp.isoformat() + 'Z'})
-            time.sleep(5)
-            i += 1
-            _set_task_progress(100 * i // total_posts)
-
-        send_email('[Microblog] Your blog posts',
-                sender=app.config['ADMINS'][0], recipients=[user.email],
-                text_body=render_template('email/export_posts.txt', user=user),
-                html_body=render_template('email/export_posts.html',
-                                          user=user),
-                attachments=[('posts.json', 'application/json',
-                              json.dumps({'posts': data}, indent=4))],
-                sync=True)
-    except:
-        _set_task_progress(100)
-        app.logger.error('Unhandled exception', exc_info=sys.exc_info())
+    set_progress(progress)
+
+
+def _get_game(game_id):
+    game_ = Game.query.filter_by(id=game_id).first()
+    if game_ is None:
+        raise ValueError(f'Game {game_id} does not exist')
+    return game_
+
+
+def advance_period(game_id, from_day=None):
+    from app.main.routes import advance_game_period
+
+    game_ = _get_game(game_id)
+    if game_.current_day >= MAX_DAY:
+        return 'Max day reached.'
+    if not advance_game_period(game_, from_day, progress=_set_task_progress):
+        return f'Day {from_day or game_.current_day} was already advanced.'
+    return f'Advanced to day {game_.current_day}.'
+
+
+def fast_forward(game_id, periods, from_day=None):
+    from app.main.routes import fast_forward_game
+
+    game_ = _get_game(game_id)
+    if game_.current_day >= MAX_DAY:
+        return 'Max day reached.'
+    advanced = fast_forward_game(game_, periods, from_day, progress=_set_task_progress)
+    if not advanced:
+        return f'Day {from_day or game_.current_day} was already advanced.'
+    return f'Advanced {advanced} periods to day {game_.current_day}.'
+
+
+def advance_all_games():
+    from app.batch import advance_all_games as advance_all, summary
+
+    return summary(advance_all(progress=_set_task_progress))
+
+
+def import_roster(records):
+    from app.roster import import_roster as import_records, summary
+
+    return summary(import_records(records))
+
+
+def rollback_period(game_id, from_day=None):
+    from app.main.routes import rollback_game_period
+
+    game_ = _get_game(game_id)
+    if not rollback_game_period(game_, from_day):
+        return f'Day {from_day} is not the current day any more, nothing was rolled back.'
+    return f'Rolled back to day {game_.current_day}.'
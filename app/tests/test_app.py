@@ -1,14 +1,32 @@
+import base64
+import io
+import os
 import re
+import tempfile
 import unittest
+from datetime import datetime, timedelta
 from functools import wraps
-from unittest import TestCase
+from unittest import TestCase, mock
 
 from flask_login import login_user, logout_user, current_user, login_required
-
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.security import check_password_hash
+
+import app.batch as batch
+import app.catalog as catalog_module
+import app.events as events
+import app.hashing as hashing
+import app.identity as identity
+import app.jobs as jobs
 import app.main.routes as routes
-from app import create_app, db
+import app.scheduler as scheduler
+from app import cli, create_app, db
 from app.config import Config
-from app.models import Activity, Game, Input, Penalty, Team, TeamActivity, User
+from app.models import Activity, CatalogVersion, Game, GameSchedule, Input, Penalty, PeriodAdvance, Team, \
+    Task, TeamActivity, User
+from app.roster import RosterError, parse_roster
+from app.totals import check_running_totals
 
 
 
@@ -20,6 +38,9 @@ Config.POSTGRES = {'db': 'warehouse_game_test',
                    'pw': '123',
                    'user': 'game'}
 Config.REDIS_URL = 'redis://'
+# background jobs run before the request that submits them returns
+Config.JOBS_BACKEND = 'inline'
+Config.SCHEDULER = 'off'
 Config.SQLALCHEMY_DATABASE_URI = 'postgresql://%(user)s:%(pw)s@%(host)s:%(port)s/%(db)s' % Config.POSTGRES
 
 
@@ -51,6 +72,16 @@ class BaseTest(TestCase):
         db.session.commit()
         return _user
 
+    def statements_of(self, call):
+        """ call() and the SQL statements it ran """
+        statements = []
+        counter = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', counter)
+        try:
+            return call(), statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', counter)
+
     def login_req(self, username, password):
         """ Make sure to use within a test context """
         login_resp = self.client.get('/auth/login')
@@ -257,6 +288,43 @@ class MainRoutesTest(BaseTest):
             self.assertTrue([i for i in game.teams] == [assigned_team])
             self.assertEqual(resp.status, '200 OK')
 
+    def test_game_teams_bulk(self):
+        with self.client:
+            self.login_admin()
+            game = routes.commit_object_to_db(Game)
+            teams = [routes.commit_object_to_db(Team, display_name=f'team{i}') for i in range(3)]
+            routes.update_game_teams(game, [teams[2].id])
+
+            resp = self.client.get(f'/games/{game.id}/teams')
+            resp = self.client.post(f'/games/{game.id}/teams', data=dict(
+                csrf_token=self.get_csrf(resp),
+                add_teams=[teams[0].id, teams[1].id],
+                remove_teams=[teams[2].id]
+            ), follow_redirects=True)
+
+            self.assertIn(b'Added 2 and removed 1 teams.', resp.data)
+            self.assertEqual([t.id for t in game.teams.order_by(Team.id)], [teams[0].id, teams[1].id])
+            inputs = Input.query.filter_by(game_id=game.id, active_at_day=1).all()
+            self.assertEqual(sorted(i.team_id for i in inputs), [t.id for t in teams])
+            self.assertTrue(all(i.money_at_start_of_period == routes.STARTING_FUNDS for i in inputs))
+
+    def test_users_move(self):
+        with self.client:
+            self.login_admin()
+            team = routes.commit_object_to_db(Team, display_name='team1')
+            users = [routes.commit_object_to_db(User, username=f'user{i}') for i in range(3)]
+
+            resp = self.client.get('/users/move')
+            resp = self.client.post('/users/move', data=dict(
+                csrf_token=self.get_csrf(resp),
+                users=[users[0].id, users[2].id],
+                team_id=team.id
+            ), follow_redirects=True)
+
+            self.assertIn(b'Moved 2 users.', resp.data)
+            self.assertEqual(sorted(u.username for u in team.users), ['user0', 'user2'])
+            self.assertIsNone(User.query.get(users[1].id).team_id)
+
 
 class MainGameRoutesTest(BaseTest):
 
@@ -273,7 +341,8 @@ class MainGameRoutesTest(BaseTest):
             input_.credit_to_take = 300
             routes.commit_to_db(input_)
             team_act = routes.commit_object_to_db(TeamActivity,
-                                                  id=f'{game.id}_{team.id}_A', input_id=input_.id)
+                                                  team_id=team.id, game=game.id,
+                                                  activity_id='A', input_id=input_.id)
             routes.set_team_activity(team_act, team, game)
             start_day = game.current_day
 
@@ -321,11 +390,11 @@ class MainGameRoutesTest(BaseTest):
             input_.credit_to_take = 300
             routes.commit_to_db(input_)
             team_act1 = routes.commit_object_to_db(TeamActivity,
-                                                   id=f'{game.id}_{team.id}_{activity1.id}',
+                                                   team_id=team.id, game=game.id, activity_id=activity1.id,
                                                    input_id=input_.id)
             routes.set_team_activity(team_act1, team, game)
             team_act2 = routes.commit_object_to_db(TeamActivity,
-                                                   id=f'{game.id}_{team.id}_{activity2.id}',
+                                                   team_id=team.id, game=game.id, activity_id=activity2.id,
                                                    input_id=input_.id)
             routes.set_team_activity(team_act2, team, game)
             start_day = game.current_day
@@ -371,6 +440,208 @@ class MainGameRoutesTest(BaseTest):
             self.assertEqual(new_period.active_at_day, start_day + routes.PERIOD_INCREMENT_IN_DAYS)
             self.assertTrue(len(penalties) == 1)
 
+    def test_game_advance_retry(self):
+        """Test endpoint game/<id> a resubmitted increase for the same day
+        does not advance or charge the game twice"""
+        with self.client:
+            self.login_admin()
+            activity = routes.commit_object_to_db(Activity, id='A', days_needed=20, cost=3000)
+            game = routes.commit_object_to_db(Game)
+            team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+            input_ = routes.get_current_period_input(team, game)
+            team_act = routes.commit_object_to_db(TeamActivity,
+                                                  team_id=team.id, game=game.id, activity_id=activity.id,
+                                                  input_id=input_.id)
+            routes.set_team_activity(team_act, team, game)
+            start_day = game.current_day
+
+            resp = self.client.get(f'/games/{game.id}')
+            csrf_resp = self.get_csrf(resp)
+            for _ in range(2):
+                resp = self.client.post(f'/games/{game.id}', data=dict(
+                    csrf_token=csrf_resp,
+                    increase_period='increase',
+                    current_day=start_day,
+                    submit='Save'
+                ), follow_redirects=True)
+
+            self.assertEqual(game.current_day, start_day + routes.PERIOD_INCREMENT_IN_DAYS)
+            self.assertEqual(len(Input.query.all()), 2)
+            self.assertEqual(len(Penalty.query.all()), 1)
+            self.assertTrue(f'Day {start_day} was already advanced.' in str(resp.data))
+
+    def test_game_increase_period_twice(self):
+        """Test the page after an advance is set to advance the new day"""
+        with self.client:
+            self.login_admin()
+            game = routes.commit_object_to_db(Game)
+            resp = self.client.get(f'/games/{game.id}')
+            for day in (1, 1 + routes.PERIOD_INCREMENT_IN_DAYS):
+                page = resp.data.decode()
+                self.assertIn(f'name="current_day" type="hidden" value="{day}"', page)
+                resp = self.client.post(f'/games/{game.id}', data=dict(
+                    csrf_token=self.get_csrf(resp),
+                    increase_period='increase',
+                    current_day=day,
+                    submit='Save'
+                ), follow_redirects=True)
+                self.assertIn(f'Advanced to day {day + routes.PERIOD_INCREMENT_IN_DAYS}.', resp.data.decode())
+            self.assertEqual(game.current_day, 1 + 2 * routes.PERIOD_INCREMENT_IN_DAYS)
+
+    def test_game_decrease_period(self):
+        """Test endpoint game/<id> decrease removes the undone periods"""
+        with self.client:
+            self.login_admin()
+            activity1 = routes.commit_object_to_db(Activity, id='A', days_needed=20, cost=1800)
+            activity2 = routes.commit_object_to_db(Activity, id='B', days_needed=10, cost=600)
+            game = routes.commit_object_to_db(Game)
+            team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+            input_ = routes.get_current_period_input(team, game)
+            team_act1 = routes.commit_object_to_db(TeamActivity, team_id=team.id, game=game.id,
+                                                   activity_id=activity1.id, input_id=input_.id)
+            routes.set_team_activity(team_act1, team, game)
+            routes.advance_game_period(game)
+            second_input = routes.load_current_period_input(team, game)
+            second_input.credit_to_take = 300
+            team_act2 = routes.commit_object_to_db(TeamActivity, team_id=team.id, game=game.id,
+                                                   activity_id=activity2.id, input_id=second_input.id)
+            routes.set_team_activity(team_act2, team, game)
+            routes.advance_game_period(game)
+            self.assertEqual(len(Penalty.query.all()), 1)
+
+            resp = self.client.get(f'/games/{game.id}')
+            csrf_resp = self.get_csrf(resp)
+            rolled_back_day = game.current_day
+            resp = self.client.post(f'/games/{game.id}', data=dict(
+                csrf_token=csrf_resp,
+                increase_period='decrease',
+                current_day=rolled_back_day,
+                submit='Save'
+            ))
+
+            self.assertEqual(resp.status, '302 FOUND')
+            self.assertEqual(game.current_day, 1 + routes.PERIOD_INCREMENT_IN_DAYS)
+            self.assertEqual([i.active_at_day for i in Input.query.order_by(Input.active_at_day)],
+                             [1, 1 + routes.PERIOD_INCREMENT_IN_DAYS])
+            self.assertEqual(Input.query.get(second_input.id).credit_to_take, 0)
+            self.assertEqual(Penalty.query.all(), [])
+            self.assertEqual([ta.activity_id for ta in TeamActivity.query.all()], ['A'])
+
+            # the same form sent again rolls nothing back
+            resp = self.client.post(f'/games/{game.id}', data=dict(
+                csrf_token=csrf_resp,
+                increase_period='decrease',
+                current_day=rolled_back_day,
+                submit='Save'
+            ), follow_redirects=True)
+            self.assertIn(f'Day {rolled_back_day} is not the current day any more', resp.data.decode())
+            self.assertEqual(game.current_day, 1 + routes.PERIOD_INCREMENT_IN_DAYS)
+            self.assertFalse(routes.rollback_game_period(game, rolled_back_day))
+
+            # the undone day can be advanced again
+            self.assertTrue(routes.advance_game_period(game))
+
+    def test_game_status(self):
+        """Test endpoint game_status/<id> totals after two periods"""
+        with self.client:
+            self.login_admin()
+            activity = routes.commit_object_to_db(Activity, id='A', days_needed=10, cost=1800)
+            game = routes.commit_object_to_db(Game)
+            team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+            input_ = routes.get_current_period_input(team, game)
+            team_act = routes.commit_object_to_db(TeamActivity,
+                                                  team_id=team.id, game=game.id, activity_id=activity.id,
+                                                  input_id=input_.id)
+            routes.set_team_activity(team_act, team, game)
+            routes.advance_game_period(game)
+            routes.advance_game_period(game)
+
+            resp = self.client.get(f'/game_status/{game.id}')
+            interest = sum(i.interest_cost for i in Input.query.all())
+            rent = sum(i.rent_cost for i in Input.query.all())
+
+            self.assertEqual(resp.status, '200 OK')
+            self.assertTrue(r'<td>{0:.2f}</td>'.format(interest) in str(resp.data))
+            self.assertTrue(rf'<td>{rent}</td>' in str(resp.data))
+            self.assertTrue(r'<td>[&#39;A&#39;]</td>' in resp.data.decode('utf-8'))
+
+    def test_report(self):
+        """Test endpoint reports/<id> one row per team and day"""
+        with self.client:
+            self.login_admin()
+            activity = routes.commit_object_to_db(Activity, id='A', days_needed=10, cost=1800)
+            game = routes.commit_object_to_db(Game)
+            team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+            input_ = routes.get_current_period_input(team, game)
+            team_act = routes.commit_object_to_db(TeamActivity,
+                                                  team_id=team.id, game=game.id, activity_id=activity.id,
+                                                  input_id=input_.id)
+            routes.set_team_activity(team_act, team, game)
+            routes.advance_game_period(game)
+
+            resp = self.client.get(f'/reports/{game.id}')
+            html = re.sub(r'\s+', ' ', resp.data.decode('utf-8'))
+
+            self.assertEqual(resp.status, '200 OK')
+            self.assertTrue('<th scope="col">Activity A</th>' in html)
+            self.assertTrue('<td>team1</td> <td>1</td> <td>2100.00</td>' in html)
+            self.assertTrue('<td>0.00</td> <td>started</td> </tr>' in html)
+            self.assertTrue('<td>team1</td> <td>11</td>' in html)
+            self.assertTrue('<td>0.00</td> <td>finished</td> </tr>' in html)
+
+    def test_download_results(self):
+        """Test endpoint admin/download_results/<id> streams one csv line per input"""
+        with self.client:
+            self.login_admin()
+            activity = routes.commit_object_to_db(Activity, id='A', days_needed=10, cost=1800)
+            game = routes.commit_object_to_db(Game)
+            team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+            input_ = routes.get_current_period_input(team, game)
+            team_act = routes.commit_object_to_db(TeamActivity,
+                                                  team_id=team.id, game=game.id, activity_id=activity.id,
+                                                  input_id=input_.id)
+            routes.set_team_activity(team_act, team, game)
+            routes.advance_game_period(game)
+
+            resp = self.client.get(f'/admin/download_results/{game.id}')
+            lines = resp.data.decode('utf-8').splitlines()
+
+            self.assertEqual(resp.status, '200 OK')
+            self.assertEqual(resp.headers['Content-Disposition'], 'attachment; filename=results.csv')
+            self.assertEqual(len(lines), 3)
+            self.assertTrue(lines[0].startswith('team_id,active_at_day,'))
+            self.assertTrue(lines[1].startswith(f'{team.id},1,2100'))
+            self.assertTrue(lines[1].endswith(',started'))
+            self.assertTrue(lines[2].startswith(f'{team.id},11,'))
+
+    def test_play_get_is_read_only(self):
+        """Test endpoint /play
+        a GET does not write, the input is created when the team joins the game"""
+        with self.client:
+            user = self.login_user()
+            game = routes.commit_object_to_db(Game)
+            team = routes.commit_object_to_db(Team, display_name='team1')
+            team.users.append(user)
+            team.game_id = game.id
+            routes.commit_to_db(team)
+            input_ = routes.get_current_period_input(team, game)
+            self.assertEqual(input_.money_at_start_of_period, routes.STARTING_FUNDS)
+
+            commits = []
+
+            def record_commit(session):
+                commits.append(session)
+
+            event.listen(Session, 'after_commit', record_commit)
+            try:
+                resp = self.client.get('/play')
+            finally:
+                event.remove(Session, 'after_commit', record_commit)
+
+            self.assertEqual(resp.status, '200 OK')
+            self.assertTrue(r'<h3>Available funds: 2100.00</h3>' in str(resp.data))
+            self.assertEqual(commits, [])
+
     def test_play_get(self):
         """Test endpoint /play
         get, post, increase_period"""
@@ -390,12 +661,14 @@ class MainGameRoutesTest(BaseTest):
             input_ = routes.get_current_period_input(team, game)
             routes.commit_to_db(input_)
             team_act1 = routes.commit_object_to_db(TeamActivity,
-                                                   id=f'{game.id}_{team.id}_{activity1.id}',
-                                                   input_id=input_.id)
+                                                   team_id=team.id, game=game.id, activity_id=activity1.id,
+                                                   input_id=input_.id, started_on_day=routes.MAX_DAY,
+                                                   finished_on_day=routes.MAX_DAY)
             # routes.set_team_activity(team_act1, team, game)
             team_act2 = routes.commit_object_to_db(TeamActivity,
-                                                   id=f'{game.id}_{team.id}_{activity2.id}',
-                                                   input_id=input_.id)
+                                                   team_id=team.id, game=game.id, activity_id=activity2.id,
+                                                   input_id=input_.id, started_on_day=routes.MAX_DAY,
+                                                   finished_on_day=routes.MAX_DAY)
             # routes.set_team_activity(team_act2, team, game)
 
             resp = self.client.get('/play', follow_redirects=True)
@@ -517,5 +790,702 @@ class MainGameRoutesTest(BaseTest):
                             r'A - finished on day 21,\n            Cost: 1800</h4>' in str(resp.data))
 
 
+class CatalogTest(BaseTest):
+
+    def test_catalog_is_cached_until_activities_change(self):
+        routes.commit_object_to_db(Activity, id='A', title='A', days_needed=20, cost=1800)
+        catalog = catalog_module.get_catalog()
+
+        self.assertIs(catalog_module.get_catalog(), catalog)
+        self.assertEqual(catalog.labels, {'A': 'A Ценa:1800'})
+
+        routes.commit_object_to_db(Activity, id='B', title='B', days_needed=10, cost=600)
+        catalog = catalog_module.get_catalog()
+
+        self.assertEqual([a.id for a in catalog.activities], ['A', 'B'])
+        self.assertEqual(catalog.version, 2)
+        self.assertEqual(catalog.choices(exclude=['A']), [('B', 'B Ценa:600')])
+
+    def test_catalog_reloads_on_stored_version_change(self):
+        routes.commit_object_to_db(Activity, id='A', title='A', days_needed=20, cost=1800)
+        catalog = catalog_module.get_catalog()
+
+        # another worker changed the activities
+        db.session.execute(CatalogVersion.__table__.update().values(version=10))
+        db.session.commit()
+        self.assertIs(catalog_module.get_catalog(), catalog)
+
+        catalog_module._checked_at -= catalog_module.VERSION_CHECK_SECONDS + 1
+        self.assertEqual(catalog_module.get_catalog().version, 10)
+
+
+class IdentityTest(BaseTest):
+
+    def _player(self):
+        game = routes.commit_object_to_db(Game)
+        team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+        user = routes.commit_object_to_db(User, username='player', team_id=team.id)
+        return user, team, game
+
+    def test_user_is_cached_until_changed(self):
+        user, team, game = self._player()
+        user_id, team_id = user.id, team.id
+        db.session.expunge_all()
+
+        self.assertEqual(identity.load_user(str(user_id)).username, 'player')
+        db.session.expunge_all()
+        cached, statements = self.statements_of(lambda: identity.load_user(str(user_id)))
+        self.assertEqual(statements, [])
+        self.assertEqual((cached.username, cached.team_id), ('player', team_id))
+
+        # dropped once the change is committed, not when it is flushed
+        cached.is_manager = False
+        db.session.flush()
+        self.assertIn(user_id, identity._users)
+        db.session.rollback()
+        self.assertIn(user_id, identity._users)
+        cached = identity.load_user(user_id)
+        cached.is_manager = True
+        db.session.flush()
+        self.assertIn(user_id, identity._users)
+        db.session.commit()
+        self.assertNotIn(user_id, identity._users)
+
+        identity.load_user(user_id)
+        routes.move_users_to_team([user_id], None)
+        self.assertNotIn(user_id, identity._users)
+        db.session.expunge_all()
+        self.assertIsNone(identity.load_user(user_id).team_id)
+
+    def test_team_and_game_are_one_query_per_request(self):
+        user, team, game = self._player()
+        with self.app.test_request_context():
+            login_user(user)
+            resolved, statements = self.statements_of(
+                lambda: (routes.current_team(), routes.current_game(), routes.current_team()))
+            self.assertEqual(resolved, (team, game, team))
+            self.assertEqual(len(statements), 1)
+
+    def test_current_game_without_team(self):
+        user = routes.commit_object_to_db(User, username='loner')
+        with self.app.test_request_context():
+            login_user(user)
+            self.assertIsNone(routes.current_team())
+            with self.assertRaises(AttributeError):
+                routes.current_game()
+
+
+class TokenTest(BaseTest):
+
+    def _basic_auth(self, username, password):
+        return {'Authorization': 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()}
+
+    def test_token_lifecycle(self):
+        self.add_user('api_user', '123')
+        self.assertEqual(self.client.post('/api/tokens', headers=self._basic_auth('api_user', 'x')).status_code,
+                         401)
+        resp = self.client.post('/api/tokens', headers=self._basic_auth('api_user', '123'))
+        token = resp.get_json()['token']
+        self.assertEqual(len(token), 32)
+        # a token that is still valid is handed out again
+        resp = self.client.post('/api/tokens', headers=self._basic_auth('api_user', '123'))
+        self.assertEqual(resp.get_json()['token'], token)
+
+        bearer = {'Authorization': f'Bearer {token}'}
+        self.assertEqual(self.client.delete('/api/tokens', headers=bearer).status_code, 204)
+        self.assertEqual(self.client.delete('/api/tokens', headers=bearer).status_code, 401)
+        self.assertIsNone(User.check_token(token))
+
+    def test_token_check_is_one_query(self):
+        user = self.add_user('api_user', '123')
+        token = user.get_token()
+        db.session.commit()
+        user_id = user.id
+
+        self.assertEqual(User.check_token(token).id, user_id)
+        db.session.expunge_all()
+        # the user comes from the cache, only the token is looked up
+        checked, statements = self.statements_of(lambda: User.check_token(token))
+        self.assertEqual((checked.id, len(statements)), (user_id, 1))
+        self.assertIsNone(User.check_token('not a token'))
+
+        checked.revoke_token()
+        db.session.commit()
+        self.assertIsNone(User.check_token(token))
+
+        # revoked by another worker, bypassing this one's session and cache
+        token = checked.get_token()
+        db.session.commit()
+        self.assertEqual(User.check_token(token).id, user_id)
+        db.session.execute(User.__table__.update().where(User.__table__.c.id == user_id)
+                           .values(token_expiration=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+        self.assertIsNone(User.check_token(token))
+
+
+class StateApiTest(BaseTest):
+
+    def _player_game(self):
+        routes.commit_object_to_db(Activity, title='A', id='A', days_needed=30, cost=100)
+        game = routes.commit_object_to_db(Game)
+        team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+        other = routes.commit_object_to_db(Team, display_name='team2', game_id=game.id)
+        user = self.add_user('player', '123')
+        user.is_manager = True
+        user.team_id = team.id
+        routes.commit_to_db(user)
+        routes.create_period_inputs(game, [team.id, other.id])
+        db.session.commit()
+        return game, team, other, user
+
+    def test_team_state_is_conditional(self):
+        game, team, other, user = self._player_game()
+        token = user.get_token()
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {token}'}
+        url = f'/api/games/{game.id}/teams/{team.id}/state'
+
+        resp = self.client.get(url, headers=headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['money_at_start_of_period'], routes.STARTING_FUNDS)
+        etag = resp.headers['ETag']
+        resp = self.client.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual((resp.status_code, resp.data), (304, b''))
+        self.assertEqual(resp.headers['ETag'], etag)
+
+        self.assertEqual(self.client.get(f'/api/games/{game.id}/teams/{other.id}/state',
+                                         headers=headers).status_code, 403)
+        self.assertEqual(self.client.get(f'/api/games/{game.id}/state', headers=headers).status_code, 403)
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        # a choice made on the play page
+        with self.client:
+            resp = self.login_req('player', '123')
+            resp = self.client.get('/play')
+            self.client.post('/play', data=dict(csrf_token=self.get_csrf(resp), add_activity='A',
+                                                remove_activity=routes.NONE_OPTION[0][0],
+                                                apply_for_credit=0, submit='Save'))
+            # the game pages poll with their session
+            resp = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([ta['activity_id'] for ta in resp.get_json()['started']], ['A'])
+        etag_after_play = resp.headers['ETag']
+
+        routes.advance_game_period(game)
+        resp = self.client.get(url, headers=dict(headers, **{'If-None-Match': etag_after_play}))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([ta['activity_id'] for ta in resp.get_json()['in_progress']], ['A'])
+
+        routes.rollback_game_period(game)
+        resp = self.client.get(url, headers=dict(headers, **{'If-None-Match': etag_after_play}))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['started'], [])
+
+    def test_team_state_does_not_create_inputs(self):
+        game, team, other, user = self._player_game()
+        late = routes.commit_object_to_db(Team, display_name='team3', game_id=game.id)
+        admin = self.add_user('admin', '123', is_admin=True)
+        token = admin.get_token()
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        resp = self.client.get(f'/api/games/{game.id}/teams/{late.id}/state', headers=headers)
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(Input.query.filter_by(team_id=late.id).count(), 0)
+        self.assertEqual(self.client.get(f'/api/games/{game.id}/teams/999/state',
+                                         headers=headers).status_code, 404)
+
+    def test_game_state(self):
+        game, team, other, user = self._player_game()
+        admin = self.add_user('admin', '123', is_admin=True)
+        token = admin.get_token()
+        db.session.commit()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        resp = self.client.get(f'/api/games/{game.id}/state', headers=headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([t['team']['id'] for t in resp.get_json()['teams']], [team.id, other.id])
+        etag = resp.headers['ETag']
+        resp = self.client.get(f'/api/games/{game.id}/state', headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(resp.status_code, 304)
+
+        routes.advance_game_period(game)
+        resp = self.client.get(f'/api/games/{game.id}/state', headers=dict(headers, **{'If-None-Match': etag}))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['game']['current_day'], 1 + routes.PERIOD_INCREMENT_IN_DAYS)
+        self.assertEqual(self.client.get('/api/games/999/state', headers=headers).status_code, 404)
+
+
+class GameEventsTest(BaseTest):
+
+    def _game_with_player(self):
+        game = routes.commit_object_to_db(Game)
+        team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+        routes.create_period_inputs(game, [team.id])
+        db.session.commit()
+        user = self.add_user('player', '123')
+        user.team_id = team.id
+        routes.commit_to_db(user)
+        return game, team
+
+    def test_stream(self):
+        game, team = self._game_with_player()
+        broker = self.app.extensions['events']
+        with mock.patch.object(events.DatabaseWatcher, 'start'), self.client:
+            self.login_req('player', '123')
+            self.assertEqual(self.client.get(f'/games/{game.id + 1}/events').status_code, 403)
+
+            resp = self.client.get(f'/games/{game.id}/events', buffered=False)
+            self.assertEqual(resp.mimetype, 'text/event-stream')
+            stream = iter(resp.response)
+            self.assertEqual(next(stream), b'retry: 3000\n\n')
+
+            routes.advance_game_period(game)
+            self.assertEqual(next(stream), b'event: day\ndata: {"game_id": %d, "current_day": %d}\n\n'
+                             % (game.id, game.current_day))
+            # published by the route and found by the watcher
+            broker.deliver(game.id, events.DAY, {'game_id': game.id, 'current_day': game.current_day})
+            broker.deliver(game.id, events.TEAM, {'game_id': game.id, 'team_id': team.id, 'version': 1})
+            self.assertIn(b'event: team', next(stream))
+
+            resp.close()
+        self.assertEqual(broker.watched_games(), [])
+
+    def test_stream_sends_a_day_the_page_missed(self):
+        game, team = self._game_with_player()
+        with mock.patch.object(events.DatabaseWatcher, 'start'), self.client:
+            self.login_req('player', '123')
+            resp = self.client.get(f'/games/{game.id}/events?day={game.current_day - 1}', buffered=False)
+            stream = iter(resp.response)
+            next(stream)
+            self.assertIn(b'event: day', next(stream))
+            resp.close()
+
+    def test_watcher_finds_changes_of_other_processes(self):
+        game, team = self._game_with_player()
+        game_id, team_id, day = game.id, team.id, game.current_day
+        broker = self.app.extensions['events']
+        watcher = broker.watcher
+        with mock.patch.object(events.DatabaseWatcher, 'start'):
+            subscription = broker.subscribe(game_id, day, {team_id: 0})
+        watcher.poll()
+        self.assertIsNone(subscription.get(timeout=0))
+
+        db.session.execute(Input.__table__.update().values(version=Input.version + 1))
+        db.session.commit()
+        watcher.poll()
+        self.assertEqual(subscription.get(timeout=0),
+                         (events.TEAM, {'game_id': game_id, 'team_id': team_id, 'version': 1}))
+
+        db.session.execute(Game.__table__.update().values(current_day=day + 10))
+        db.session.commit()
+        watcher.poll()
+        self.assertEqual(subscription.get(timeout=0),
+                         (events.DAY, {'game_id': game_id, 'current_day': day + 10}))
+        self.assertIsNone(subscription.get(timeout=0))
+        subscription.close()
+
+
+class JobsTest(BaseTest):
+
+    def _game(self):
+        routes.commit_object_to_db(Activity, id='A', days_needed=20, cost=1800)
+        game = routes.commit_object_to_db(Game)
+        team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+        routes.set_team_activity(TeamActivity(activity_id='A'), team, game)
+        return game
+
+    def test_advance_job_reports_progress(self):
+        game = self._game()
+        with mock.patch.object(jobs, '_update_task', wraps=jobs._update_task) as update_task:
+            task = jobs.submit('advance_period', game.id, 1, description='Advance day 1', game_id=game.id)
+
+        self.assertEqual((task.status, task.progress, task.complete), (jobs.FINISHED, 100, True))
+        self.assertEqual(task.message, f'Advanced to day {1 + routes.PERIOD_INCREMENT_IN_DAYS}.')
+        self.assertEqual([c.kwargs['progress'] for c in update_task.call_args_list if 'progress' in c.kwargs],
+                         [40, 70, 100])
+        self.assertEqual(game.current_day, 1 + routes.PERIOD_INCREMENT_IN_DAYS)
+
+        task = jobs.submit('advance_period', game.id, 1, description='Advance day 1', game_id=game.id)
+        self.assertEqual((task.status, task.message), (jobs.FINISHED, 'Day 1 was already advanced.'))
+        self.assertEqual(jobs.running_tasks(game.id), [])
+        self.assertEqual(jobs.last_finished_task(game.id), task)
+
+    def test_failed_job(self):
+        task = jobs.submit('advance_period', 999, description='Advance a game that is not there')
+        self.assertEqual((task.status, task.message, task.complete), (jobs.FAILED, 'Game 999 does not exist', True))
+
+    def test_thread_backend(self):
+        game = self._game()
+        backend = jobs.ThreadBackend(self.app, 1)
+        with mock.patch.dict(self.app.extensions, jobs=backend):
+            task = jobs.submit('advance_period', game.id, description='Advance', game_id=game.id)
+            backend._pool.shutdown(wait=True)
+        self.assertEqual(task.status, jobs.FINISHED)
+
+    def test_task_status(self):
+        with self.client:
+            admin = self.login_admin()
+            game = self._game()
+            resp = self.client.get(f'/games/{game.id}')
+            resp = self.client.post(f'/games/{game.id}', data=dict(
+                csrf_token=self.get_csrf(resp), increase_period='increase', submit='Save'),
+                follow_redirects=True)
+            self.assertIn(f'Advanced to day {game.current_day}.', resp.data.decode())
+            task = jobs.last_finished_task(game.id)
+            self.assertEqual(task.user_id, admin.id)
+
+            resp = self.client.get(f'/api/tasks/{task.id}')
+            self.assertEqual(resp.get_json()['status'], jobs.FINISHED)
+            self.assertEqual(self.client.get('/api/tasks/nope').status_code, 404)
+
+
+class FastForwardTest(BaseTest):
+
+    def _game(self):
+        game = routes.commit_object_to_db(Game)
+        for name, activities, credit in (('team1', 'AB', 0), ('team2', 'C', 3000)):
+            team = routes.commit_object_to_db(Team, display_name=name, game_id=game.id)
+            input_ = routes.get_current_period_input(team, game)
+            input_.credit_to_take = credit
+            routes.commit_to_db(input_)
+            for activity_id in activities:
+                routes.set_team_activity(TeamActivity(activity_id=activity_id), team, game, input_)
+        return game
+
+    def _state(self, game):
+        """ Everything the advances wrote, with the ids of the game taken out. """
+        teams = {team.id: team.display_name for team in game.teams}
+        skip = {'id', 'team_id', 'game_id', 'date_created', 'date_modified'}
+        inputs = Input.query.filter_by(game_id=game.id).order_by(Input.team_id, Input.active_at_day).all()
+        penalties = [(teams[i.team_id], i.active_at_day, p.activity_id, p.fine)
+                     for i in inputs for p in Penalty.query.filter_by(input_id=i.id).order_by(Penalty.id)]
+        return ([(teams[i.team_id], {c.key: getattr(i, c.key) for c in Input.__table__.columns if c.key not in skip})
+                 for i in inputs],
+                sorted(penalties),
+                sorted((teams[ta.team_id], ta.activity_id, ta.started_on_day, ta.finished_on_day)
+                       for ta in TeamActivity.query.filter_by(game=game.id)))
+
+    def test_same_as_advancing_period_by_period(self):
+        for id_, days, cost in (('A', 10, 1800), ('B', 30, 5000), ('C', 20, 2500)):
+            routes.commit_object_to_db(Activity, id=id_, days_needed=days, cost=cost)
+        stepped, forwarded = self._game(), self._game()
+        for _ in range(6):
+            self.assertTrue(routes.advance_game_period(stepped))
+        self.assertEqual(routes.fast_forward_game(forwarded, 6), 6)
+
+        self.assertEqual(forwarded.current_day, stepped.current_day)
+        self.assertEqual(self._state(forwarded), self._state(stepped))
+        self.assertTrue(self._state(forwarded)[1])
+        self.assertEqual(check_running_totals(forwarded.id), [])
+        self.assertEqual(PeriodAdvance.query.filter_by(game_id=forwarded.id).count(), 6)
+        # every period of the range has to be new
+        self.assertEqual(routes.fast_forward_game(forwarded, 2, from_day=stepped.current_day - 10), 0)
+
+    def test_stops_at_max_day(self):
+        routes.commit_object_to_db(Activity, id='A', days_needed=10, cost=100)
+        routes.commit_object_to_db(Activity, id='B', days_needed=10, cost=100)
+        routes.commit_object_to_db(Activity, id='C', days_needed=10, cost=100)
+        game = self._game()
+        game.current_day = routes.MAX_DAY - 2 * routes.PERIOD_INCREMENT_IN_DAYS
+        routes.commit_to_db(game)
+        self.assertEqual(routes.fast_forward_game(game, 5), 2)
+        self.assertEqual(game.current_day, routes.MAX_DAY)
+        self.assertEqual(routes.fast_forward_game(game, 5), 0)
+
+    def test_fast_forward_job(self):
+        with self.client:
+            self.login_admin()
+            routes.commit_object_to_db(Activity, id='A', days_needed=10, cost=100)
+            game = routes.commit_object_to_db(Game)
+            resp = self.client.get(f'/games/{game.id}')
+            resp = self.client.post(f'/games/{game.id}/fast_forward', data=dict(
+                csrf_token=self.get_csrf(resp), periods=3, current_day=1, submit='Fast forward'),
+                follow_redirects=True)
+            self.assertIn(f'Advanced 3 periods to day {1 + 3 * routes.PERIOD_INCREMENT_IN_DAYS}.',
+                          resp.data.decode())
+
+            resp = self.client.post(f'/games/{game.id}/fast_forward', data=dict(
+                csrf_token=self.get_csrf(resp), periods=3, current_day=1, submit='Fast forward'),
+                follow_redirects=True)
+            self.assertIn('Day 1 was already advanced.', resp.data.decode())
+
+    def test_fast_forward_command(self):
+        game = routes.commit_object_to_db(Game)
+        cli.register(self.app)
+        result = self.app.test_cli_runner().invoke(args=['games', 'fast-forward', str(game.id), '2'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn(f'Advanced 2 periods to day {1 + 2 * routes.PERIOD_INCREMENT_IN_DAYS}.', result.output)
+
+
+class AdvanceAllTest(BaseTest):
+
+    def _games(self, count):
+        routes.commit_object_to_db(Activity, id='A', days_needed=10, cost=100)
+        games = []
+        for i in range(count):
+            game = routes.commit_object_to_db(Game)
+            team = routes.commit_object_to_db(Team, display_name=f'team{i}', game_id=game.id)
+            routes.set_team_activity(TeamActivity(activity_id='A'), team, game)
+            games.append(game.id)
+        return games
+
+    def test_failing_game_does_not_stop_the_others(self):
+        game_ids = self._games(3)
+        calculate = routes._calculate_next_period
+
+        def fail_second_game(game_, progress=None):
+            if game_.id == game_ids[1]:
+                raise RuntimeError('boom')
+            return calculate(game_, progress)
+
+        with mock.patch.object(routes, '_calculate_next_period', side_effect=fail_second_game):
+            results = batch.advance_all_games(workers=1)
+
+        self.assertEqual([(r.game_id, r.to_day, r.error) for r in results],
+                         [(game_ids[0], 11, None), (game_ids[1], None, 'boom'), (game_ids[2], 11, None)])
+        self.assertTrue(all(r.seconds >= 0 for r in results))
+        self.assertEqual([Game.query.get(id_).current_day for id_ in game_ids], [11, 1, 11])
+        self.assertIn(f'Game {game_ids[1]}: failed at day 1', batch.summary(results))
+        self.assertTrue(batch.summary(results).endswith('Advanced 2 of 3 games, 1 failed.'))
+
+    def test_workers_use_the_database_of_the_app(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # the workers are other processes, they cannot see an in-memory database
+            class FileConfig(Config):
+                SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir, 'batch.db')
+
+            with create_app(FileConfig).app_context():
+                db.create_all()
+                try:
+                    game_ids = self._games(3)
+                    results = batch.advance_all_games(workers=2)
+                    self.assertEqual([(r.game_id, r.to_day, r.error) for r in results],
+                                     [(game_id, 11, None) for game_id in game_ids])
+                    db.session.expire_all()
+                    self.assertEqual([Game.query.get(id_).current_day for id_ in game_ids], [11, 11, 11])
+                finally:
+                    db.session.remove()
+                    db.drop_all()
+
+    def test_advance_all_command_and_endpoint(self):
+        self._games(2)
+        cli.register(self.app)
+        result = self.app.test_cli_runner().invoke(args=['games', 'advance-all', '--workers', '1'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Advanced 2 of 2 games.', result.output)
+
+        with self.client:
+            self.login_admin()
+            resp = self.client.get('/games')
+            resp = self.client.post('/games/advance_all', data=dict(csrf_token=self.get_csrf(resp)),
+                                    follow_redirects=True)
+            self.assertIn('Advanced 2 of 2 games.', resp.data.decode())
+        self.assertEqual({g.current_day for g in Game.query}, {21})
+
+
+class SchedulerTest(BaseTest):
+
+    def _scheduled_game(self, **schedule):
+        routes.commit_object_to_db(Activity, id='A', days_needed=10, cost=100)
+        game = routes.commit_object_to_db(Game)
+        team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+        routes.set_team_activity(TeamActivity(activity_id='A'), team, game)
+        now = datetime.utcnow()
+        schedule = routes.commit_object_to_db(GameSchedule, game_id=game.id, interval_minutes=10,
+                                              next_run_at=now - timedelta(minutes=1), **schedule)
+        return game, schedule, now
+
+    def test_first_runs_are_spread(self):
+        now = datetime.utcnow()
+        for interval_minutes in (1, 10, 60):
+            interval = interval_minutes * 60
+            offsets = sorted((scheduler.first_run_at(game_id, interval_minutes, now) - now).total_seconds()
+                             for game_id in range(1, 11))
+            self.assertTrue(all(0 <= offset < interval for offset in offsets))
+            # ten games cover most of the interval, at least a twentieth of it apart
+            self.assertGreater(offsets[-1] - offsets[0], 0.8 * interval)
+            self.assertGreater(min(b - a for a, b in zip(offsets, offsets[1:])), interval / 20)
+
+    def test_due_schedule_advances_the_game(self):
+        game, schedule, now = self._scheduled_game()
+        due_at = schedule.next_run_at
+
+        tasks = scheduler.run_due_schedules(now)
+        self.assertEqual([(t.status, t.game_id) for t in tasks], [(jobs.FINISHED, game.id)])
+        self.assertEqual(game.current_day, 1 + routes.PERIOD_INCREMENT_IN_DAYS)
+        self.assertEqual(schedule.next_run_at, due_at + timedelta(minutes=10))
+        self.assertEqual(scheduler.run_due_schedules(now), [])
+
+    def test_schedule_stops(self):
+        game, schedule, now = self._scheduled_game(stop_at_day=1)
+        self.assertEqual(scheduler.run_due_schedules(now), [])
+        self.assertFalse(schedule.is_active)
+        self.assertEqual(game.current_day, 1)
+
+        schedule.stop_at_day = None
+        schedule.stop_activity_id = 'A'
+        schedule.is_active = True
+        routes.commit_to_db(schedule)
+        self.assertEqual(len(scheduler.run_due_schedules(now)), 1)
+        # A finished in the first period
+        self.assertEqual(scheduler.run_due_schedules(now + timedelta(minutes=10)), [])
+        self.assertFalse(schedule.is_active)
+
+    def test_schedule_page(self):
+        with self.client:
+            self.login_admin()
+            game = routes.commit_object_to_db(Game)
+            resp = self.client.get(f'/games/{game.id}/schedule')
+            before = datetime.utcnow()
+            self.client.post(f'/games/{game.id}/schedule', data=dict(
+                csrf_token=self.get_csrf(resp), is_active='y', interval_minutes=5,
+                stop_at_day='', stop_activity_id=routes.NONE_OPTION[0][0], submit='Save'))
+            schedule = GameSchedule.query.filter_by(game_id=game.id).one()
+            self.assertTrue(schedule.is_active)
+            self.assertIsNone(schedule.stop_activity_id)
+            # the first advance comes after the phase of the game, within the interval
+            self.assertLessEqual(scheduler.first_run_at(game.id, 5, before), schedule.next_run_at)
+            self.assertLessEqual(schedule.next_run_at, scheduler.first_run_at(game.id, 5))
+
+
+class RunningTotalsTest(BaseTest):
+
+    def _play_game(self):
+        activity = routes.commit_object_to_db(Activity, id='A', days_needed=10, cost=1800)
+        game = routes.commit_object_to_db(Game)
+        team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+        input_ = routes.get_current_period_input(team, game)
+        team_act = routes.commit_object_to_db(TeamActivity, team_id=team.id, game=game.id,
+                                              activity_id=activity.id, input_id=input_.id)
+        routes.set_team_activity(team_act, team, game)
+        for _ in range(3):
+            routes.advance_game_period(game)
+        return game, team
+
+    def test_advance_keeps_running_totals(self):
+        game, team = self._play_game()
+        inputs = Input.query.filter_by(team_id=team.id).order_by(Input.active_at_day).all()
+        current = inputs[-1]
+
+        self.assertEqual(current.active_at_day, game.current_day)
+        self.assertAlmostEqual(current.cumulative_interest_cost, sum(i.interest_cost for i in inputs))
+        self.assertEqual(current.cumulative_rent_cost, sum(i.rent_cost for i in inputs))
+        # A finished on day 11, the advances from day 11 and 21 paid a profit
+        self.assertEqual(current.cumulative_profit, 2 * routes.PROFIT_PER_DAY * routes.PERIOD_INCREMENT_IN_DAYS)
+        self.assertEqual([i.finished_activity_count for i in inputs], [0, 1, 1, 1])
+        self.assertEqual([i.finished_mask for i in inputs], [0, 1, 1, 1])
+        self.assertEqual(check_running_totals(game.id), [])
+
+    def test_team_activities_from_masks(self):
+        game = routes.commit_object_to_db(Game)
+        team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+        for id_, days in (('A', 10), ('B', 30), ('C', 10)):
+            routes.commit_object_to_db(Activity, id=id_, days_needed=days, cost=100)
+        input_ = routes.get_current_period_input(team, game)
+        for id_ in 'AB':
+            routes.set_team_activity(TeamActivity(activity_id=id_), team, game, input_)
+        routes.advance_game_period(game)
+        routes.advance_game_period(game)
+        routes.set_team_activity(TeamActivity(activity_id='C'), team, game)
+
+        input_ = routes.load_current_period_input(team, game)
+        self.assertEqual((input_.finished_mask, input_.in_progress_mask), (0b001, 0b010))
+        from_masks = routes.get_team_activities(game, team, input_)
+        self.assertEqual([[ta.activity_id for ta in tas] for tas in from_masks], [['C'], ['B'], ['A']])
+
+        # inputs from before the masks were kept
+        input_.finished_mask = input_.in_progress_mask = None
+        self.assertEqual(routes.get_team_activities(game, team, input_), from_masks)
+
+    def test_masks_survive_catalog_changes(self):
+        game = routes.commit_object_to_db(Game)
+        team = routes.commit_object_to_db(Team, display_name='team1', game_id=game.id)
+        for id_ in 'BC':
+            routes.commit_object_to_db(Activity, id=id_, days_needed=10, cost=100)
+        routes.set_team_activity(TeamActivity(activity_id='C'), team, game)
+        routes.advance_game_period(game)
+        routes.advance_game_period(game)
+        bits = dict(catalog_module.get_activity_graph().bits)
+
+        # the bit of a deleted activity is not handed out again
+        deleted_bit = routes.commit_object_to_db(Activity, id='D', days_needed=10).bit_index
+        routes._delete_object_from_db(Activity, id='D')
+        # a new activity that sorts first leaves the bits of the others alone
+        routes.commit_object_to_db(Activity, id='A', days_needed=10, cost=100)
+        graph = catalog_module.get_activity_graph()
+        self.assertEqual((graph.bits['B'], graph.bits['C']), (bits['B'], bits['C']))
+        self.assertNotIn(graph.bits['A'], list(bits.values()) + [1 << deleted_bit])
+        input_ = routes.load_current_period_input(team, game)
+        to_be_started, in_progress, finished = routes.get_team_activities(game, team, input_)
+        self.assertEqual([ta.activity_id for ta in finished], ['C'])
+
+    def test_catalog_full(self):
+        routes.commit_object_to_db(Activity, id='A', bit_index=catalog_module.MAX_BIT_INDEXES - 1)
+        with self.assertRaises(catalog_module.CatalogFull):
+            routes.commit_object_to_db(Activity, id='B')
+
+    def test_check_totals_command(self):
+        game, team = self._play_game()
+        Input.query.filter_by(team_id=team.id).update({Input.cumulative_rent_cost: None})
+        db.session.commit()
+        cli.register(self.app)
+        runner = self.app.test_cli_runner()
+
+        result = runner.invoke(args=['games', 'check-totals', str(game.id)])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('cumulative_rent_cost is None', result.output)
+
+        result = runner.invoke(args=['games', 'check-totals', '--fix'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(check_running_totals(game.id), [])
+
+
+class RosterImportTest(BaseTest):
+
+    def test_users_import(self):
+        with self.client:
+            self.login_admin()
+            game = routes.commit_object_to_db(Game)
+            routes.commit_object_to_db(User, username='taken')
+            roster = ('username,password,team,game,is_manager\n'
+                      'student1,pass1,Team A,{0},yes\n'
+                      'student2,pass2,Team A,,\n'
+                      'student3,pass3,Team B,999,\n'
+                      'taken,pass4,,,\n'
+                      ',pass5,Team C,,\n').format(game.id)
+            resp = self.client.get('/users/import')
+            resp = self.client.post('/users/import', data=dict(
+                csrf_token=self.get_csrf(resp),
+                roster=(io.BytesIO(roster.encode()), 'roster.csv')
+            ), content_type='multipart/form-data')
+
+            self.assertEqual(resp.status, '200 OK')
+            task = Task.query.filter_by(name='import_roster').one()
+            self.assertEqual(task.status, jobs.FINISHED)
+            self.assertIn(b'Imported 2 of 5 users.', resp.data)
+            self.assertIn(b'game 999 does not exist', resp.data)
+            self.assertIn(b'username already exists', resp.data)
+            team = Team.query.filter_by(display_name='Team A').one()
+            self.assertEqual(team.game_id, game.id)
+            self.assertEqual(sorted((u.username, u.is_manager) for u in team.users),
+                             [('student1', True), ('student2', False)])
+            self.assertTrue(User.query.filter_by(username='student2').one().check_password('pass2'))
+            self.assertIsNone(Team.query.filter_by(display_name='Team B').first())
+            input_ = Input.query.filter_by(team_id=team.id, game_id=game.id).one()
+            self.assertEqual(input_.money_at_start_of_period, routes.STARTING_FUNDS)
+
+    def test_hash_passwords_in_a_pool(self):
+        passwords = [f'pass{i}' for i in range(hashing.POOL_THRESHOLD)]
+        hashes = hashing.hash_passwords(passwords, workers=2)
+        self.assertTrue(all(check_password_hash(h, p) for h, p in zip(hashes, passwords)))
+
+    def test_parse_json_roster(self):
+        records = parse_roster('roster.json', b'[{"Username": "s1", "password": "p", "game": 1}]')
+        self.assertEqual(records, [{'username': 's1', 'password': 'p', 'game': '1'}])
+        with self.assertRaises(RosterError):
+            parse_roster('roster.json', b'{"username": "s1"}')
+
+
 if __name__ == '__main__':
     unittest.main()
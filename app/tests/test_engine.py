@@ -0,0 +1,89 @@
+import unittest
+from unittest import TestCase
+
+from app import engine
+from app.activity_graph import ActivityGraph
+from app.engine import ActivitySpec, QueuedActivity, TeamState
+
+
+ACTIVITIES = ActivityGraph([
+    ActivitySpec('A', 1800, 20, frozenset()),
+    ActivitySpec('B', 600, 10, frozenset()),
+    ActivitySpec('C', 300, 10, frozenset(['A'])),
+])
+
+
+class EngineTest(TestCase):
+
+    def test_start_affordable_and_fine_the_rest(self):
+        state = TeamState(1, money_at_start_of_period=2100, credit_taken=2100, credit_to_take=300,
+                          queued=[QueuedActivity('1_1_A', 'A'), QueuedActivity('1_1_B', 'B')])
+        result, = engine.advance_game([state], ACTIVITIES, 1)
+
+        self.assertEqual(result.started, [engine.StartedActivity('1_1_A', 'A', 1, 21)])
+        self.assertEqual(result.penalties, [('B', engine.NOT_ENOUGH_FUNDS_PENALTY)])
+        self.assertEqual(result.active_at_day, 1 + engine.PERIOD_INCREMENT_IN_DAYS)
+        self.assertEqual(result.credit_taken, 2400)
+        self.assertEqual(result.interest_cost, engine.interest_for_credit(2100))
+        self.assertEqual(result.money_at_start_of_period,
+                         2100 - 1800 + 300 - engine.NOT_ENOUGH_FUNDS_PENALTY - result.interest_cost)
+        self.assertEqual(result.money_at_end_of_period, result.money_at_start_of_period)
+
+    def test_requirements_must_be_finished(self):
+        queued = [QueuedActivity('1_1_C', 'C')]
+        blocked = engine.advance_team(TeamState(1, money_at_start_of_period=5000, queued=queued),
+                                      ACTIVITIES, 21)
+        allowed = engine.advance_team(TeamState(1, money_at_start_of_period=5000, queued=queued,
+                                                finished=ACTIVITIES.mask('A')),
+                                      ACTIVITIES, 21)
+
+        self.assertFalse(blocked.started)
+        self.assertEqual(blocked.penalties, [('C', engine.NOT_ENOUGH_FUNDS_PENALTY)])
+        self.assertEqual(allowed.started, [engine.StartedActivity('1_1_C', 'C', 21, 31)])
+
+    def test_rent_is_charged_at_month_start(self):
+        self.assertEqual(engine.advance_team(TeamState(1), ACTIVITIES, 21).rent_cost,
+                         engine.RENT_PER_MONTH)
+        self.assertEqual(engine.advance_team(TeamState(1), ACTIVITIES, 11).rent_cost, 0)
+
+    def test_profit_returns_credit(self):
+        state = TeamState(1, money_at_start_of_period=3000, credit_taken=1000,
+                          finished=ACTIVITIES.all_mask)
+        result = engine.advance_team(state, ACTIVITIES, 101)
+
+        profit = engine.PROFIT_PER_DAY * engine.PERIOD_INCREMENT_IN_DAYS
+        self.assertEqual(result.credit_taken, 0)
+        self.assertEqual(result.money_at_start_of_period,
+                         3000 + profit - engine.interest_for_credit(1000) - 1000)
+
+
+class ActivityGraphTest(TestCase):
+
+    def setUp(self):
+        self.graph = ActivityGraph([
+            ActivitySpec('A', 100, 1, frozenset()),
+            ActivitySpec('B', 100, 1, frozenset(['A'])),
+            ActivitySpec('C', 100, 1, frozenset(['B'])),
+            ActivitySpec('D', 100, 1, frozenset(['A', 'C'])),
+        ])
+
+    def test_eligibility(self):
+        self.assertTrue(self.graph.is_eligible('A', 0))
+        self.assertFalse(self.graph.is_eligible('B', 0))
+        self.assertTrue(self.graph.is_eligible('B', self.graph.mask('A')))
+        self.assertFalse(self.graph.is_eligible('D', self.graph.mask('A')))
+        self.assertTrue(self.graph.is_eligible('D', self.graph.mask('AC')))
+
+    def test_order_and_closure(self):
+        self.assertEqual(self.graph.order, ['A', 'B', 'C', 'D'])
+        self.assertEqual(self.graph.ids_of(self.graph.closure['D']), ['A', 'B', 'C'])
+        self.assertEqual(self.graph.closure['A'], 0)
+
+    def test_cycle(self):
+        with self.assertRaises(ValueError):
+            ActivityGraph([ActivitySpec('A', 1, 1, frozenset('B')),
+                           ActivitySpec('B', 1, 1, frozenset('A'))])
+
+
+if __name__ == '__main__':
+    unittest.main()
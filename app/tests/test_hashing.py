@@ -0,0 +1,22 @@
+import unittest
+from unittest import TestCase, mock
+
+from werkzeug.security import check_password_hash
+
+from app import hashing
+
+
+class HashPasswordsTest(TestCase):
+
+    def test_hashes_keep_their_order(self):
+        passwords = ['user1321', 'user2321', 'user3321']
+        for workers in (1, 2):
+            with mock.patch.object(hashing, 'POOL_THRESHOLD', 0):
+                hashes = hashing.hash_passwords(passwords, workers=workers)
+            self.assertEqual(len(hashes), len(passwords))
+            for password, password_hash in zip(passwords, hashes):
+                self.assertTrue(check_password_hash(password_hash, password))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Running totals on Input.
+
+The period advance carries the cumulative costs and profit and the finished
+and running activities of every team forward onto its next period Input, so
+a team summary at any day is a single row. `check_running_totals` rebuilds
+them from the per period values and the team activities, for
+`flask games check-totals`.
+"""
+import math
+from collections import namedtuple
+
+from app import db
+from app.catalog import get_activity_graph
+from app.engine import MAX_DAY, PERIOD_INCREMENT_IN_DAYS, PROFIT_PER_DAY
+from app.models import Input, TeamActivity
+
+RUNNING_TOTALS = ('cumulative_interest_cost', 'cumulative_penalty_cost', 'cumulative_rent_cost',
+                  'cumulative_profit', 'finished_activity_count', 'finished_mask', 'in_progress_mask')
+
+Mismatch = namedtuple('Mismatch', ['input_id', 'team_id', 'day', 'column', 'stored', 'expected'])
+
+
+def _started_activities(game_id, graph):
+    """ (started_on_day, finished_on_day, bit) of every started activity, per team. """
+    started = {}
+    for team_id, activity_id, started_on_day, finished_on_day in db.session.query(
+            TeamActivity.team_id, TeamActivity.activity_id, TeamActivity.started_on_day,
+            TeamActivity.finished_on_day) \
+            .filter(TeamActivity.game == game_id, TeamActivity.finished_on_day < MAX_DAY):
+        started.setdefault(team_id, []).append((started_on_day, finished_on_day,
+                                                graph.bits.get(activity_id, 0)))
+    return started
+
+
+def _masks_at(activities, day):
+    finished = in_progress = 0
+    for started_on_day, finished_on_day, bit in activities:
+        if finished_on_day <= day:
+            finished |= bit
+        elif started_on_day < day:
+            in_progress |= bit
+    return finished, in_progress
+
+
+def expected_running_totals(game_id):
+    """
+    Yield (input, totals) for every Input of the game, with the running totals
+    it should have, recomputed from scratch.
+    """
+    graph = get_activity_graph()
+    started = _started_activities(game_id, graph)
+    previous = {}
+    for input_ in Input.query.filter_by(game_id=game_id).order_by(Input.team_id, Input.active_at_day):
+        before = previous.get(input_.team_id, dict.fromkeys(RUNNING_TOTALS, 0))
+        activities = started.get(input_.team_id, [])
+        finished, in_progress = _masks_at(activities, input_.active_at_day)
+        # the advance into this period paid a profit when everything was
+        # finished by the day it advanced from
+        completed_all = (input_.active_at_day > 1 and
+                         _masks_at(activities, input_.active_at_day - PERIOD_INCREMENT_IN_DAYS)[0]
+                         == graph.all_mask)
+        totals = {
+            'cumulative_interest_cost': before['cumulative_interest_cost'] + (input_.interest_cost or 0),
+            'cumulative_penalty_cost': before['cumulative_penalty_cost'] + (input_.total_penalty_cost or 0),
+            'cumulative_rent_cost': before['cumulative_rent_cost'] + (input_.rent_cost or 0),
+            'cumulative_profit': before['cumulative_profit']
+            + (PROFIT_PER_DAY * PERIOD_INCREMENT_IN_DAYS if completed_all else 0),
+            'finished_activity_count': bin(finished).count('1'),
+            'finished_mask': finished,
+            'in_progress_mask': in_progress,
+        }
+        previous[input_.team_id] = totals
+        yield input_, totals
+
+
+def _differs(stored, expected):
+    if stored is None:
+        return True
+    if isinstance(expected, float) or isinstance(stored, float):
+        return not math.isclose(stored, expected, abs_tol=1e-6)
+    return stored != expected
+
+
+def check_running_totals(game_id, fix=False):
+    """
+    Compare the stored running totals of the game with rebuilt ones and
+    return a Mismatch per differing value. With `fix` the rebuilt totals
+    are written back.
+    """
+    mismatches = []
+    updates = []
+    for input_, totals in expected_running_totals(game_id):
+        differing = [Mismatch(input_.id, input_.team_id, input_.active_at_day, column,
+                              getattr(input_, column), value)
+                     for column, value in totals.items()
+                     if _differs(getattr(input_, column), value)]
+        if differing:
+            mismatches.extend(differing)
+            updates.append(dict(totals, id=input_.id))
+    if fix and updates:
+        db.session.bulk_update_mappings(Input, updates)
+        db.session.commit()
+    return mismatches
@@ -0,0 +1,55 @@
+"""
+Compare two benchmark result files.
+
+    python -m benchmarks.compare OLD.json NEW.json
+"""
+import argparse
+import json
+
+METRICS = (('median_s', 'median ms', 1000), ('statements', 'statements', 1),
+           ('peak_memory_kb', 'peak KiB', 1))
+
+
+def _change(old, new):
+    if not old:
+        return '' if not new else 'new'
+    return f'{(new - old) / old:+.0%}'
+
+
+def compare(old, new):
+    lines = []
+    names = list(old['results']) + [n for n in new['results'] if n not in old['results']]
+    width = max(len(name) for name in names)
+    header = f'{"benchmark":{width}}'
+    for _, label, _ in METRICS:
+        header += f'  {label + " old":>14} {"new":>10} {"change":>7}'
+    lines.append(header)
+    for name in names:
+        line = f'{name:{width}}'
+        for key, _, scale in METRICS:
+            old_value = old['results'].get(name, {}).get(key)
+            new_value = new['results'].get(name, {}).get(key)
+            line += '  {:>14} {:>10} {:>7}'.format(
+                '-' if old_value is None else f'{old_value * scale:.1f}',
+                '-' if new_value is None else f'{new_value * scale:.1f}',
+                _change(old_value or 0, new_value or 0))
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    args = parser.parse_args(argv)
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if old['meta']['params'] != new['meta']['params']:
+        print('Warning: the runs used different parameters')
+    print(compare(old, new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Time the Input and TeamActivity lookups as the tables grow.
+
+    python -m benchmarks.growth --sizes 10000,100000,1000000
+    python -m benchmarks.growth --sizes 10000,100000,1000000 --drop-indexes
+
+The tables are filled with bulk inserts up to each size in turn, in games
+of --teams teams with --days-per-team inputs each, and the lookups are timed
+at every step. --drop-indexes drops the composite indexes and unique
+constraints of Input and TeamActivity first, for the numbers without them.
+Like benchmarks.run, point --database-url at a throwaway database.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from app import create_app, db
+from app.engine import PERIOD_INCREMENT_IN_DAYS
+from app.models import Activity, Game, Input, Team, TeamActivity
+
+from benchmarks.run import BenchmarkConfig, git_commit
+
+INSERT_BATCH_SIZE = 10000
+ACTIVITIES_PER_TEAM = 20
+
+
+def drop_composite_indexes():
+    """ Recreate Input and TeamActivity without their composite indexes. """
+    for table in (TeamActivity.__table__, Input.__table__):
+        table.drop(db.engine)
+    for table in (Input.__table__, TeamActivity.__table__):
+        constraints = [c for c in table.constraints if c.__class__.__name__ == 'UniqueConstraint']
+        indexes = [i for i in table.indexes if len(i.columns) > 1]
+        for constraint in constraints:
+            table.constraints.discard(constraint)
+        for index in indexes:
+            table.indexes.discard(index)
+        try:
+            table.create(db.engine)
+        finally:
+            table.constraints.update(constraints)
+            table.indexes.update(indexes)
+
+
+class Grower:
+    """ Adds whole games of teams, their inputs and team activities. """
+
+    def __init__(self, teams, days_per_team):
+        self.teams = teams
+        self.days = [1 + PERIOD_INCREMENT_IN_DAYS * i for i in range(days_per_team)]
+        self.activity_ids = [a.id for a in Activity.query.order_by(Activity.id)]
+        self.keys = []
+        self.inputs = 0
+
+    def grow_to(self, size):
+        while self.inputs < size:
+            game_ = Game(current_day=self.days[-1])
+            db.session.add(game_)
+            db.session.commit()
+            game_id = game_.id
+            db.session.bulk_insert_mappings(Team, [dict(display_name=f'Team{i}', game_id=game_id)
+                                                   for i in range(self.teams)])
+            team_ids = [id_ for id_, in db.session.query(Team.id).filter(Team.game_id == game_id)]
+            rows = [dict(team_id=team_id, game_id=game_id, active_at_day=day)
+                    for team_id in team_ids for day in self.days]
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                db.session.execute(Input.__table__.insert(), rows[start:start + INSERT_BATCH_SIZE])
+            db.session.execute(TeamActivity.__table__.insert(), [
+                dict(team_id=team_id, game=game_id, activity_id=activity_id,
+                     initiated_on_day=self.days[i % len(self.days)],
+                     started_on_day=self.days[i % len(self.days)],
+                     finished_on_day=self.days[i % len(self.days)] + PERIOD_INCREMENT_IN_DAYS)
+                for team_id in team_ids for i, activity_id in enumerate(self.activity_ids)])
+            db.session.commit()
+            self.keys.extend((game_id, team_id) for team_id in team_ids)
+            self.inputs += len(rows)
+
+
+def timed(func, lookups):
+    """ Median seconds of `func()` over `lookups` calls. """
+    samples = []
+    for _ in range(lookups):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def measure(grower, lookups, rng):
+    from app.main.routes import _find_period_input, _load_period_inputs
+
+    def find_input():
+        game_id, team_id = rng.choice(grower.keys)
+        _find_period_input(team_id, game_id, rng.choice(grower.days))
+
+    def team_activities():
+        game_id, team_id = rng.choice(grower.keys)
+        TeamActivity.query.filter_by(game=game_id, team_id=team_id).all()
+
+    def period_inputs():
+        game_id, _ = rng.choice(grower.keys)
+        game_ = Game.query.get(game_id)
+        _load_period_inputs(game_, game_.teams.all(), rng.choice(grower.days), create=False)
+
+    results = {}
+    for name, func in (('input_lookup', find_input), ('team_activities', team_activities),
+                       ('period_inputs', period_inputs)):
+        results[name] = timed(func, lookups)
+        db.session.remove()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url',
+                        help='throwaway database, its tables are dropped at the end '
+                             '(default: a temporary SQLite file)')
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help='comma separated Input row counts to time the lookups at')
+    parser.add_argument('--teams', type=int, default=30, help='teams per game')
+    parser.add_argument('--days-per-team', type=int, default=100, help='inputs per team')
+    parser.add_argument('--lookups', type=int, default=1000, help='timed lookups per size')
+    parser.add_argument('--drop-indexes', action='store_true',
+                        help='time without the composite indexes and unique constraints')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/growth-<commit>.json)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    tmp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        tmp_dir = tempfile.TemporaryDirectory()
+        database_url = 'sqlite:///' + os.path.join(tmp_dir.name, 'growth.db')
+    BenchmarkConfig.SQLALCHEMY_DATABASE_URI = database_url
+
+    rng = random.Random(args.seed)
+    app = create_app(BenchmarkConfig)
+    results = {}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        try:
+            if args.drop_indexes:
+                drop_composite_indexes()
+            db.session.bulk_insert_mappings(Activity, [dict(id=f'A{i}', days_needed=10, bit_index=i)
+                                                       for i in range(ACTIVITIES_PER_TEAM)])
+            db.session.commit()
+            grower = Grower(args.teams, args.days_per_team)
+            for size in sizes:
+                grower.grow_to(size)
+                if db.engine.dialect.name == 'postgresql':
+                    db.session.execute(text('ANALYZE'))
+                    db.session.commit()
+                results[str(grower.inputs)] = measure(grower, args.lookups, rng)
+                print(f'{grower.inputs} inputs: ' + ', '.join(
+                    f'{name} {seconds * 1e6:.1f} us' for name, seconds in results[str(grower.inputs)].items()),
+                    file=sys.stderr)
+        finally:
+            db.session.remove()
+            db.drop_all()
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+    commit = git_commit()
+    report = {
+        'meta': {'commit': commit,
+                 'created': datetime.utcnow().isoformat(timespec='seconds'),
+                 'dialect': make_url(database_url).get_backend_name(),
+                 'params': {k: v for k, v in vars(args).items() if k not in ('database_url', 'output')}},
+        'results': results,
+    }
+    output = args.output or os.path.join(os.path.dirname(__file__), 'results',
+                                         f'growth-{(commit or "worktree")[:10]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    names = list(next(iter(results.values())))
+    print(f'{"inputs":>10}' + ''.join(f'  {name + " us":>18}' for name in names))
+    for size, result in results.items():
+        print(f'{size:>10}' + ''.join(f'  {result[name] * 1e6:18.1f}' for name in names))
+    print(f'Results written to {output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+"""
+Classroom load test: bot players on /play and an admin bot advancing periods.
+
+Every bot logs in through auth.login at once, like a class at the start of a
+session. Viewers keep refreshing /play, managers submit GameUserForm moves
+(add or remove an activity, apply for credit) and the admin advances the game
+every --advance-every seconds. The advance runs as a background job, so the
+admin bot polls /api/tasks/<id> until it is complete; the job duration is
+reported as "advance job", next to the latency of the POST that queued it.
+Then everybody refreshes /play within REFRESH_SPREAD_SECONDS.
+
+In process, on a synthetic game in a temporary SQLite file:
+
+    python -m benchmarks.loadtest --teams 30 --viewers-per-team 3 --duration 60
+
+Against a running server, seeding the game into its database first:
+
+    gunicorn -w 4 -b 127.0.0.1:8000 game:app
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --database-url postgresql://...
+
+The in process run shares one interpreter between the app and the bots, so it
+only shows relative costs; size gunicorn workers with --url.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from app import create_app, db
+from app.config import Config
+
+from benchmarks import synthetic
+
+REQUEST_TIMEOUT = 30
+REFRESH_SPREAD_SECONDS = 2
+TASK_POLL_SECONDS = 0.2
+CREDIT_STEP = 300
+
+
+class LoadTestConfig(Config):
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+
+class ClientTransport:
+    """ Requests through the Flask test client, one client (cookie jar) per bot. """
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        resp = self.client.open(path, method=method, data=data)
+        return resp.status_code, resp.get_data(as_text=True), resp.headers.get('Location', '')
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """ Requests against a running server, redirects are not followed. """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()),
+                                                  _NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=REQUEST_TIMEOUT) as resp:
+                return resp.status, resp.read().decode(), resp.headers.get('Location', '')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode(errors='replace'), e.headers.get('Location', '')
+
+
+def csrf_token(page):
+    match = re.search(r'name="csrf_token"[^>]*value="([^"]*)"', page)
+    return match.group(1) if match else ''
+
+
+def hidden_value(page, name):
+    match = re.search(rf'name="{name}"[^>]*value="([^"]*)"', page)
+    return match.group(1) if match else ''
+
+
+def task_urls(page):
+    """ Status urls of the unfinished tasks listed on a game page. """
+    return re.findall(r'class="[^"]*game-task[^"]*" data-url="([^"]*)"', page)
+
+
+def select_options(page, name):
+    match = re.search(rf'<select[^>]*name="{name}"[^>]*>(.*?)</select>', page, re.S)
+    if not match:
+        return []
+    return [value for value in re.findall(r'<option[^>]*value="([^"]*)"', match.group(1))
+            if value != 'none_of_the_above']
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, route, seconds, status):
+        with self._lock:
+            self.samples.setdefault(route, []).append((seconds, status))
+
+    def summary(self, elapsed):
+        result = {}
+        for route, samples in sorted(self.samples.items()):
+            latencies = sorted(seconds for seconds, _ in samples)
+            errors = sum(1 for _, status in samples if not status or status >= 400)
+            result[route] = {'requests': len(samples),
+                             'per_second': round(len(samples) / elapsed, 2),
+                             'errors': errors,
+                             'error_rate': round(errors / len(samples), 4),
+                             'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+                             'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+                             'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+                             'max_ms': round(latencies[-1] * 1000, 1)}
+        return result
+
+
+class Session:
+    """ Shared clock of a run: the stop flag and the period the admin bot is at. """
+
+    def __init__(self, stats, duration, think_time, ramp_up):
+        self.stats = stats
+        self.think_time = think_time
+        self.ramp_up = ramp_up
+        self.deadline = time.monotonic() + duration
+        self.period = 0
+        self._changed = threading.Condition()
+
+    def running(self):
+        return time.monotonic() < self.deadline
+
+    def advanced(self):
+        with self._changed:
+            self.period += 1
+            self._changed.notify_all()
+
+    def wait(self, seconds, seen_period):
+        """ Sleep up to `seconds`, waking early when the period moves on. """
+        timeout = max(0, min(seconds, self.deadline - time.monotonic()))
+        with self._changed:
+            self._changed.wait_for(lambda: self.period != seen_period, timeout)
+            return self.period
+
+
+class Bot(threading.Thread):
+
+    def __init__(self, session, transport, username, seed):
+        super().__init__(daemon=True)
+        self.session = session
+        self.transport = transport
+        self.username = username
+        self.rng = random.Random(seed)
+
+    def call(self, route, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            status, page, location = self.transport.request(method, path, data)
+        except Exception:
+            status, page, location = 0, '', ''
+        self.session.stats.record(route, time.perf_counter() - started, status)
+        return status, page, location
+
+    def login(self):
+        _, page, _ = self.call('GET /auth/login', 'GET', '/auth/login')
+        status, _, location = self.call('POST /auth/login', 'POST', '/auth/login',
+                                        {'username': self.username, 'password': synthetic.PASSWORD,
+                                         'csrf_token': csrf_token(page)})
+        # a failed login redirects back to the login page
+        return status == 302 and '/auth/login' not in location
+
+    def run(self):
+        time.sleep(self.rng.uniform(0, self.session.ramp_up))
+        if not self.login():
+            return
+        period = self.session.period
+        while self.session.running():
+            self.step()
+            new_period = self.session.wait(self.rng.expovariate(1 / self.session.think_time), period)
+            if new_period != period:
+                period = new_period
+                time.sleep(self.rng.uniform(0, REFRESH_SPREAD_SECONDS))
+
+    def step(self):
+        raise NotImplementedError
+
+
+class Viewer(Bot):
+
+    def step(self):
+        self.call('GET /play', 'GET', '/play')
+
+
+class Manager(Bot):
+
+    def step(self):
+        status, page, _ = self.call('GET /play', 'GET', '/play')
+        if status != 200:
+            return
+        move = {'add_activity': 'none_of_the_above', 'remove_activity': 'none_of_the_above',
+                'apply_for_credit': '', 'csrf_token': csrf_token(page)}
+        to_add = select_options(page, 'add_activity')
+        to_remove = select_options(page, 'remove_activity')
+        choice = self.rng.random()
+        if to_remove and choice < 0.2:
+            move['remove_activity'] = self.rng.choice(to_remove)
+        elif to_add and choice < 0.8:
+            move['add_activity'] = self.rng.choice(to_add)
+        else:
+            move['apply_for_credit'] = CREDIT_STEP * self.rng.randint(1, 5)
+        self.call('POST /play', 'POST', '/play', move)
+
+
+class Admin(Bot):
+
+    def __init__(self, session, transport, username, seed, game_id, advance_every):
+        super().__init__(session, transport, username, seed)
+        self.game_id = game_id
+        self.advance_every = advance_every
+
+    def run(self):
+        if not self.login():
+            return
+        while self.session.running():
+            # only this bot moves the period on, so nothing wakes it early
+            self.session.wait(self.advance_every, self.session.period)
+            if self.session.running():
+                self.step()
+
+    def step(self):
+        path = f'/games/{self.game_id}'
+        status, page, _ = self.call('GET /games/<id>', 'GET', path)
+        if status != 200:
+            return
+        started = time.perf_counter()
+        status, page, _ = self.call('POST /games/<id>', 'POST', path,
+                                    {'increase_period': 'increase',
+                                     'current_day': hidden_value(page, 'current_day'),
+                                     'csrf_token': csrf_token(page)})
+        if status != 200:
+            return
+        # the inline backend is done already and lists no task
+        status = self.wait_for_tasks(task_urls(page))
+        if status is None:
+            return
+        self.session.stats.record('advance job', time.perf_counter() - started, status)
+        if status == 200:
+            self.session.advanced()
+
+    def wait_for_tasks(self, urls):
+        """
+        Poll the tasks until they are complete. 200 when they all finished,
+        an error status when one failed, None when the run ended first.
+        """
+        for url in urls:
+            while True:
+                status, body, _ = self.call('GET /api/tasks/<id>', 'GET', url)
+                if status != 200:
+                    return status or 500
+                task = json.loads(body)
+                if task['complete']:
+                    if task['status'] != 'finished':
+                        return 500
+                    break
+                if not self.session.running():
+                    return None
+                time.sleep(TASK_POLL_SECONDS)
+        return 200
+
+
+def seed_game(app, args, drop_tables):
+    with app.app_context():
+        if drop_tables:
+            db.drop_all()
+        db.create_all()
+        game = synthetic.build_game(args.teams, args.periods, users_per_team=1 + args.viewers_per_team,
+                                    seed=args.seed)
+        db.session.remove()
+    return game
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='base url of a running server (default: in process)')
+    parser.add_argument('--database-url',
+                        help='database to seed the game into, the one of the server with --url')
+    parser.add_argument('--teams', type=int, default=30)
+    parser.add_argument('--viewers-per-team', type=int, default=3)
+    parser.add_argument('--periods', type=int, default=1, help='periods played before the run')
+    parser.add_argument('--duration', type=float, default=60, help='seconds')
+    parser.add_argument('--think-time', type=float, default=5,
+                        help='mean seconds between two requests of a player')
+    parser.add_argument('--advance-every', type=float, default=20, help='seconds')
+    parser.add_argument('--ramp-up', type=float, default=0,
+                        help='spread the logins over this many seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+    if args.url and not args.database_url:
+        parser.error('--url needs --database-url to seed the bots and their game')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tmp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        tmp_dir = tempfile.TemporaryDirectory()
+        database_url = 'sqlite:///' + os.path.join(tmp_dir.name, 'loadtest.db')
+    LoadTestConfig.SQLALCHEMY_DATABASE_URI = database_url
+    if database_url.startswith('sqlite'):
+        # bots run in threads, let SQLite writers wait for the lock instead of failing
+        LoadTestConfig.SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': REQUEST_TIMEOUT}}
+
+    app = create_app(LoadTestConfig)
+    # tables of a live server database are left alone
+    game = seed_game(app, args, drop_tables=not args.url)
+
+    def transport():
+        return HttpTransport(args.url) if args.url else ClientTransport(app)
+
+    stats = Stats()
+    session = Session(stats, args.duration, args.think_time, args.ramp_up)
+    rng = random.Random(args.seed)
+    bots = [Admin(session, transport(), game.admin, rng.random(), game.game_id, args.advance_every)]
+    bots += [Manager(session, transport(), username, rng.random()) for username in game.managers]
+    bots += [Viewer(session, transport(), username, rng.random()) for username in game.viewers]
+    started = time.monotonic()
+    for bot in bots:
+        bot.start()
+    for bot in bots:
+        bot.join()
+    elapsed = time.monotonic() - started
+
+    if not args.url:
+        with app.app_context():
+            db.drop_all()
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+    summary = stats.summary(elapsed)
+    width = max([len(route) for route in summary] + [5])
+    print(f'{len(bots)} bots, {session.period} periods advanced in {elapsed:.0f}s')
+    print(f'{"route":{width}}  {"requests":>8}  {"errors":>7}  {"p50 ms":>8}  {"p95 ms":>8}  '
+          f'{"p99 ms":>8}  {"max ms":>8}')
+    for route, row in summary.items():
+        print(f'{route:{width}}  {row["requests"]:8d}  {row["error_rate"]:7.1%}  {row["p50_ms"]:8.1f}  '
+              f'{row["p95_ms"]:8.1f}  {row["p99_ms"]:8.1f}  {row["max_ms"]:8.1f}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'params': {k: v for k, v in vars(args).items() if k != 'database_url'},
+                       'bots': len(bots), 'periods_advanced': session.period,
+                       'elapsed_s': round(elapsed, 1), 'routes': summary}, f, indent=2)
+        print(f'Results written to {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+Time the period engine and the hot routes on a synthetic game.
+
+Each benchmark is run --repeat times for wall time and SQL statement count,
+then once more under tracemalloc for the peak Python memory, which would
+skew the timings if it was on all the time. Results go to a JSON file that
+benchmarks.compare can diff across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from app import create_app, db
+from app.config import Config
+from app.models import Game
+
+from benchmarks import synthetic
+
+
+class BenchmarkConfig(Config):
+    WTF_CSRF_ENABLED = False
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+class Runner:
+    def __init__(self, counter, repeat):
+        self.counter = counter
+        self.repeat = repeat
+        self.samples = {}
+        self.statements = {}
+        self.peak_memory = {}
+
+    def measure(self, name, func, trace_memory=False):
+        self.counter.count = 0
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            func()
+        finally:
+            elapsed = time.perf_counter() - started
+            if trace_memory:
+                self.peak_memory[name] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        if not trace_memory:
+            self.samples.setdefault(name, []).append(elapsed)
+            self.statements[name] = self.counter.count
+
+    def run(self, name, func, setup=None, teardown=None):
+        for i in range(self.repeat + 1):
+            if setup:
+                setup()
+            self.measure(name, func, trace_memory=i == self.repeat)
+            if teardown:
+                teardown()
+
+    def results(self):
+        return {name: {'runs': len(samples),
+                       'median_s': statistics.median(samples),
+                       'min_s': min(samples),
+                       'max_s': max(samples),
+                       'statements': self.statements[name],
+                       'peak_memory_kb': round(self.peak_memory.get(name, 0) / 1024, 1)}
+                for name, samples in self.samples.items()}
+
+
+def login(client, username):
+    resp = client.post('/auth/login', data={'username': username, 'password': synthetic.PASSWORD})
+    if resp.status_code != 302:
+        raise RuntimeError(f'Could not log in as {username}')
+
+
+def get(client, url):
+    def request():
+        resp = client.get(url)
+        resp.get_data()
+        if resp.status_code >= 400:
+            raise RuntimeError(f'GET {url} returned {resp.status_code}')
+    return request
+
+
+def post(client, url, data):
+    def request():
+        resp = client.post(url, data=data)
+        if resp.status_code >= 400:
+            raise RuntimeError(f'POST {url} returned {resp.status_code}')
+    return request
+
+
+def run_benchmarks(app, game, repeat, seed):
+    from app.main import routes
+
+    runner = Runner(StatementCounter(db.engine), repeat)
+    rng = random.Random(seed)
+
+    def current_game():
+        return Game.query.get(game.game_id)
+
+    # the engine path alone, thrown away after every run
+    runner.run('calculate_next_period', lambda: routes._calculate_next_period(current_game()),
+               teardown=db.session.rollback)
+    runner.run('calculate_10_periods', lambda: routes._calculate_periods(current_game(), 10),
+               teardown=db.session.rollback)
+
+    # advance and roll back in turns, so the game ends where it started
+    for i in range(repeat + 1):
+        trace = i == repeat
+        runner.measure('advance_game_period', lambda: routes.advance_game_period(current_game()),
+                       trace_memory=trace)
+        runner.measure('rollback_game_period', lambda: routes.rollback_game_period(current_game()),
+                       trace_memory=trace)
+    db.session.remove()
+
+    def lookup_inputs():
+        day = current_game().current_day
+        for team_id in rng.sample(game.team_ids, min(len(game.team_ids), 100)):
+            routes._find_period_input(team_id, game.game_id, day)
+    runner.run('input_lookup_x100', lookup_inputs)
+    db.session.remove()
+
+    manager = app.test_client()
+    login(manager, game.managers[0])
+    play_form = {'add_activity': 'none_of_the_above', 'remove_activity': 'none_of_the_above',
+                 'apply_for_credit': 300}
+    runner.run('play_get', get(manager, '/play'))
+    runner.run('play', post(manager, '/play', play_form))
+
+    admin = app.test_client()
+    login(admin, game.admin)
+    runner.run('game_status', get(admin, f'/game_status/{game.game_id}'))
+    runner.run('report', get(admin, f'/reports/{game.game_id}'))
+    runner.run('admin_download_results', get(admin, f'/admin/download_results/{game.game_id}'))
+
+    return runner.results()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url',
+                        help='throwaway database, its tables are dropped at the end '
+                             '(default: a temporary SQLite file)')
+    parser.add_argument('--teams', type=int, default=30)
+    parser.add_argument('--periods', type=int, default=20)
+    parser.add_argument('--activities', default='warehouse',
+                        help="'warehouse' for the class activities or a number (up to 63) of random ones")
+    parser.add_argument('--dependency-ratio', type=float, default=0.2,
+                        help='chance of a random activity depending on an earlier one')
+    parser.add_argument('--queue-rate', type=float, default=0.5,
+                        help='chance of a team queueing an activity each period')
+    parser.add_argument('--credit-rate', type=float, default=0.2,
+                        help='chance of a team applying for credit each period')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/<commit>.json)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tmp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        tmp_dir = tempfile.TemporaryDirectory()
+        database_url = 'sqlite:///' + os.path.join(tmp_dir.name, 'bench.db')
+    BenchmarkConfig.SQLALCHEMY_DATABASE_URI = database_url
+
+    activities = None
+    if args.activities != 'warehouse':
+        activities = synthetic.random_activities(int(args.activities), random.Random(args.seed),
+                                                 args.dependency_ratio)
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        try:
+            started = time.perf_counter()
+            game = synthetic.build_game(args.teams, args.periods, activities,
+                                        queue_rate=args.queue_rate, credit_rate=args.credit_rate,
+                                        seed=args.seed)
+            setup_s = time.perf_counter() - started
+            db.session.remove()
+            results = run_benchmarks(app, game, args.repeat, args.seed)
+        finally:
+            db.session.remove()
+            db.drop_all()
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+    commit = git_commit()
+    report = {
+        'meta': {'commit': commit,
+                 'created': datetime.utcnow().isoformat(timespec='seconds'),
+                 'dialect': make_url(database_url).get_backend_name(),
+                 'python': platform.python_version(),
+                 'setup_s': round(setup_s, 3),
+                 'params': {k: v for k, v in vars(args).items() if k not in ('database_url', 'output')}},
+        'results': results,
+    }
+    output = args.output or os.path.join(os.path.dirname(__file__), 'results',
+                                         f'{(commit or "worktree")[:10]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    width = max(len(name) for name in results)
+    print(f'{"benchmark":{width}}  {"median ms":>10}  {"statements":>10}  {"peak KiB":>10}')
+    for name, result in results.items():
+        print(f'{name:{width}}  {result["median_s"] * 1000:10.2f}  {result["statements"]:10d}  '
+              f'{result["peak_memory_kb"]:10.1f}')
+    print(f'Results written to {output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
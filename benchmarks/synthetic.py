@@ -0,0 +1,119 @@
+"""
+Synthetic games for the benchmarks and load tests.
+
+A game is played forward through the real advance_game_period, see
+populate_db.play_history, so inputs, penalties and team activities look
+like the ones a class leaves behind.
+Every generated user shares PASSWORD.
+"""
+import random
+import string
+from collections import namedtuple
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.catalog import allocate_bit_indexes, bump_catalog_version
+from app.engine import STARTING_FUNDS
+from app.models import Activity, ActivityRequirement, Game, Input, Team, User
+from populate_db import ActivityAdder, play_history
+
+PASSWORD = 'bench321'
+ADMIN_USERNAME = 'bench_admin'
+ACTIVITY_DAYS = (10, 20, 30, 40)
+ACTIVITY_COSTS = (300, 600, 900, 1200, 1800, 3000)
+
+# (id, title, days_needed, cost, set of requirement ids)
+ActivityRow = namedtuple('ActivityRow', ['id', 'title', 'days_needed', 'cost', 'requirements'])
+
+SyntheticGame = namedtuple('SyntheticGame', ['game_id', 'team_ids', 'admin', 'managers',
+                                             'viewers'])
+
+
+def warehouse_activities():
+    """ The activities populate_db sets up for a real class. """
+    requirements = {}
+    for dependency in ActivityAdder.dependencies:
+        for activity_id, requirement_id in dependency.items():
+            requirements.setdefault(activity_id, set()).add(requirement_id)
+    return [ActivityRow(a['id'], a['title'], a['days_needed'], a['cost'],
+                        requirements.get(a['id'], set()))
+            for a in ActivityAdder.activities]
+
+
+def random_activities(count, rng, dependency_ratio=0.2):
+    """
+    `count` activities, each depending on an earlier one with the
+    probability `dependency_ratio`, which keeps the graph acyclic.
+    """
+    letters = string.ascii_uppercase
+    ids = [letters[i % 26] + (str(i // 26) if i >= 26 else '') for i in range(count)]
+    return [ActivityRow(id_, f'Activity {id_}', rng.choice(ACTIVITY_DAYS), rng.choice(ACTIVITY_COSTS),
+                        {req for req in ids[:i] if rng.random() < dependency_ratio})
+            for i, id_ in enumerate(ids)]
+
+
+def create_activities(activities):
+    # bulk inserts skip the mapper events that give out the mask bits and keep the catalog fresh
+    bit_indexes = allocate_bit_indexes(db.session.connection(), len(activities))
+    db.session.bulk_insert_mappings(Activity, [
+        dict(id=a.id, title=a.title, days_needed=a.days_needed, cost=a.cost, bit_index=bit_index)
+        for a, bit_index in zip(activities, bit_indexes)])
+    db.session.bulk_insert_mappings(ActivityRequirement, [
+        dict(activity_id=a.id, requirement_id=req) for a in activities for req in sorted(a.requirements)])
+    bump_catalog_version(db.session.connection())
+    db.session.commit()
+
+
+def create_users(team_ids, users_per_team):
+    """
+    An admin, unless there is one from an earlier run, plus `users_per_team`
+    users per team, the first of them the manager. The password is hashed
+    once and shared, hashing per user would dominate the setup time.
+    """
+    password_hash = generate_password_hash(PASSWORD)
+    rows = []
+    if not User.query.filter_by(username=ADMIN_USERNAME).first():
+        rows.append(dict(username=ADMIN_USERNAME, display_name=ADMIN_USERNAME, is_admin=True,
+                         password_hash=password_hash))
+    managers, viewers = [], []
+    for team_id in team_ids:
+        for i in range(users_per_team):
+            username = f'bench_team{team_id}_user{i}'
+            (viewers if i else managers).append(username)
+            rows.append(dict(username=username, display_name=username, is_manager=not i,
+                             team_id=team_id, password_hash=password_hash))
+    db.session.bulk_insert_mappings(User, rows)
+    db.session.commit()
+    return managers, viewers
+
+
+def build_game(teams=30, periods=20, activities=None, users_per_team=1, queue_rate=0.5,
+               credit_rate=0.2, seed=0):
+    """
+    Create a game with `teams` teams and play it `periods` periods forward
+    with populate_db.play_history. `activities` defaults to
+    warehouse_activities() and is only created when the activity table is
+    empty.
+    """
+    rng = random.Random(seed)
+    if not Activity.query.first():
+        create_activities(activities or warehouse_activities())
+
+    game_ = Game()
+    db.session.add(game_)
+    db.session.commit()
+    game_id = game_.id
+    db.session.bulk_insert_mappings(Team, [dict(display_name=f'Team{i}', game_id=game_id)
+                                           for i in range(1, teams + 1)])
+    db.session.commit()
+    team_ids = [t.id for t in Team.query.filter_by(game_id=game_id).order_by(Team.id)]
+    db.session.bulk_insert_mappings(Input, [dict(team_id=team_id, game_id=game_id, active_at_day=1,
+                                                 credit_taken=STARTING_FUNDS,
+                                                 money_at_start_of_period=STARTING_FUNDS)
+                                            for team_id in team_ids])
+    db.session.commit()
+    managers, viewers = create_users(team_ids, users_per_team)
+
+    play_history(game_id, team_ids, periods, rng, queue_rate, credit_rate)
+    return SyntheticGame(game_id, team_ids, ADMIN_USERNAME, managers, viewers)
@@ -1,7 +1,8 @@
-from app import db, create_app
+from app import db, create_app, cli
 from app import models
 
 app = create_app()
+cli.register(app)
 
 app_dict = {k: v for k, v in models.__dict__.items() if isinstance(v, type)}
 app_dict.update({'db': db})
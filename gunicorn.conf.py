@@ -0,0 +1,12 @@
+# gunicorn picks this file up from the working directory.
+#
+# The game pages keep a server-sent events stream open (app/events.py), so
+# the workers are gevent ones: an idle stream costs a greenlet, not a worker.
+worker_class = 'gevent'
+worker_connections = 2000
+
+
+def post_fork(server, worker):
+    # psycopg2 waits on its socket in C, make it yield to the other greenlets
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
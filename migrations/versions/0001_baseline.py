@@ -0,0 +1,183 @@
+"""baseline: the tables as the app first created them
+
+An existing database that predates these revisions already has them, it is
+marked as being at this revision with `flask db stamp 0001` instead.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 01:54:19.540840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('activity',
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('title', sa.Text(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('days_needed', sa.Integer(), nullable=True),
+    sa.Column('cost', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_activity_id'), 'activity', ['id'], unique=False)
+    op.create_table('game',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('current_day', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_game_id'), 'game', ['id'], unique=False)
+    op.create_table('activity_requirement',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('activity_id', sa.String(length=64), nullable=True),
+    sa.Column('requirement_id', sa.String(length=64), nullable=True),
+    sa.ForeignKeyConstraint(['activity_id'], ['activity.id'], ondelete='cascade'),
+    sa.ForeignKeyConstraint(['requirement_id'], ['activity.id'], ondelete='cascade'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_activity_requirement_id'), 'activity_requirement', ['id'], unique=False)
+    op.create_table('settings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('game_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('game_id')
+    )
+    op.create_index(op.f('ix_settings_id'), 'settings', ['id'], unique=False)
+    op.create_table('team',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('display_name', sa.String(length=64), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('game_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_team_id'), 'team', ['id'], unique=False)
+    op.create_table('input',
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('team_id', sa.Integer(), nullable=True),
+    sa.Column('game_id', sa.Integer(), nullable=True),
+    sa.Column('credit_taken', sa.Integer(), nullable=True),
+    sa.Column('credit_to_take', sa.Integer(), nullable=True),
+    sa.Column('interest_cost', sa.Float(), nullable=True),
+    sa.Column('total_penalty_cost', sa.Float(), nullable=True),
+    sa.Column('rent_cost', sa.Integer(), nullable=True),
+    sa.Column('active_at_day', sa.Integer(), nullable=True),
+    sa.Column('money_at_start_of_period', sa.Float(), nullable=True),
+    sa.Column('money_at_end_of_period', sa.Float(), nullable=True),
+    sa.Column('approved_by_admin', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_input_id'), 'input', ['id'], unique=False)
+    op.create_table('input_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('team_id', sa.Integer(), nullable=True),
+    sa.Column('game_id', sa.Integer(), nullable=True),
+    sa.Column('current_day', sa.Integer(), nullable=True),
+    sa.Column('activity_to_add', sa.String(length=64), nullable=True),
+    sa.Column('activity_to_remove', sa.String(length=64), nullable=True),
+    sa.Column('credit_to_take', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['activity_to_add'], ['activity.id'], ondelete='cascade'),
+    sa.ForeignKeyConstraint(['activity_to_remove'], ['activity.id'], ondelete='cascade'),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_input_history_id'), 'input_history', ['id'], unique=False)
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('is_admin', sa.Boolean(), nullable=True),
+    sa.Column('is_superadmin', sa.Boolean(), nullable=True),
+    sa.Column('is_manager', sa.Boolean(), nullable=True),
+    sa.Column('username', sa.String(length=64), nullable=True),
+    sa.Column('display_name', sa.String(length=120), nullable=True),
+    sa.Column('email', sa.String(length=120), nullable=True),
+    sa.Column('faculty_number', sa.String(length=120), nullable=True),
+    sa.Column('password_hash', sa.String(length=120), nullable=True),
+    sa.Column('team_id', sa.Integer(), nullable=True),
+    sa.Column('token', sa.String(length=32), nullable=True),
+    sa.Column('token_expiration', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    op.create_index(op.f('ix_user_faculty_number'), 'user', ['faculty_number'], unique=False)
+    op.create_index(op.f('ix_user_id'), 'user', ['id'], unique=False)
+    op.create_index(op.f('ix_user_token'), 'user', ['token'], unique=True)
+    op.create_index(op.f('ix_user_username'), 'user', ['username'], unique=True)
+    op.create_table('penalty',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('input_id', sa.String(), nullable=True),
+    sa.Column('activity_id', sa.String(length=64), nullable=True),
+    sa.Column('fine', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['activity_id'], ['activity.id'], ondelete='cascade'),
+    sa.ForeignKeyConstraint(['input_id'], ['input.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_penalty_id'), 'penalty', ['id'], unique=False)
+    op.create_table('team_activity',
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('team_id', sa.Integer(), nullable=True),
+    sa.Column('game', sa.Integer(), nullable=True),
+    sa.Column('activity_id', sa.String(length=64), nullable=True),
+    sa.Column('cost', sa.Integer(), nullable=True),
+    sa.Column('input_id', sa.String(length=64), nullable=True),
+    sa.Column('started_on_day', sa.Integer(), nullable=True),
+    sa.Column('finished_on_day', sa.Integer(), nullable=True),
+    sa.Column('initiated_on_day', sa.Integer(), nullable=True),
+    sa.Column('first_time_ever_initiated_on_day', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['activity_id'], ['activity.id'], ondelete='cascade'),
+    sa.ForeignKeyConstraint(['game'], ['game.id'], ),
+    sa.ForeignKeyConstraint(['input_id'], ['input.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['team_id'], ['team.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_team_activity_id'), 'team_activity', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_team_activity_id'), table_name='team_activity')
+    op.drop_table('team_activity')
+    op.drop_index(op.f('ix_penalty_id'), table_name='penalty')
+    op.drop_table('penalty')
+    op.drop_index(op.f('ix_user_username'), table_name='user')
+    op.drop_index(op.f('ix_user_token'), table_name='user')
+    op.drop_index(op.f('ix_user_id'), table_name='user')
+    op.drop_index(op.f('ix_user_faculty_number'), table_name='user')
+    op.drop_table('user')
+    op.drop_index(op.f('ix_input_history_id'), table_name='input_history')
+    op.drop_table('input_history')
+    op.drop_index(op.f('ix_input_id'), table_name='input')
+    op.drop_table('input')
+    op.drop_index(op.f('ix_team_id'), table_name='team')
+    op.drop_table('team')
+    op.drop_index(op.f('ix_settings_id'), table_name='settings')
+    op.drop_table('settings')
+    op.drop_index(op.f('ix_activity_requirement_id'), table_name='activity_requirement')
+    op.drop_table('activity_requirement')
+    op.drop_index(op.f('ix_game_id'), table_name='game')
+    op.drop_table('game')
+    op.drop_index(op.f('ix_activity_id'), table_name='activity')
+    op.drop_table('activity')
@@ -0,0 +1,37 @@
+"""period advances: one row per advanced day of a game
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 02:02:11.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('period_advance',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('game_id', sa.Integer(), nullable=True),
+    sa.Column('from_day', sa.Integer(), nullable=True),
+    sa.Column('to_day', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('game_id', 'from_day')
+    )
+    op.create_index(op.f('ix_period_advance_game_id'), 'period_advance', ['game_id'], unique=False)
+    op.create_index(op.f('ix_period_advance_id'), 'period_advance', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_period_advance_id'), table_name='period_advance')
+    op.drop_index(op.f('ix_period_advance_game_id'), table_name='period_advance')
+    op.drop_table('period_advance')
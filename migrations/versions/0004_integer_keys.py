@@ -0,0 +1,117 @@
+"""integer keys for input and team_activity, composite indexes
+
+The 'game_team_day' and 'game_team_activity' string ids cannot be cast to
+integers, so both tables get a new integer id numbered in creation order,
+penalty.input_id and team_activity.input_id are pointed at it and the
+string columns are dropped. The foreign keys to input.id are dropped
+before and created again after, and ids carry on from a sequence.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 02:04:37.260519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# the names PostgreSQL gave the foreign keys of the baseline tables
+INPUT_FOREIGN_KEYS = (('penalty', 'penalty_input_id_fkey', None),
+                      ('team_activity', 'team_activity_input_id_fkey', 'CASCADE'))
+UNIQUE_CONSTRAINTS = {
+    'input': ('input_team_id_active_at_day_game_id_key', ['team_id', 'active_at_day', 'game_id']),
+    'team_activity': ('team_activity_game_team_id_activity_id_key', ['game', 'team_id', 'activity_id']),
+}
+
+
+def _number_rows(table):
+    op.add_column(table, sa.Column('new_id', sa.Integer(), nullable=True))
+    op.execute(f'UPDATE {table} SET new_id = numbered.n '
+               f'FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY date_created, id) AS n FROM {table}) AS numbered '
+               f'WHERE {table}.id = numbered.id')
+
+
+def _point_at_new_input_ids(table):
+    op.add_column(table, sa.Column('new_input_id', sa.Integer(), nullable=True))
+    op.execute(f'UPDATE {table} SET new_input_id = input.new_id '
+               f'FROM input WHERE {table}.input_id = input.id')
+
+
+def _swap_id_postgresql(table):
+    op.drop_index(f'ix_{table}_id', table_name=table)
+    # takes the primary key with it
+    op.drop_column(table, 'id')
+    op.alter_column(table, 'new_id', new_column_name='id', nullable=False)
+    op.execute(f'CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.execute(f"SELECT setval('{table}_id_seq', COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+    op.alter_column(table, 'id', server_default=sa.text(f"nextval('{table}_id_seq'::regclass)"))
+    op.create_primary_key(f'{table}_pkey', table, ['id'])
+    op.create_index(f'ix_{table}_id', table, ['id'], unique=False)
+    name, columns = UNIQUE_CONSTRAINTS[table]
+    op.create_unique_constraint(name, table, columns)
+
+
+def _swap_input_id_postgresql(table):
+    op.drop_column(table, 'input_id')
+    op.alter_column(table, 'new_input_id', new_column_name='input_id')
+
+
+def _upgrade_postgresql():
+    for table, name, _ in INPUT_FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+    for table in ('input', 'team_activity'):
+        _swap_id_postgresql(table)
+    for table, _, _ in INPUT_FOREIGN_KEYS:
+        _swap_input_id_postgresql(table)
+    for table, name, ondelete in INPUT_FOREIGN_KEYS:
+        op.create_foreign_key(name, table, 'input', ['input_id'], ['id'], ondelete=ondelete)
+
+
+def _upgrade_sqlite():
+    # SQLite cannot alter keys in place, batch mode copies the tables over.
+    # Batch mode looks up constraint and index columns before it renames
+    # any, so the renamed columns get theirs in a later copy.
+    for table in ('input', 'team_activity'):
+        op.drop_index(f'ix_{table}_id', table_name=table)
+        with op.batch_alter_table(table, recreate='always') as batch_op:
+            batch_op.drop_column('id')
+            batch_op.alter_column('new_id', new_column_name='id', nullable=False)
+        with op.batch_alter_table(table, recreate='always') as batch_op:
+            batch_op.create_primary_key(f'pk_{table}', ['id'])
+            batch_op.create_unique_constraint(*UNIQUE_CONSTRAINTS[table])
+        op.create_index(f'ix_{table}_id', table, ['id'], unique=False)
+    for table, name, ondelete in INPUT_FOREIGN_KEYS:
+        with op.batch_alter_table(table, recreate='always') as batch_op:
+            batch_op.drop_column('input_id')
+            batch_op.alter_column('new_input_id', new_column_name='input_id')
+        with op.batch_alter_table(table, recreate='always') as batch_op:
+            batch_op.create_foreign_key(name, 'input', ['input_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _number_rows('input')
+    _number_rows('team_activity')
+    for table, _, _ in INPUT_FOREIGN_KEYS:
+        _point_at_new_input_ids(table)
+
+    if op.get_context().dialect.name == 'sqlite':
+        _upgrade_sqlite()
+    else:
+        _upgrade_postgresql()
+
+    op.create_index(op.f('ix_penalty_input_id'), 'penalty', ['input_id'], unique=False)
+    op.create_index(op.f('ix_team_activity_input_id'), 'team_activity', ['input_id'], unique=False)
+    op.create_index('ix_input_game_id_active_at_day', 'input', ['game_id', 'active_at_day'], unique=False)
+    op.create_index('ix_team_activity_game_team_id_initiated_on_day', 'team_activity',
+                    ['game', 'team_id', 'initiated_on_day'], unique=False)
+
+
+def downgrade():
+    raise NotImplementedError('The string ids of input and team_activity are gone, '
+                              'restore a backup taken before revision 0004 instead.')
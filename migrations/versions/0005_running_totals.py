@@ -0,0 +1,83 @@
+"""running totals on input, backfilled from the per period values
+
+The advance carries the totals forward from the previous Input, so the
+Inputs already played get them here. This is the SQL counterpart of
+app.totals.expected_running_totals: the costs are summed per team in day
+order, an activity counts as finished once its finished_on_day is reached,
+and the advance into a period paid the profit when every activity of the
+catalog was finished by the day it advanced from.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 02:41:12.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# app.engine as of this revision
+MAX_DAY = 999999999
+PERIOD_INCREMENT_IN_DAYS = 10
+PROFIT_PER_DAY = 75
+
+FINISHED_BY = ('(SELECT COUNT(DISTINCT team_activity.activity_id) FROM team_activity '
+               'WHERE team_activity.game = input.game_id AND team_activity.team_id = input.team_id '
+               f'AND team_activity.finished_on_day < {MAX_DAY} '
+               'AND team_activity.finished_on_day <= {day})')
+
+BACKFILL = f"""
+UPDATE input SET
+    cumulative_interest_cost = totals.cumulative_interest_cost,
+    cumulative_penalty_cost = totals.cumulative_penalty_cost,
+    cumulative_rent_cost = totals.cumulative_rent_cost,
+    cumulative_profit = totals.cumulative_profit,
+    finished_activity_count = totals.finished_activity_count
+FROM (
+    SELECT id,
+        SUM(interest_cost) OVER team_days AS cumulative_interest_cost,
+        SUM(penalty_cost) OVER team_days AS cumulative_penalty_cost,
+        SUM(rent_cost) OVER team_days AS cumulative_rent_cost,
+        SUM(profit) OVER team_days AS cumulative_profit,
+        finished_activity_count
+    FROM (
+        SELECT input.id, input.game_id, input.team_id, input.active_at_day,
+            COALESCE(input.interest_cost, 0) AS interest_cost,
+            COALESCE(input.total_penalty_cost, 0) AS penalty_cost,
+            COALESCE(input.rent_cost, 0) AS rent_cost,
+            CASE WHEN input.active_at_day > 1
+                AND {FINISHED_BY.format(day=f'input.active_at_day - {PERIOD_INCREMENT_IN_DAYS}')}
+                    = (SELECT COUNT(*) FROM activity)
+                THEN {PROFIT_PER_DAY * PERIOD_INCREMENT_IN_DAYS} ELSE 0 END AS profit,
+            {FINISHED_BY.format(day='input.active_at_day')} AS finished_activity_count
+        FROM input
+    ) AS periods
+    WINDOW team_days AS (PARTITION BY game_id, team_id ORDER BY active_at_day
+                         ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+) AS totals
+WHERE input.id = totals.id
+"""
+
+
+def upgrade():
+    op.add_column('input', sa.Column('cumulative_interest_cost', sa.Float(), nullable=True))
+    op.add_column('input', sa.Column('cumulative_penalty_cost', sa.Float(), nullable=True))
+    op.add_column('input', sa.Column('cumulative_rent_cost', sa.Integer(), nullable=True))
+    op.add_column('input', sa.Column('cumulative_profit', sa.Integer(), nullable=True))
+    op.add_column('input', sa.Column('finished_activity_count', sa.Integer(), nullable=True))
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    with op.batch_alter_table('input') as batch_op:
+        batch_op.drop_column('finished_activity_count')
+        batch_op.drop_column('cumulative_profit')
+        batch_op.drop_column('cumulative_rent_cost')
+        batch_op.drop_column('cumulative_penalty_cost')
+        batch_op.drop_column('cumulative_interest_cost')
@@ -0,0 +1,30 @@
+"""activity masks on input
+
+Inputs played before this revision keep NULL masks, the routes read the
+team activity rows for those instead.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 02:52:40.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('input', sa.Column('finished_mask', sa.BigInteger(), nullable=True))
+    op.add_column('input', sa.Column('in_progress_mask', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('input') as batch_op:
+        batch_op.drop_column('in_progress_mask')
+        batch_op.drop_column('finished_mask')
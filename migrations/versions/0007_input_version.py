@@ -0,0 +1,27 @@
+"""input version, moved on by every change of a team's choices
+
+The server default fills it in for the inputs already there.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 03:04:18.662051
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('input', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('input') as batch_op:
+        batch_op.drop_column('version')
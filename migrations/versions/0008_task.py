@@ -0,0 +1,43 @@
+"""tasks: the background jobs of app/jobs.py and their progress
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 03:12:35.904716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('task',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('name', sa.String(length=128), nullable=True),
+    sa.Column('description', sa.String(length=128), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('game_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=True),
+    sa.Column('progress', sa.Integer(), nullable=True),
+    sa.Column('message', sa.Text(), nullable=True),
+    sa.Column('complete', sa.Boolean(), nullable=True),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('date_finished', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_task_game_id'), 'task', ['game_id'], unique=False)
+    op.create_index(op.f('ix_task_name'), 'task', ['name'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_task_name'), table_name='task')
+    op.drop_index(op.f('ix_task_game_id'), table_name='task')
+    op.drop_table('task')
@@ -0,0 +1,42 @@
+"""game schedules: timed period advances, see app/scheduler.py
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 03:20:51.377428
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('game_schedule',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date_created', sa.DateTime(), nullable=True),
+    sa.Column('game_id', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('interval_minutes', sa.Integer(), nullable=True),
+    sa.Column('stop_at_day', sa.Integer(), nullable=True),
+    sa.Column('stop_activity_id', sa.String(length=64), nullable=True),
+    sa.Column('next_run_at', sa.DateTime(), nullable=True),
+    sa.Column('last_run_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
+    sa.ForeignKeyConstraint(['stop_activity_id'], ['activity.id'], ondelete='set null'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('game_id')
+    )
+    op.create_index(op.f('ix_game_schedule_id'), 'game_schedule', ['id'], unique=False)
+    op.create_index(op.f('ix_game_schedule_next_run_at'), 'game_schedule', ['next_run_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_game_schedule_next_run_at'), table_name='game_schedule')
+    op.drop_index(op.f('ix_game_schedule_id'), table_name='game_schedule')
+    op.drop_table('game_schedule')
@@ -0,0 +1,45 @@
+"""activity bit index: the fixed position of an activity in the input masks
+
+The masks used to take their bits from the activity ids in sorted order,
+so every added or deleted activity moved the bits of the others. Existing
+activities are numbered in id order here, but the masks stored so far are
+cleared rather than trusted: the routes read the team activity rows for
+inputs without masks, and the next advance stores them again.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 04:10:26.513380
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('activity', sa.Column('bit_index', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_activity_bit_index'), 'activity', ['bit_index'], unique=True)
+    op.add_column('catalog_version', sa.Column('next_bit_index', sa.Integer(), nullable=True))
+
+    op.execute('UPDATE activity SET bit_index = numbered.n - 1 '
+               'FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS n FROM activity) AS numbered '
+               'WHERE activity.id = numbered.id')
+    op.execute('UPDATE catalog_version SET next_bit_index = (SELECT COUNT(*) FROM activity)')
+    op.execute('INSERT INTO catalog_version (id, version, next_bit_index) '
+               'SELECT 1, 0, (SELECT COUNT(*) FROM activity) '
+               'WHERE NOT EXISTS (SELECT 1 FROM catalog_version WHERE id = 1)')
+    op.execute('UPDATE input SET finished_mask = NULL, in_progress_mask = NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('catalog_version') as batch_op:
+        batch_op.drop_column('next_bit_index')
+    op.drop_index(op.f('ix_activity_bit_index'), table_name='activity')
+    with op.batch_alter_table('activity') as batch_op:
+        batch_op.drop_column('bit_index')
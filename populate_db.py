@@ -1,8 +1,23 @@
+"""
+Seed the database with the activities, an admin and games full of teams.
+
+    python -m populate_db                                   # 1 game, 30 teams, 1 manager each
+    python -m populate_db --games 4 --teams 250 --users-per-team 2
+    python -m populate_db --teams 100 --history-periods 40  # synthetic history for benchmarking
+
+Every table is written with bulk statements in one transaction and the
+passwords are hashed across a process pool.
+"""
+import argparse
 import logging
 import os
+import random
 
 from app import db, create_app, Config
-from app.models import Activity, ActivityRequirement, Game, Team, User
+from app.catalog import allocate_bit_indexes, bump_catalog_version, get_activity_graph
+from app.engine import MAX_DAY, STARTING_FUNDS
+from app.hashing import hash_passwords
+from app.models import Activity, ActivityRequirement, Game, Input, Team, TeamActivity, User
 
 
 app = create_app(Config)
@@ -70,63 +85,143 @@ class ActivityAdder:
                     {'L': 'K'}]
 
     def create_activities(self):
-        for a in self.activities:
-            activity = Activity(id=a["id"], title=a["title"], days_needed=a["days_needed"], cost=a["cost"])
-            db.session.add(activity)
-            db.session.commit()
+        # bulk inserts skip the mapper events that give out the mask bits and
+        # keep the activity catalog fresh
+        bit_indexes = allocate_bit_indexes(db.session.connection(), len(self.activities))
+        db.session.bulk_insert_mappings(Activity, [
+            dict(id=a["id"], title=a["title"], days_needed=a["days_needed"], cost=a["cost"],
+                 bit_index=bit_index)
+            for a, bit_index in zip(self.activities, bit_indexes)])
+        bump_catalog_version(db.session.connection())
+        db.session.commit()
 
     def create_dependencies(self):
-        for d in self.dependencies:
-            act = next(iter(d))
-            dependency = ActivityRequirement(activity_id=act, requirement_id=d[act])
-            db.session.add(dependency)
-            db.session.commit()
+        db.session.bulk_insert_mappings(ActivityRequirement, [
+            dict(activity_id=act, requirement_id=requirement_id)
+            for d in self.dependencies for act, requirement_id in d.items()])
+        bump_catalog_version(db.session.connection())
+        db.session.commit()
+
 
+def create_games(games=1, teams=30, users_per_team=1, workers=None):
+    """
+    `games` games with `teams` teams each, their day one inputs and
+    `users_per_team` users per team, the first of them the manager.
+    Users are numbered across all games, user<n> with the password user<n>321.
+    Returns {game id: [team ids]}.
+    """
+    team_count = games * teams
+    usernames = [f'user{i}' for i in range(1, team_count * users_per_team + 1)]
+    password_hashes = hash_passwords([username + '321' for username in usernames], workers)
+
+    game_objects = [Game() for _ in range(games)]
+    db.session.add_all(game_objects)
+    db.session.commit()
+    game_ids = [g.id for g in game_objects]
+
+    db.session.bulk_insert_mappings(Team, [
+        dict(display_name=f'Team{i + 1}', game_id=game_ids[i // teams]) for i in range(team_count)])
+    db.session.commit()
+    team_ids = {game_id: [t.id for t in Team.query.filter_by(game_id=game_id).order_by(Team.id)]
+                for game_id in game_ids}
+    logger.info(f'Created {games} games with {teams} teams each')
+
+    db.session.bulk_insert_mappings(Input, [
+        dict(team_id=team_id, game_id=game_id, active_at_day=1,
+             credit_taken=STARTING_FUNDS, money_at_start_of_period=STARTING_FUNDS)
+        for game_id in game_ids for team_id in team_ids[game_id]])
+    db.session.commit()
+
+    all_team_ids = [team_id for game_id in game_ids for team_id in team_ids[game_id]]
+    db.session.bulk_insert_mappings(User, [
+        dict(username=username, display_name=username, email=username + '@warehouse-game.com',
+             password_hash=password_hash, is_manager=i % users_per_team == 0,
+             team_id=all_team_ids[i // users_per_team])
+        for i, (username, password_hash) in enumerate(zip(usernames, password_hashes))])
+    db.session.commit()
+    logger.info(f'Created {len(usernames)} users, passwords are <username>321')
+    return team_ids
+
+
+def create_admin():
+    admin_user = User()
+    admin_user.username = 'admin'
+    admin_user.display_name = 'admin'
+    admin_user.is_admin = True
+    admin_user.set_password(os.getenv('ADMIN_PASSWORD'))
+    db.session.add(admin_user)
+    db.session.commit()
+
+
+def play_history(game_id, team_ids, periods, rng, queue_rate=0.5, credit_rate=0.2):
+    """
+    Play a game `periods` periods forward through the real period advance.
+    Every period each team queues one activity whose requirements it has
+    initiated with the probability `queue_rate` (unfinished requirements end
+    in penalties, as in class) and applies for credit with `credit_rate`.
+    The teams need their inputs for the current day.
+    """
+    from app.main.routes import advance_game_period
+
+    graph = get_activity_graph()
+    initiated = dict.fromkeys(team_ids, 0)
+    for _ in range(periods):
+        game_ = Game.query.get(game_id)
+        day = game_.current_day
+        inputs = {i.team_id: i for i in Input.query.filter_by(game_id=game_id, active_at_day=day)}
+        queued = []
+        for team_id in team_ids:
+            candidates = [id_ for id_ in graph.ids
+                          if not initiated[team_id] & graph.bits[id_]
+                          and graph.is_eligible(id_, initiated[team_id])]
+            if candidates and rng.random() < queue_rate:
+                activity_id = rng.choice(candidates)
+                initiated[team_id] |= graph.bits[activity_id]
+                queued.append(dict(team_id=team_id, game=game_id, activity_id=activity_id,
+                                   cost=graph.activities[activity_id].cost,
+                                   input_id=inputs[team_id].id, initiated_on_day=day,
+                                   first_time_ever_initiated_on_day=day,
+                                   started_on_day=MAX_DAY, finished_on_day=MAX_DAY))
+            if rng.random() < credit_rate:
+                inputs[team_id].credit_to_take = 300 * rng.randint(1, 5)
+        db.session.bulk_insert_mappings(TeamActivity, queued)
+        db.session.commit()
+        advance_game_period(game_)
 
-def populate_the_db():
+
+def populate_the_db(games=1, teams=30, users_per_team=1, history_periods=0, workers=None, seed=0):
     with app.app_context():
         adder = ActivityAdder()
         adder.create_activities()
         adder.create_dependencies()
         logger.info('Created activities')
 
-        game_ = Game()
-        db.session.add(game_)
-        db.session.commit()
-        logger.info(f'Created game {game_}')
-
-        admin_user = User()
-        admin_user.username = 'admin'
-        admin_user.display_name = 'admin'
-        admin_user.is_admin = True
-        admin_user.set_password(os.getenv('ADMIN_PASSWORD'))
-        db.session.add(admin_user)
-        db.session.commit()
+        team_ids = create_games(games, teams, users_per_team, workers)
+        create_admin()
+
+        rng = random.Random(seed)
+        for game_id, game_team_ids in team_ids.items():
+            play_history(game_id, game_team_ids, history_periods, rng)
+            logger.info(f'Played game {game_id} {history_periods} periods forward')
+
 
-        for i in range(1, 31):
-            new_team = Team()
-            new_team.display_name = f'Team{i}'
-            new_team.game_id = game_.id
-            db.session.add(new_team)
-            db.session.commit()
-            logger.info(f'Created new team {new_team}')
-
-            new_user = User()
-            new_user.username = f'user{i}'
-            new_user.display_name = f'user{i}'
-            new_user.email = new_user.username + '@warehouse-game.com'
-            new_user.set_password(new_user.username + '321')
-            new_user.is_manager = True
-            new_user.team_id = new_team.id
-            db.session.add(new_user)
-            db.session.commit()
-            logger.info(f'Created new user \n'
-                        f'{new_user} pass {new_user.username + "321"}')
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Seed the warehouse game database.')
+    parser.add_argument('--games', type=int, default=1)
+    parser.add_argument('--teams', type=int, default=30, help='teams per game')
+    parser.add_argument('--users-per-team', type=int, default=1)
+    parser.add_argument('--history-periods', type=int, default=0,
+                        help='play every game this many periods forward')
+    parser.add_argument('--workers', type=int, help='password hashing processes (default: CPUs)')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
+    args = parse_args()
     # a bit hacky way to init the db
     with app.app_context():
         admin = User.query.filter_by(username='admin').first()
         if not admin:
-            populate_the_db()
+            populate_the_db(args.games, args.teams, args.users_per_team, args.history_periods,
+                            args.workers, args.seed)